@@ -0,0 +1,19 @@
+"""
+Пользователь запроса для представлений и middleware вне DRF (/metrics, профилирование, отдача файлов).
+"""
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+
+def get_user(request):
+    """
+    Вошедший пользователь по сессии или JWT, иначе None.
+    """
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user
+    try:
+        result = JWTAuthentication().authenticate(request)
+    except AuthenticationFailed:  # В том числе InvalidToken
+        return None
+    return result[0] if result is not None else None
@@ -0,0 +1,455 @@
+"""
+Нагрузочный прогон API внутри процесса (команда benchmark_api).
+
+Запросы идут прямо в config.wsgi.application или config.asgi.application, минуя сеть:
+измеряется стек Django целиком (middleware, аутентификация JWT, представления, БД).
+WSGI-режим — пул потоков, ASGI-режим — задачи asyncio. Stripe подменяется заглушкой
+с настраиваемой задержкой. Результаты пишутся в JSON, который можно сравнить с прошлым прогоном.
+"""
+import asyncio
+import io
+import json
+import platform
+import random
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from unittest import mock
+from urllib.parse import urlsplit
+
+import django
+from django.db import connection, connections
+from rest_framework_simplejwt.tokens import AccessToken
+
+HOST = 'localhost'  # Разрешен при DEBUG=True и пустом ALLOWED_HOSTS
+
+
+class StubStripe:
+    """
+    Заглушка модуля stripe для lms.services: отвечает предсказуемыми id после задержки latency секунд.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.Product = self._resource('prod')
+        self.Price = self._resource('price')
+        self.checkout = type('checkout', (), {'Session': self._resource('cs')})
+
+    def _resource(self, prefix):
+        stub = self
+
+        class Resource:
+            @staticmethod
+            def create(**params):
+                if stub.latency:
+                    time.sleep(stub.latency)
+                with stub._lock:
+                    stub.calls += 1
+                    object_id = f'{prefix}_bench_{stub.calls}'
+                return {'id': object_id, 'url': f'https://checkout.stripe.test/{object_id}'}
+
+        return Resource
+
+
+@contextmanager
+def stub_stripe(latency=0.0):
+    stub = StubStripe(latency)
+    with mock.patch('lms.services.stripe', stub):
+        yield stub
+
+
+class WSGIDriver:
+    """
+    Вызывает WSGI-приложение с собранным вручную environ.
+    """
+
+    def __init__(self, application, host=HOST):
+        self.application = application
+        self.host = host
+
+    def request(self, method, path, body=b'', headers=None):
+        url = urlsplit(path)
+        environ = {
+            'REQUEST_METHOD': method,
+            'PATH_INFO': url.path,
+            'QUERY_STRING': url.query,
+            'SERVER_NAME': self.host,
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'REMOTE_ADDR': '127.0.0.1',
+            'HTTP_HOST': self.host,
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': io.StringIO(),
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in (headers or {}).items():
+            environ['HTTP_' + name.upper().replace('-', '_')] = value
+
+        status = []
+        result = self.application(environ, lambda status_line, response_headers, exc_info=None: status.append(
+            int(status_line.split(' ', 1)[0])
+        ))
+        try:
+            content = b''.join(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return status[0], content
+
+
+class ASGIDriver:
+    """
+    Вызывает ASGI-приложение с одним HTTP-запросом в scope.
+    """
+
+    def __init__(self, application, host=HOST):
+        self.application = application
+        self.host = host
+
+    async def request(self, method, path, body=b'', headers=None):
+        url = urlsplit(path)
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method,
+            'scheme': 'http',
+            'path': url.path,
+            'raw_path': url.path.encode(),
+            'query_string': url.query.encode(),
+            'root_path': '',
+            'server': (self.host, 80),
+            'client': ('127.0.0.1', 0),
+            'headers': [(b'host', self.host.encode()), (b'content-type', b'application/json'),
+                        (b'content-length', str(len(body)).encode())] + [
+                (name.lower().encode(), value.encode()) for name, value in (headers or {}).items()
+            ],
+        }
+        messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        status, chunks = [], []
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            await asyncio.Event().wait()  # Клиент не отключается, пока приложение не ответит
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+            elif message['type'] == 'http.response.body':
+                chunks.append(message.get('body', b''))
+
+        await self.application(scope, receive, send)
+        return status[0], b''.join(chunks)
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    index = min(len(values) - 1, int(len(values) * fraction))
+    return round(values[index] * 1000, 2)
+
+
+class Recorder:
+    """
+    Задержки и ошибки по операциям сценария. Ошибкой считается ответ 5xx или исключение.
+    """
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.statuses = {}
+        self._lock = threading.Lock()
+
+    def record(self, operation, seconds, status):
+        with self._lock:
+            self.latencies.setdefault(operation, []).append(seconds)
+            self.statuses.setdefault(operation, {}).setdefault(str(status), 0)
+            self.statuses[operation][str(status)] += 1
+            if status is None or status >= 500:
+                self.errors[operation] = self.errors.get(operation, 0) + 1
+
+    def summary(self, elapsed):
+        def describe(latencies, errors):
+            latencies = sorted(latencies)
+            return {
+                'requests': len(latencies),
+                'errors': errors,
+                'rps': round(len(latencies) / elapsed, 2) if elapsed else None,
+                'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None,
+                'p50_ms': percentile(latencies, 0.50),
+                'p95_ms': percentile(latencies, 0.95),
+                'p99_ms': percentile(latencies, 0.99),
+                'max_ms': round(latencies[-1] * 1000, 2) if latencies else None,
+            }
+
+        result = describe([value for values in self.latencies.values() for value in values],
+                          sum(self.errors.values()))
+        result['elapsed_s'] = round(elapsed, 3)
+        result['operations'] = {
+            operation: dict(describe(latencies, self.errors.get(operation, 0)), statuses=self.statuses[operation])
+            for operation, latencies in sorted(self.latencies.items())
+        }
+        return result
+
+
+class Workload:
+    """
+    Сценарий нагрузки: next_request(state) возвращает (операция, метод, путь, тело),
+    handle_response(state, операция, статус, содержимое) обновляет состояние исполнителя.
+    """
+    name = None
+
+    def __init__(self, course_ids, rng):
+        self.course_ids = course_ids
+        self.rng = rng
+
+    def new_state(self):
+        return {}
+
+    def next_request(self, state):
+        raise NotImplementedError
+
+    def handle_response(self, state, operation, status, content):
+        pass
+
+
+class CourseListWorkload(Workload):
+    """
+    Листает свои курсы по ссылкам next от первой страницы до последней.
+    """
+    name = 'courses'
+
+    def new_state(self):
+        return {'next': None}
+
+    def next_request(self, state):
+        return 'course.list', 'GET', state['next'] or '/api/courses/', None
+
+    def handle_response(self, state, operation, status, content):
+        next_url = json.loads(content).get('next') if status == 200 else None
+        state['next'] = urlsplit(next_url)._replace(scheme='', netloc='').geturl() if next_url else None
+
+
+class LessonCrudWorkload(Workload):
+    """
+    Каждый исполнитель по кругу создает урок, читает, изменяет и удаляет его.
+    """
+    name = 'lessons'
+
+    def new_state(self):
+        return {'lesson_id': None, 'step': 0}
+
+    def next_request(self, state):
+        lesson_id = state['lesson_id']
+        if lesson_id is None:
+            course_id = self.rng.choice(self.course_ids)
+            return 'lesson.create', 'POST', '/api/lessons/', {
+                'title': 'Benchmark lesson', 'description': 'Benchmark', 'course': course_id,
+                'video_url': 'https://www.youtube.com/watch?v=benchmark',
+            }
+        step = state['step']
+        if step == 0:
+            return 'lesson.retrieve', 'GET', f'/api/lessons/{lesson_id}/', None
+        if step == 1:
+            return 'lesson.update', 'PATCH', f'/api/lessons/{lesson_id}/', {'title': 'Benchmark lesson (edited)'}
+        return 'lesson.delete', 'DELETE', f'/api/lessons/{lesson_id}/', None
+
+    def handle_response(self, state, operation, status, content):
+        if operation == 'lesson.create':
+            if status == 201:
+                state['lesson_id'], state['step'] = json.loads(content)['id'], 0
+        elif operation == 'lesson.delete' or status is None or status >= 400:
+            state['lesson_id'] = None
+        else:
+            state['step'] += 1
+
+
+class SubscriptionToggleWorkload(Workload):
+    name = 'subscriptions'
+
+    def next_request(self, state):
+        return 'subscription.toggle', 'POST', '/api/subscription/', {'course_id': self.rng.choice(self.course_ids)}
+
+
+class PaymentCreateWorkload(Workload):
+    """
+    Синхронное создание оплаты через заглушку Stripe; названия повторяются, как в реальном каталоге.
+    """
+    name = 'payments'
+
+    def next_request(self, state):
+        number = self.rng.randrange(50)
+        return 'payment.create', 'POST', '/api/payments/create/', {
+            'product_name': f'Benchmark course {number}', 'product_price': 100 + number,
+        }
+
+
+WORKLOADS = {workload.name: workload for workload in (
+    CourseListWorkload, LessonCrudWorkload, SubscriptionToggleWorkload, PaymentCreateWorkload,
+)}
+
+
+def make_tokens(users):
+    return [str(AccessToken.for_user(user)) for user in users]
+
+
+def encode(data):
+    return json.dumps(data).encode() if data is not None else b''
+
+
+def run_wsgi(application, workload, tokens, concurrency, duration, requests, warmup):
+    """
+    Гоняет сценарий в concurrency потоках: duration секунд или requests запросов на поток.
+    Перед замером каждый поток делает warmup запросов (ленивые импорты, соединения, кэши).
+    """
+    driver = WSGIDriver(application)
+
+    def run(recorder, duration, requests):
+        deadline = time.monotonic() + (duration or 0)
+
+        def worker(index):
+            headers = {'Authorization': f'Bearer {tokens[index % len(tokens)]}'}
+            state = workload.new_state()
+            number = 0
+            try:
+                while (number < requests) if requests else (time.monotonic() < deadline):
+                    operation, method, path, data = workload.next_request(state)
+                    start = time.perf_counter()
+                    try:
+                        status, content = driver.request(method, path, encode(data), headers)
+                    except Exception:
+                        status, content = None, b''
+                    recorder.record(operation, time.perf_counter() - start, status)
+                    workload.handle_response(state, operation, status, content)
+                    number += 1
+            finally:
+                connections.close_all()  # Соединения потока иначе останутся открытыми
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(concurrency) as executor:
+            list(executor.map(worker, range(concurrency)))
+        return time.monotonic() - started
+
+    if warmup:
+        run(Recorder(), None, warmup)
+    recorder = Recorder()
+    return recorder.summary(run(recorder, duration, requests))
+
+
+def run_asgi(application, workload, tokens, concurrency, duration, requests, warmup):
+    """
+    То же для ASGI: concurrency задач asyncio в одном цикле событий.
+    Синхронные представления Django при этом выполняет в потоке asgiref, как и под настоящим ASGI-сервером.
+    """
+    driver = ASGIDriver(application)
+
+    async def run(recorder, duration, requests):
+        deadline = time.monotonic() + (duration or 0)
+
+        async def worker(index):
+            headers = {'Authorization': f'Bearer {tokens[index % len(tokens)]}'}
+            state = workload.new_state()
+            number = 0
+            while (number < requests) if requests else (time.monotonic() < deadline):
+                operation, method, path, data = workload.next_request(state)
+                start = time.perf_counter()
+                try:
+                    status, content = await driver.request(method, path, encode(data), headers)
+                except Exception:
+                    status, content = None, b''
+                recorder.record(operation, time.perf_counter() - start, status)
+                workload.handle_response(state, operation, status, content)
+                number += 1
+
+        started = time.monotonic()
+        await asyncio.gather(*(worker(index) for index in range(concurrency)))
+        return time.monotonic() - started
+
+    if warmup:
+        asyncio.run(run(Recorder(), None, warmup))
+    recorder = Recorder()
+    return recorder.summary(asyncio.run(run(recorder, duration, requests)))
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(workloads, users, course_ids, server='wsgi', concurrency=8, duration=10.0, requests=None,
+                  warmup=5, stripe_latency=0.0, seed=42):
+    """
+    Прогоняет сценарии по очереди и возвращает результаты с описанием окружения.
+    """
+    if server == 'asgi':
+        from config.asgi import application
+        runner = run_asgi
+    else:
+        from config.wsgi import application
+        runner = run_wsgi
+
+    tokens = make_tokens(users)
+    result = {
+        'meta': {
+            'revision': git_revision(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'server': server,
+            'database': connection.vendor,
+            'concurrency': concurrency,
+            'duration_s': None if requests else duration,
+            'requests_per_worker': requests,
+            'warmup': warmup,
+            'stripe_latency_ms': round(stripe_latency * 1000, 2),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+        },
+        'scenarios': {},
+    }
+    with stub_stripe(stripe_latency):
+        for name in workloads:
+            workload = WORKLOADS[name](course_ids, random.Random(seed))
+            result['scenarios'][name] = runner(application, workload, tokens, concurrency, duration, requests, warmup)
+    return result
+
+
+# Метрики, по которым сравниваются прогоны: рост задержки и падение пропускной способности — регрессия
+COMPARED_METRICS = (('p50_ms', 1), ('p95_ms', 1), ('p99_ms', 1), ('rps', -1))
+
+
+def compare_results(baseline, current, threshold):
+    """
+    Сравнивает два прогона по общим сценариям и операциям.
+    Возвращает строки (сценарий, операция, метрика, было, стало, изменение в %, регрессия).
+    """
+    rows = []
+    for scenario, current_stats in current['scenarios'].items():
+        baseline_stats = baseline['scenarios'].get(scenario)
+        if baseline_stats is None:
+            continue
+        pairs = [('*', baseline_stats, current_stats)] + [
+            (operation, baseline_stats['operations'][operation], stats)
+            for operation, stats in current_stats['operations'].items()
+            if operation in baseline_stats['operations']
+        ]
+        for operation, before, after in pairs:
+            for metric, direction in COMPARED_METRICS:
+                old, new = before.get(metric), after.get(metric)
+                if not old or new is None:
+                    continue
+                change = (new - old) / old * 100
+                rows.append((scenario, operation, metric, old, new, round(change, 1), change * direction > threshold))
+    return rows
@@ -0,0 +1,120 @@
+"""
+Быстрые рендерер и парсер JSON для DRF на orjson.
+
+FastJSONRenderer выдает JSON в том же виде, что и JSONRenderer DRF в настройках по умолчанию
+(компактный, UTF-8, с экранированием U+2028/U+2029): типы, которые orjson не знает (Decimal, ленивые
+строки перевода, файлы и изображения), а также даты и время преобразуются так же, как в encoders.JSONEncoder.
+Если orjson не установлен (pip install orjson или poetry install -E fast-json), выключен
+FAST_JSON_ENABLED, запрошен отступ (?format=api, indent=4) или orjson не может закодировать данные
+(целые больше 64 бит), используется стандартный json.
+
+Байт в байт вывод совпадает, пока в данных нет float: те же значения orjson записывает в другой,
+но равнозначной форме (1e16 вместо 1e+16, 1e-7 вместо 1e-07), а NaN и Infinity — как null,
+тогда как JSONRenderer со STRICT_JSON выдает ошибку. Денежные суммы в API — Decimal (строки), их это не касается.
+"""
+import io
+import time
+
+from django.conf import settings
+from django.db.models.fields.files import FieldFile
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from config.metrics import TimedRendererMixin
+
+try:
+    import orjson
+except ImportError:  # Необязательная зависимость: pip install orjson
+    orjson = None
+
+if orjson is not None:
+    OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_SERIALIZE_NUMPY
+
+_encoder = JSONEncoder()
+
+
+def default(obj):
+    """
+    Значения, которые orjson не кодирует сам. Даты приходят сюда из-за OPT_PASSTHROUGH_DATETIME,
+    чтобы формат совпадал с DRF ('Z' вместо '+00:00').
+    """
+    if isinstance(obj, FieldFile):
+        return obj.url if obj else None
+    return _encoder.default(obj)
+
+
+def is_enabled():
+    return orjson is not None and settings.FAST_JSON_ENABLED
+
+
+class FastJSONRenderer(TimedRendererMixin, JSONRenderer):
+    """
+    JSONRenderer на orjson с откатом на стандартный json.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if (not is_enabled() or self.ensure_ascii or not self.compact
+                or self.get_indent(accepted_media_type, renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=default, option=OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    """
+    JSONParser на orjson; тела не в UTF-8 разбираются стандартным json.
+    """
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if not is_enabled() or encoding.lower().replace('_', '-') not in ('utf-8', 'utf8'):
+            return super().parse(stream, media_type, parser_context)
+        try:
+            # NaN и Infinity orjson отвергает, как JSONParser в строгом режиме
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+
+def benchmark_payloads(payloads, rounds=20):
+    """
+    Лучшее время из rounds прогонов рендеринга и разбора каждого набора данных: JSONRenderer/JSONParser
+    DRF против FastJSONRenderer/FastJSONParser, мс.
+    """
+    def best(func, *args):
+        timings = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            func(*args)
+            timings.append(time.perf_counter() - start)
+        return min(timings) * 1000
+
+    def parse(parser, content):
+        return parser.parse(io.BytesIO(content), parser_context={'encoding': 'utf-8'})
+
+    results = {}
+    for name, data in payloads.items():
+        content = JSONRenderer().render(data)
+        row = {
+            'size_kb': round(len(content) / 1024, 1),
+            'render_stdlib_ms': best(JSONRenderer().render, data),
+            'render_fast_ms': best(FastJSONRenderer().render, data),
+            'parse_stdlib_ms': best(parse, JSONParser(), content),
+            'parse_fast_ms': best(parse, FastJSONParser(), content),
+        }
+        for operation in ('render', 'parse'):
+            fast = row[f'{operation}_fast_ms']
+            row[f'{operation}_speedup'] = round(row[f'{operation}_stdlib_ms'] / fast, 2) if fast else None
+        results[name] = {key: round(value, 3) if isinstance(value, float) else value for key, value in row.items()}
+    return results
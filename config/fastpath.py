@@ -0,0 +1,246 @@
+"""
+Быстрый путь чтения списков: строки .values() вместо моделей и полей сериализатора DRF.
+
+compile_serializer() один раз на класс сериализатора генерирует по его полям функцию
+"строка values() -> dict" и список столбцов для values(). Результат совпадает с serializer.data:
+поля без преобразования (строки, числа, внешние ключи) копируются как есть, остальные
+(даты, Decimal) проходят через to_representation того же поля, файлы превращаются в URL так же,
+как FileField DRF. Обратные связи с вложенным сериализатором (many=True) читаются одним запросом
+на страницу. Поле с методом row_representation(значение, *столбцы row_sources, request) выводит
+значение само. SerializerMethodField поддерживается, только если его значение уже есть в строке:
+fast_path_sources = {поле: аннотация запроса}. Сериализаторы с другими полями (source='*',
+пути через точку, связи многие-ко-многим) не компилируются и выводятся обычным путем.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework import ISO_8601
+from rest_framework.fields import (BooleanField, CharField, ChoiceField, DateTimeField, FileField, IntegerField,
+                                   ReadOnlyField)
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from config.metrics import timed_serialization
+
+# to_representation, которые для значений из БД ничего не меняют
+IDENTITY_REPRESENTATIONS = {
+    CharField.to_representation, IntegerField.to_representation, BooleanField.to_representation,
+    ChoiceField.to_representation, ReadOnlyField.to_representation,
+}
+
+
+class NotCompilable(Exception):
+    """
+    Поле сериализатора нельзя вывести из строки values().
+    """
+
+
+def file_url(name, storage, request):
+    # Как FileField.to_representation DRF с use_url
+    if not name:
+        return None
+    url = storage.url(name)
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+def iso_datetime(value, tz, convert):
+    # Как DateTimeField.to_representation DRF в формате ISO 8601; часовой пояс определяется раз на список
+    if tz is None or value.utcoffset() is None:
+        return convert(value)
+    value = value.astimezone(tz).isoformat()
+    return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+
+class CompiledSerializer:
+    def __init__(self, model, columns, transform, nested, datetime_field=None):
+        self.model = model
+        self.columns = columns
+        self.transform = transform
+        self.nested = nested  # [(внешний ключ на родителя, CompiledSerializer)]
+        self.datetime_field = datetime_field  # Любое DateTimeField сериализатора: источник часового пояса
+
+    def values(self, queryset):
+        # Предзагрузка связей из get_queryset для строк не нужна и с values() не работает
+        return queryset.prefetch_related(None).values(*self.columns)
+
+    @timed_serialization
+    def serialize(self, rows, context):
+        rows = list(rows)
+        request = context.get('request')
+        children = ()
+        if self.nested:
+            pk = self.model._meta.pk.attname
+            ids = [row[pk] for row in rows]
+            children = tuple(nested.fetch_grouped(fk, ids, context) for fk, nested in self.nested)
+        tz = self.datetime_field.default_timezone() if self.datetime_field is not None else None
+        transform = self.transform
+        return [transform(row, request, children, tz) for row in rows]
+
+    def fetch_grouped(self, fk, ids, context):
+        """
+        Вложенные объекты для родителей ids одним запросом: {id родителя: [dict, ...]}.
+        """
+        if not ids:
+            return {}
+        rows = list(self.values(self.model._default_manager.filter(**{f'{fk}__in': ids})))
+        grouped = {}
+        for row, data in zip(rows, self.serialize(rows, context)):
+            grouped.setdefault(row[fk], []).append(data)
+        return grouped
+
+
+def build(serializer, extra_columns=()):
+    if not isinstance(serializer, serializers.ModelSerializer):
+        raise NotCompilable(type(serializer).__name__)
+    model = serializer.Meta.model
+    opts = model._meta
+    accessors = {relation.get_accessor_name(): relation for relation in opts.related_objects}
+    sources = getattr(serializer, 'fast_path_sources', {})
+    columns = [opts.pk.attname, *extra_columns]
+    namespace = {'file_url': file_url, 'iso_datetime': iso_datetime}
+    items, nested = [], []
+    datetime_field = None
+
+    def column(name):
+        if name not in columns:
+            columns.append(name)
+        return repr(name)
+
+    for index, field in enumerate(field for field in serializer.fields.values() if not field.write_only):
+        name = repr(field.field_name)
+        if isinstance(field, serializers.SerializerMethodField):
+            if field.field_name not in sources:
+                raise NotCompilable(field.field_name)
+            items.append(f'{name}: row[{column(sources[field.field_name])}]')
+            continue
+        if field.source == '*' or '.' in field.source:
+            raise NotCompilable(field.field_name)
+
+        if field.source in accessors:
+            relation = accessors[field.source]
+            child = getattr(field, 'child', None)
+            if not relation.one_to_many or not isinstance(child, serializers.Serializer):
+                raise NotCompilable(field.field_name)
+            fk = relation.field.attname
+            nested.append((fk, build(child, extra_columns=(fk,))))
+            items.append(f'{name}: children[{len(nested) - 1}].get(row[{column(opts.pk.attname)}], [])')
+            continue
+
+        try:
+            model_field = opts.get_field(field.source)
+        except FieldDoesNotExist:
+            raise NotCompilable(field.field_name)
+        if model_field.many_to_many or model_field.one_to_many:
+            raise NotCompilable(field.field_name)
+        key = column(model_field.attname)
+
+        if isinstance(field, PrimaryKeyRelatedField):
+            if field.pk_field is not None:
+                raise NotCompilable(field.field_name)
+            items.append(f'{name}: row[{key}]')
+        elif hasattr(field, 'row_representation'):
+            # Поле само выводит значение из столбцов строки (например, VariantImageField из lms/images.py)
+            namespace[f'convert_{index}'] = field.row_representation
+            extra = ''.join(f'row[{column(source)}], ' for source in field.row_sources)
+            items.append(f'{name}: convert_{index}(row[{key}], {extra}request)')
+        elif isinstance(field, FileField):
+            if not getattr(field, 'use_url', api_settings.UPLOADED_FILES_USE_URL):
+                items.append(f'{name}: row[{key}] or None')
+                continue
+            namespace[f'storage_{index}'] = model_field.storage
+            items.append(f'{name}: file_url(row[{key}], storage_{index}, request)')
+        elif type(field).to_representation in IDENTITY_REPRESENTATIONS:
+            items.append(f'{name}: row[{key}]')
+        elif (type(field).to_representation is DateTimeField.to_representation and not hasattr(field, 'timezone')
+              and getattr(field, 'format', api_settings.DATETIME_FORMAT).lower() == ISO_8601):
+            datetime_field = field
+            namespace[f'convert_{index}'] = field.to_representation
+            items.append(f'{name}: None if (value := row[{key}]) is None else iso_datetime(value, tz, convert_{index})')
+        else:
+            namespace[f'convert_{index}'] = field.to_representation
+            items.append(f'{name}: None if (value := row[{key}]) is None else convert_{index}(value)')
+
+    source = 'def transform(row, request, children, tz):\n    return {\n%s\n    }\n' % ''.join(
+        f'        {item},\n' for item in items
+    )
+    exec(compile(source, f'<fastpath {type(serializer).__qualname__}>', 'exec'), namespace)
+    return CompiledSerializer(model, columns, namespace['transform'], nested, datetime_field)
+
+
+_compiled = {}
+_compiled_lock = threading.Lock()
+
+
+def compile_serializer(serializer_class):
+    """
+    Скомпилированный сериализатор или None, если быстрый путь для него невозможен. Кэшируется по классу.
+    """
+    try:
+        return _compiled[serializer_class]
+    except KeyError:
+        pass
+    with _compiled_lock:
+        if serializer_class not in _compiled:
+            try:
+                _compiled[serializer_class] = build(serializer_class())
+            except NotCompilable:
+                _compiled[serializer_class] = None
+    return _compiled[serializer_class]
+
+
+class FastPathListMixin:
+    """
+    list() через compile_serializer: без моделей и полей DRF на каждую строку. Выбор полей
+    (?fields=, ?expand=) и сериализаторы, которые не компилируются, идут обычным путем.
+    """
+    fast_path = True
+
+    def get_fast_path(self):
+        if not (settings.SERIALIZER_FAST_PATH and self.fast_path):
+            return None
+        if getattr(self, 'has_sparse_selection', None) and self.has_sparse_selection():
+            return None
+        return compile_serializer(self.get_serializer_class())
+
+    def list(self, request, *args, **kwargs):
+        compiled = self.get_fast_path()
+        if compiled is None:
+            return super().list(request, *args, **kwargs)
+        queryset = compiled.values(self.filter_queryset(self.get_queryset()))
+        context = self.get_serializer_context()
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(compiled.serialize(page, context))
+        return Response(compiled.serialize(queryset, context))
+
+
+def benchmark_list(serializer_class, queryset, context=None, rounds=5):
+    """
+    Строк в секунду при выводе списка queryset (запрос к БД и сериализация, лучший из rounds прогонов):
+    обычный сериализатор против скомпилированного.
+    """
+    context = context or {}
+    compiled = compile_serializer(serializer_class)
+    if compiled is None:
+        raise NotCompilable(serializer_class.__name__)
+
+    def best(func):
+        timings = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            count = len(func())
+            timings.append(time.perf_counter() - start)
+        return count, min(timings)
+
+    count, regular = best(lambda: serializer_class(queryset.all(), many=True, context=context).data)
+    _, fast = best(lambda: compiled.serialize(compiled.values(queryset.all()), context))
+    return {
+        'rows': count,
+        'regular_rows_per_sec': round(count / regular),
+        'fast_rows_per_sec': round(count / fast),
+        'speedup': round(regular / fast, 2),
+    }
@@ -0,0 +1,195 @@
+"""
+Выборочные поля (?fields=) и раскрытие связей (?expand=) для сериализаторов и запросов к БД.
+
+?fields=id,title,lessons.title оставляет в ответе только перечисленные поля, для вложенных
+сериализаторов — через точку. ?expand=course заменяет id связанного объекта вложенным объектом
+(см. expandable_fields сериализатора), вложенные раскрытия тоже через точку: ?expand=payments.course.
+Без параметров ответ не меняется. Параметры учитываются только в безопасных запросах (GET, HEAD).
+
+SparseFieldsetViewMixin строит запрос под выбранные поля: only() по полям модели,
+select_related для раскрытых внешних ключей и prefetch_related только для оставленных в ответе
+обратных связей, поэтому неиспользуемые столбцы и связи не читаются.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from django.utils.module_loading import import_string
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def parse_paths(value):
+    """
+    'id,lessons.title,lessons.id' -> {'id': {}, 'lessons': {'title': {}, 'id': {}}}; пустое значение -> None.
+    """
+    if not value:
+        return None
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for name in path.strip().split('.'):
+            if name:
+                node = node.setdefault(name, {})
+    return tree or None
+
+
+class SparseFieldsetMixin:
+    """
+    Сериализатор с выборочными полями и раскрываемыми связями.
+
+    expandable_fields: {поле: (класс сериализатора или путь к нему, параметры)}; в параметрах
+    можно указать fields — поля раскрытого объекта по умолчанию.
+    field_dependencies: {вычисляемое поле: поля модели, нужные для его значения} — для only().
+    """
+    expandable_fields = {}
+    field_dependencies = {}
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.apply_fieldset(fields, expand)
+
+    def apply_fieldset(self, fields=None, expand=None):
+        if fields is None and not expand:
+            return
+        expand = expand or {}
+        expanded = set()
+        for name, nested_expand in expand.items():
+            if name not in self.expandable_fields:
+                continue
+            serializer_class, options = self.expandable_fields[name]
+            if isinstance(serializer_class, str):
+                serializer_class = import_string(serializer_class)
+            options = dict(options)
+            default_fields = options.pop('fields', None)
+            nested_fields = (fields or {}).get(name) or (
+                parse_paths(','.join(default_fields)) if default_fields else None
+            )
+            self.fields[name] = serializer_class(fields=nested_fields, expand=nested_expand, read_only=True,
+                                                 **options)
+            expanded.add(name)
+
+        if fields is not None:
+            for name in list(self.fields):
+                if name not in fields and name not in expanded:
+                    self.fields.pop(name)
+
+        # Выбор полей и раскрытия внутри уже вложенных сериализаторов (например, lessons.title)
+        for name, field in self.fields.items():
+            child = getattr(field, 'child', field)
+            if name in expanded or not isinstance(child, SparseFieldsetMixin):
+                continue
+            nested_fields = (fields or {}).get(name) or None
+            nested_expand = expand.get(name)
+            if nested_fields is not None or nested_expand:
+                child.apply_fieldset(nested_fields, nested_expand)
+
+
+class NotOptimizable(Exception):
+    """
+    Поле сериализатора нельзя сопоставить полям модели: запрос остается без only().
+    """
+
+
+def collect_lookups(serializer, model, prefix=''):
+    """
+    Поля для only(), пути для select_related и объекты Prefetch для выбранных полей сериализатора.
+    """
+    only, select, prefetch = {prefix + model._meta.pk.name}, set(), []
+    accessors = {relation.get_accessor_name(): relation for relation in model._meta.related_objects}
+    dependencies = getattr(serializer, 'field_dependencies', {})
+
+    for name, field in serializer.fields.items():
+        if isinstance(field, serializers.SerializerMethodField) or field.source == '*':
+            if name not in dependencies:
+                raise NotOptimizable(name)
+            only.update(prefix + dependency for dependency in dependencies[name])
+            continue
+
+        child = getattr(field, 'child', field)
+        nested = isinstance(child, serializers.BaseSerializer)
+        bits = field.source.split('.')
+        attr = bits[0]
+
+        if attr in accessors:
+            relation = accessors[attr]
+            if not nested:
+                prefetch.append(prefix + attr)
+                continue
+            nested_only, nested_select, nested_prefetch = collect_lookups(child, relation.related_model)
+            if relation.one_to_many:
+                nested_only.add(relation.field.name)  # Внешний ключ на родителя нужен для раскладки
+            queryset = relation.related_model._default_manager.select_related(*nested_select)
+            prefetch.append(Prefetch(prefix + attr, queryset=queryset.prefetch_related(*nested_prefetch)
+                                     .only(*nested_only)))
+            continue
+
+        try:
+            model_field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            raise NotOptimizable(name)
+
+        if model_field.many_to_many:
+            prefetch.append(prefix + attr)
+        elif model_field.is_relation and (nested or len(bits) > 1):
+            related_model = model_field.related_model
+            select.add(prefix + attr)
+            only.add(prefix + attr)
+            if nested:
+                nested_only, nested_select, nested_prefetch = collect_lookups(
+                    child, related_model, f'{prefix}{attr}__',
+                )
+                only.update(nested_only)
+                select.update(nested_select)
+                prefetch.extend(nested_prefetch)
+            else:
+                only.add(f'{prefix}{attr}__{related_model._meta.pk.name}')
+                only.add(prefix + '__'.join(bits))
+        else:
+            only.add(prefix + attr)
+            # Поля модели, которые поле сериализатора читает помимо своего (например, копии изображения)
+            only.update(prefix + source for source in getattr(field, 'row_sources', ()))
+    return only, select, prefetch
+
+
+def optimize_queryset(queryset, serializer, required_fields=()):
+    """
+    Запрос под выбранные поля сериализатора. required_fields — поля модели, нужные представлению
+    помимо ответа (проверка владельца, ETag).
+    """
+    try:
+        only, select, prefetch = collect_lookups(serializer, queryset.model)
+    except NotOptimizable:
+        return queryset
+    return queryset.select_related(*select).prefetch_related(*prefetch).only(*only, *required_fields)
+
+
+class SparseFieldsetViewMixin:
+    """
+    Передает ?fields= и ?expand= сериализатору и строит под них запрос (optimize_queryset).
+    """
+    sparse_required_fields = ()
+
+    def get_sparse_selection(self):
+        if self.request is None or self.request.method not in SAFE_METHODS:
+            return None, None
+        params = self.request.query_params
+        return parse_paths(params.get(FIELDS_PARAM)), parse_paths(params.get(EXPAND_PARAM))
+
+    def has_sparse_selection(self):
+        fields, expand = self.get_sparse_selection()
+        return fields is not None or bool(expand)
+
+    def get_serializer(self, *args, **kwargs):
+        fields, expand = self.get_sparse_selection()
+        if fields is not None:
+            kwargs.setdefault('fields', fields)
+        if expand:
+            kwargs.setdefault('expand', expand)
+        return super().get_serializer(*args, **kwargs)
+
+    def optimize_queryset(self, queryset):
+        fields, expand = self.get_sparse_selection()
+        serializer = self.get_serializer_class()(fields=fields, expand=expand, context=self.get_serializer_context())
+        return optimize_queryset(queryset, serializer, self.sparse_required_fields)
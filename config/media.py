@@ -0,0 +1,177 @@
+"""
+Отдача загруженных файлов (MEDIA_ROOT) вместо отладочного django.views.static.serve.
+
+Представление проверяет путь и доступ: файлы каталогов из MEDIA_ACCESS_CHECKS отдаются, только если
+разрешает функция каталога (например, аватар — владельцу, модераторам и сотрудникам), остальные
+при MEDIA_REQUIRE_AUTH (по умолчанию) — только вошедшим пользователям, по сессии или JWT.
+Отвечает 304 по If-None-Match / If-Modified-Since и ставит ETag, Last-Modified и Cache-Control.
+Копии изображений с хэшем содержимого в имени (lms/images.py) кэшируются навсегда (immutable),
+остальные файлы — на MEDIA_CACHE_MAX_AGE секунд с перепроверкой.
+
+Саму передачу при MEDIA_ACCEL=nginx забирает фронтовой прокси по заголовку X-Accel-Redirect
+(внутренний location MEDIA_ACCEL_PREFIX с alias на MEDIA_ROOT), при MEDIA_ACCEL=sendfile —
+Apache/lighttpd по X-Sendfile; Range прокси обрабатывает сам. Без прокси файл отдается потоком:
+целиком через FileResponse (wsgi.file_wrapper), диапазон Range: bytes=... — частями по MEDIA_CHUNK_SIZE.
+
+Пример для nginx:
+    location /protected-media/ { internal; alias /srv/app/media/; }
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.utils.module_loading import import_string
+from django.views.decorators.http import require_safe
+
+from config.auth import get_user
+
+# Имя копии с хэшем содержимого: <имя>-<ширина>w-<12 hex>.<расширение>
+IMMUTABLE_NAME = re.compile(r'-\d+w-[0-9a-f]{12}\.\w+$')
+RANGE_HEADER = re.compile(r'^bytes=(\d*)-(\d*)$')
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def get_access_check(path):
+    for prefix, check in settings.MEDIA_ACCESS_CHECKS.items():
+        if path.startswith(prefix):
+            return import_string(check)
+    return None
+
+
+def has_access(request, path):
+    check = get_access_check(path)
+    if check is None and not settings.MEDIA_REQUIRE_AUTH:
+        return True
+    user = get_user(request)
+    if user is None:
+        return False
+    return check is None or check(user, path)
+
+
+def cache_control(path):
+    scope = 'private' if settings.MEDIA_REQUIRE_AUTH or get_access_check(path) else 'public'
+    if IMMUTABLE_NAME.search(path):
+        return f'{scope}, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    return f'{scope}, max-age={settings.MEDIA_CACHE_MAX_AGE}'
+
+
+def parse_range(header, size):
+    """
+    (начало, конец включительно) для одного диапазона, None — отдать файл целиком
+    (нет заголовка или несколько диапазонов), ValueError — диапазон вне файла (416).
+    """
+    match = RANGE_HEADER.match(header.replace(' ', '')) if header else None
+    if match is None or match.group(1) == match.group(2) == '':
+        return None
+    start, end = match.groups()
+    if start == '':  # Последние N байт
+        length = int(end)
+        if length == 0 or size == 0:
+            raise ValueError(header)
+        return max(0, size - length), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def if_range_passes(request, etag, mtime):
+    """
+    If-Range: диапазон отдается, только если файл не изменился с указанной версии.
+    """
+    value = request.headers.get('If-Range')
+    if not value:
+        return True
+    if value.startswith(('"', 'W/')):
+        return value == etag
+    modified = parse_http_date_safe(value)
+    return modified is not None and int(mtime) <= modified
+
+
+def iter_range(file, start, length, chunk_size):
+    try:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if any(part.startswith('.') for part in path.split('/')) or not os.path.isfile(full_path):
+        raise Http404
+    if not has_access(request, path):
+        return HttpResponseForbidden()
+
+    stat = os.stat(full_path)
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': cache_control(path),
+        'Accept-Ranges': 'bytes',
+    }
+    conditional = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if conditional is not None:
+        if conditional.status_code == 304:
+            for name, value in headers.items():
+                conditional.headers[name] = value
+        return conditional
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+    if encoding:  # Например, .gz: отдается как есть, без распаковки браузером
+        content_type = 'application/octet-stream'
+
+    if settings.MEDIA_ACCEL:
+        response = HttpResponse(content_type=content_type, headers=headers)
+        if settings.MEDIA_ACCEL == 'nginx':
+            response['X-Accel-Redirect'] = quote(settings.MEDIA_ACCEL_PREFIX.rstrip('/') + '/' + path)
+        else:
+            response['X-Sendfile'] = full_path
+        return response
+
+    size = stat.st_size
+    try:
+        byte_range = parse_range(request.headers.get('Range'), size) if if_range_passes(
+            request, etag, stat.st_mtime) else None
+    except ValueError:
+        response = HttpResponse(status=416, headers=headers)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type, headers=headers)
+        response['Content-Length'] = size
+        return response
+    if byte_range is None:
+        response = FileResponse(open(full_path, 'rb'), content_type=content_type, headers=headers)
+        response.block_size = settings.MEDIA_CHUNK_SIZE
+        return response
+
+    start, end = byte_range
+    length = end - start + 1
+    response = StreamingHttpResponse(
+        iter_range(open(full_path, 'rb'), start, length, settings.MEDIA_CHUNK_SIZE),
+        status=206, content_type=content_type, headers=headers,
+    )
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = length
+    return response
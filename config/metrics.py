@@ -0,0 +1,262 @@
+"""
+Метрики производительности запросов: заголовок Server-Timing и эндпоинт /metrics в формате Prometheus.
+
+MetricsMiddleware замеряет по каждому маршруту (имени представления) полное время ответа,
+число и время SQL-запросов, время сериализации и рендеринга ответа и время вызовов Stripe.
+Сериализация замеряется в классах проекта, классы DRF не изменяются: TimedSerializerMixin
+у сериализаторов, CompiledSerializer.serialize быстрого пути (config/fastpath.py) и TimedRendererMixin
+у FastJSONRenderer. Замеры копятся в гистограммах в памяти процесса: Prometheus опрашивает
+каждый процесс (воркер) отдельно. Накладные расходы — несколько вызовов perf_counter на запрос
+и SQL-запрос и одна блокировка при записи гистограмм.
+"""
+import functools
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+
+from config.auth import get_user
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class RequestTimings:
+    __slots__ = ('db_queries', 'db_time', 'serialization_time', 'stripe_time', 'serializing')
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.serialization_time = 0.0
+        self.stripe_time = 0.0
+        self.serializing = False
+
+
+# Замеры текущего запроса; None вне запроса (команды, воркеры)
+current_timings = ContextVar('current_timings', default=None)
+
+
+def record_stripe_time(seconds):
+    timings = current_timings.get()
+    if timings is not None:
+        timings.stripe_time += seconds
+
+
+def record_query(execute, sql, params, many, context):
+    timings = current_timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.db_time += time.perf_counter() - start
+        timings.db_queries += 1
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def timed_serialization(func):
+    """
+    Время вызова идет в serialization_time текущего запроса. Вложенные вызовы (сериализатор
+    внутри сериализатора, откат рендерера на стандартный json) не считаются дважды.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        timings = current_timings.get()
+        if timings is None or timings.serializing:
+            return func(*args, **kwargs)
+        timings.serializing = True
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timings.serialization_time += time.perf_counter() - start
+            timings.serializing = False
+
+    return wrapper
+
+
+class TimedSerializerMixin:
+    """
+    Сериализатор, время to_representation которого идет в замер сериализации запроса
+    (для many=True — каждого объекта списка).
+    """
+
+    @timed_serialization
+    def to_representation(self, instance):
+        return super().to_representation(instance)
+
+
+class TimedRendererMixin:
+    """
+    Рендерер, время render которого идет в замер сериализации запроса.
+    """
+
+    @timed_serialization
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return super().render(data, accepted_media_type, renderer_context)
+
+
+_installed = False
+_install_lock = threading.Lock()
+
+
+def instrument():
+    """
+    Подключает обертку SQL-запросов один раз на процесс (execute_wrappers каждого соединения).
+    """
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        connection_created.connect(install_query_wrapper, dispatch_uid='config.metrics')
+        for connection in connections.all(initialized_only=True):
+            install_query_wrapper(None, connection)
+        _installed = True
+
+
+class Histogram:
+    """
+    Гистограмма Prometheus с метками: накопительные бакеты, сумма и количество.
+    """
+
+    def __init__(self, name, description, label_names, buckets):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        for labels, (counts, total) in sorted(self.series.items()):
+            label_text = ','.join(f'{name}="{escape(value)}"' for name, value in zip(self.label_names, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {total:.6f}')
+            lines.append(f'{self.name}_count{{{label_text}}} {cumulative}')
+        return lines
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsRegistry:
+    def __init__(self):
+        labels = ('view', 'method')
+        self.duration = Histogram('lms_http_request_duration_seconds', 'Время ответа на запрос.',
+                                  labels + ('status',), DURATION_BUCKETS)
+        self.db_queries = Histogram('lms_http_request_db_queries', 'Число SQL-запросов на запрос.',
+                                    labels, QUERY_BUCKETS)
+        self.db_time = Histogram('lms_http_request_db_duration_seconds', 'Время SQL-запросов на запрос.',
+                                 labels, DURATION_BUCKETS)
+        self.serialization_time = Histogram('lms_http_request_serialization_duration_seconds',
+                                            'Время сериализации и рендеринга ответа.', labels, DURATION_BUCKETS)
+        self.stripe_time = Histogram('lms_http_request_stripe_duration_seconds', 'Время вызовов Stripe на запрос.',
+                                     labels, DURATION_BUCKETS)
+        self._lock = threading.Lock()
+
+    def observe(self, view, method, status, duration, timings):
+        labels = (view, method)
+        with self._lock:
+            self.duration.observe(labels + (str(status),), duration)
+            self.db_queries.observe(labels, timings.db_queries)
+            self.db_time.observe(labels, timings.db_time)
+            self.serialization_time.observe(labels, timings.serialization_time)
+            self.stripe_time.observe(labels, timings.stripe_time)
+
+    def expose(self):
+        with self._lock:
+            lines = []
+            for histogram in (self.duration, self.db_queries, self.db_time, self.serialization_time,
+                              self.stripe_time):
+                lines.extend(histogram.expose())
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        with self._lock:
+            for histogram in (self.duration, self.db_queries, self.db_time, self.serialization_time,
+                              self.stripe_time):
+                histogram.series.clear()
+
+
+registry = MetricsRegistry()
+
+
+def server_timing(duration, timings):
+    parts = [
+        f'total;dur={duration * 1000:.1f}',
+        f'db;dur={timings.db_time * 1000:.1f};desc="{timings.db_queries} queries"',
+        f'ser;dur={timings.serialization_time * 1000:.1f}',
+    ]
+    if timings.stripe_time:
+        parts.append(f'stripe;dur={timings.stripe_time * 1000:.1f}')
+    return ', '.join(parts)
+
+
+class MetricsMiddleware:
+    """
+    Замеряет запрос и добавляет заголовок Server-Timing. Ставится первым в MIDDLEWARE,
+    чтобы в замер попадала вся цепочка. Время потоковых ответов считается до начала передачи.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        instrument()
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        duration = time.perf_counter() - start
+
+        # Имя представления вместо пути: число рядов метрик не растет с числом объектов
+        match = request.resolver_match
+        view = (match.view_name or match.route) if match else 'unmatched'
+        registry.observe(view, request.method, response.status_code, duration, timings)
+        if settings.METRICS_SERVER_TIMING:
+            response['Server-Timing'] = server_timing(duration, timings)
+        return response
+
+
+def metrics_view(request):
+    """
+    Метрики в текстовом формате Prometheus. Если задан METRICS_TOKEN, нужен заголовок
+    Authorization: Bearer <токен> (для Prometheus), без него — вход сотрудника (сессия или JWT).
+    """
+    if settings.METRICS_TOKEN:
+        expected = f'Bearer {settings.METRICS_TOKEN}'.encode()
+        allowed = hmac.compare_digest(request.headers.get('Authorization', '').encode(), expected)
+    else:
+        user = get_user(request)
+        allowed = user is not None and user.is_staff
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.expose(), content_type='text/plain; version=0.0.4; charset=utf-8')
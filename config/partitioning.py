@@ -0,0 +1,185 @@
+"""
+Помесячное декларативное партиционирование таблиц платежей на PostgreSQL.
+
+Таблицы только дополняются, поэтому каждая хранится как набор помесячных секций по столбцу
+даты плюс секция по умолчанию. Первичный ключ в БД — (id, дата), для Django ключом остается id.
+Запросы с фильтром по самому столбцу даты (date__gte/date__lt, но не date__date) затрагивают
+только нужные секции. Миграции таблицы не трогают: перестраивает их только команда
+partition_payments --convert, на других СУБД таблицы остаются обычными.
+"""
+from datetime import date
+
+from django.conf import settings
+from django.utils import timezone
+
+# Таблица -> столбец, по которому она секционируется
+PARTITIONED_TABLES = {
+    'users_payment': 'date',
+    'lms_payment': 'created_at',
+}
+
+
+def is_supported(connection):
+    return connection.vendor == 'postgresql'
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_range(first, last):
+    """
+    Первые числа месяцев от first до last включительно.
+    """
+    month, last = month_start(first), month_start(last)
+    while month <= last:
+        yield month
+        month = add_months(month, 1)
+
+
+def partition_name(table, month):
+    return f'{table}_p{month:%Y%m}'
+
+
+def default_partition_name(table):
+    return f'{table}_default'
+
+
+def bound(month):
+    return f'{month:%Y-%m-%d} 00:00:00+00'  # Границы секций — по UTC
+
+
+def is_partitioned(cursor, table):
+    cursor.execute('SELECT EXISTS(SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass)', [table])
+    return cursor.fetchone()[0]
+
+
+def list_partitions(cursor, table):
+    """
+    Помесячные секции таблицы: список (имя, первое число месяца) по возрастанию.
+    """
+    cursor.execute(
+        'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+        'WHERE i.inhparent = %s::regclass', [table]
+    )
+    prefix = f'{table}_p'
+    partitions = []
+    for (name,) in cursor.fetchall():
+        suffix = name[len(prefix):]
+        if name.startswith(prefix) and len(suffix) == 6 and suffix.isdigit():
+            partitions.append((name, date(int(suffix[:4]), int(suffix[4:]), 1)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def create_partition(cursor, table, month):
+    """
+    Создает секцию месяца, если ее нет. Строки этого месяца, попавшие в секцию по умолчанию,
+    переносятся в новую секцию до ее подключения. Возвращает True, если секция создана.
+    """
+    name = partition_name(table, month)
+    cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [name])
+    if cursor.fetchone()[0]:
+        return False
+    column = PARTITIONED_TABLES[table]
+    start, end = bound(month), bound(add_months(month, 1))
+    cursor.execute(f'CREATE TABLE "{name}" (LIKE "{table}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+    cursor.execute(
+        f'WITH moved AS (DELETE FROM "{default_partition_name(table)}" '
+        f'WHERE "{column}" >= %s AND "{column}" < %s RETURNING *) '
+        f'INSERT INTO "{name}" SELECT * FROM moved', [start, end]
+    )
+    cursor.execute(f"ALTER TABLE \"{table}\" ATTACH PARTITION \"{name}\" FOR VALUES FROM ('{start}') TO ('{end}')")
+    return True
+
+
+def ensure_partitions(cursor, table, ahead, start=None):
+    """
+    Создает секции с месяца start (по умолчанию текущего) на ahead месяцев вперед.
+    Возвращает имена созданных секций.
+    """
+    first = month_start(start or timezone.now())
+    last = add_months(month_start(timezone.now()), ahead)
+    return [partition_name(table, month) for month in month_range(first, last)
+            if create_partition(cursor, table, month)]
+
+
+def detach_partitions(cursor, table, before, drop=False):
+    """
+    Отсоединяет секции месяцев, целиком лежащих раньше before. Отсоединенная секция остается
+    обычной таблицей (архивом) под тем же именем; drop=True удаляет ее.
+    """
+    detached = []
+    for name, month in list_partitions(cursor, table):
+        if add_months(month, 1) > month_start(before):
+            continue
+        cursor.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"')
+        if drop:
+            cursor.execute(f'DROP TABLE "{name}"')
+        detached.append(name)
+    return detached
+
+
+def convert_table(connection, table, partitioned=True):
+    """
+    Перестраивает таблицу в секционированную (или обратно в обычную) с переносом данных,
+    индексов и ограничений. Таблица блокируется на время копирования, поэтому на больших
+    объемах запускать в окно обслуживания. Возвращает False, если таблица уже в нужном виде.
+    """
+    column = PARTITIONED_TABLES[table]
+    legacy = f'{table}_legacy'
+    with connection.cursor() as cursor:
+        if is_partitioned(cursor, table) == partitioned:
+            return False
+        cursor.execute(f'LOCK TABLE "{table}" IN ACCESS EXCLUSIVE MODE')
+        # Отложенные проверки внешних ключей этой транзакции не дают удалить старую таблицу
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+        # Внешние ключи на секционированную таблицу должны включать столбец секционирования
+        cursor.execute('SELECT conname, conrelid::regclass::text FROM pg_constraint WHERE confrelid = %s::regclass',
+                       [table])
+        references = cursor.fetchall()
+        if references:
+            raise RuntimeError(f'На таблицу {table} ссылаются внешние ключи: {references}; '
+                               f'их нужно объявить с db_constraint=False.')
+
+        cursor.execute(
+            'SELECT pg_get_indexdef(ix.indexrelid) FROM pg_index ix WHERE ix.indrelid = %s::regclass '
+            'AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = ix.indexrelid)', [table]
+        )
+        indexes = [definition.replace(' ON ONLY ', ' ON ') for (definition,) in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype IN ('c', 'f', 'u')", [table]
+        )
+        constraints = cursor.fetchall()
+        cursor.execute(f'SELECT MIN("{column}") FROM "{table}"')
+        oldest = cursor.fetchone()[0]
+
+        cursor.execute(f'ALTER TABLE "{table}" RENAME TO "{legacy}"')
+        partition_by = f' PARTITION BY RANGE ("{column}")' if partitioned else ''
+        cursor.execute(f'CREATE TABLE "{table}" (LIKE "{legacy}" INCLUDING DEFAULTS){partition_by}')
+        cursor.execute(f'ALTER TABLE "{table}" ALTER COLUMN "id" DROP DEFAULT')
+        if partitioned:
+            cursor.execute(f'CREATE TABLE "{default_partition_name(table)}" PARTITION OF "{table}" DEFAULT')
+            ensure_partitions(cursor, table, settings.PAYMENT_PARTITIONS_AHEAD, start=oldest)
+
+        cursor.execute(f'INSERT INTO "{table}" SELECT * FROM "{legacy}"')
+        cursor.execute(f'DROP TABLE "{legacy}"')  # Вместе со старыми секциями и последовательностью id
+
+        primary_key = f'"id", "{column}"' if partitioned else '"id"'
+        cursor.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{table}_pkey" PRIMARY KEY ({primary_key})')
+        for definition in indexes:
+            cursor.execute(definition)
+        for name, definition in constraints:
+            cursor.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{name}" {definition}')
+
+        # Обычная последовательность вместо identity: identity на секционированных таблицах есть не во всех версиях
+        cursor.execute(f'CREATE SEQUENCE "{table}_id_seq" OWNED BY "{table}"."id"')
+        cursor.execute(f'ALTER TABLE "{table}" ALTER COLUMN "id" SET DEFAULT nextval(\'"{table}_id_seq"\')')
+        cursor.execute(f'SELECT setval(\'"{table}_id_seq"\', COALESCE(MAX("id"), 0) + 1, false) FROM "{table}"')
+    return True
@@ -0,0 +1,256 @@
+"""
+Профилирование отдельных запросов по требованию в работающем окружении.
+
+Запрос профилируется, если включен PROFILING_ENABLED, пришел заголовок X-Profile: 1 или параметр
+?_profile=1, пользователь — сотрудник (is_staff), и запрос попал в выборку PROFILING_SAMPLE_RATE.
+Запрос выполняется под cProfile, параллельно сэмплер снимает стеки потока для флеймграфа.
+В профиль попадает вся диспетчеризация DRF, а время аутентификации, проверки прав, сериализации
+и рендеринга выносится в отдельную сводку. Профили хранятся в каталоге PROFILING_DIR,
+самые старые удаляются сверх PROFILING_MAX_PROFILES. Список — /api/profiles/ (только сотрудники).
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, Http404
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.serializers import BaseSerializer
+from rest_framework.views import APIView
+
+from config.auth import get_user
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_PARAM = '_profile'
+FILE_KINDS = {
+    'prof': ('.prof', 'application/octet-stream'),  # pstats/snakeviz
+    'collapsed': ('.collapsed', 'text/plain; charset=utf-8'),  # flamegraph.pl, speedscope
+    'json': ('.json', 'application/json'),
+}
+
+
+def code_key(func):
+    code = func.__code__
+    return code.co_filename, code.co_firstlineno, code.co_name
+
+
+# Этапы диспетчеризации DRF: функции, накопленное время которых показывается в сводке
+PHASES = {
+    'authentication': [code_key(APIView.perform_authentication)],
+    'permissions': [code_key(APIView.check_permissions), code_key(APIView.check_object_permissions)],
+    'throttling': [code_key(APIView.check_throttles)],
+    'serialization': [code_key(BaseSerializer.__dict__['data'].fget)],
+    'rendering': [(sys.modules[Response.__module__].__file__, None, 'rendered_content')],
+    'dispatch': [code_key(APIView.dispatch)],
+}
+
+
+def phase_times(stats):
+    """
+    Накопленное время этапов, мс. Ключ с lineno=None сравнивается только по файлу и имени функции.
+    """
+    result = {}
+    for phase, keys in PHASES.items():
+        total = 0.0
+        for (filename, lineno, name), (_, _, _, cumulative, _) in stats.stats.items():
+            if any(filename == key[0] and name == key[2] and key[1] in (None, lineno) for key in keys):
+                total += cumulative
+        result[phase] = round(total * 1000, 2)
+    return result
+
+
+def top_functions(stats, limit=20):
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+    return [
+        {'function': f'{name} ({filename}:{lineno})', 'calls': calls, 'own_ms': round(own * 1000, 2),
+         'cumulative_ms': round(cumulative * 1000, 2)}
+        for (filename, lineno, name), (_, calls, own, cumulative, _) in rows
+    ]
+
+
+class StackSampler:
+    """
+    Снимает стек заданного потока каждые interval секунд и считает одинаковые стеки
+    (формат collapsed stacks: "внешняя;...;внутренняя количество").
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self.run, name='profiling-sampler', daemon=True)
+
+    def run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class ProfileStore:
+    """
+    Кольцо профилей на диске: на каждый профиль три файла <id>.prof, <id>.collapsed, <id>.json.
+    Id начинается с времени, поэтому сортировка имен дает порядок записи.
+    """
+
+    def __init__(self, directory, max_profiles):
+        self.directory = Path(directory)
+        self.max_profiles = max(1, max_profiles)
+        self._lock = threading.Lock()
+
+    def new_id(self):
+        return f'{datetime.now():%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}'
+
+    def save(self, profile_id, stats, collapsed, meta):
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            stats.dump_stats(self.path(profile_id, 'prof'))
+            self.path(profile_id, 'collapsed').write_text(collapsed)
+            self.path(profile_id, 'json').write_text(json.dumps(meta, ensure_ascii=False, indent=2))
+            for old_id in self.ids()[:-self.max_profiles or None]:
+                for kind in FILE_KINDS:
+                    self.path(old_id, kind).unlink(missing_ok=True)
+
+    def path(self, profile_id, kind):
+        return self.directory / f'{profile_id}{FILE_KINDS[kind][0]}'
+
+    def ids(self):
+        if not self.directory.is_dir():
+            return []
+        return sorted(path.stem for path in self.directory.glob('*.json'))
+
+    def list(self):
+        profiles = []
+        for profile_id in reversed(self.ids()):
+            try:
+                profiles.append(json.loads(self.path(profile_id, 'json').read_text()))
+            except (OSError, ValueError):
+                continue  # Профиль удален кольцом во время чтения
+        return profiles
+
+
+def get_store():
+    return ProfileStore(settings.PROFILING_DIR, settings.PROFILING_MAX_PROFILES)
+
+
+# cProfile в Python 3.12+ допускает один активный профилировщик на интерпретатор
+_profiler_lock = threading.Lock()
+
+
+def is_profiling_requested(request):
+    return request.headers.get(PROFILE_HEADER) == '1' or request.GET.get(PROFILE_PARAM) == '1'
+
+
+def get_staff_user(request):
+    """
+    Сотрудник из сессии или JWT. Токен проверяется здесь, до DRF, только для запросов с флагом профилирования.
+    """
+    user = get_user(request)
+    return user if user is not None and user.is_staff else None
+
+
+class ProfilingMiddleware:
+    """
+    Профилирует запрос целиком: представление DRF, права, сериализацию и рендеринг.
+    Ставится после AuthenticationMiddleware. В ответ добавляется заголовок X-Profile-Id.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not is_profiling_requested(request) or random.random() >= settings.PROFILING_SAMPLE_RATE:
+            return self.get_response(request)
+        user = get_staff_user(request)
+        if user is None or not _profiler_lock.acquire(blocking=False):
+            return self.get_response(request)  # Нет прав или уже идет другой профиль
+
+        try:
+            profiler = cProfile.Profile()
+            start = time.perf_counter()
+            with StackSampler(threading.get_ident(), settings.PROFILING_SAMPLER_INTERVAL) as sampler:
+                profiler.enable()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    profiler.disable()
+            duration = time.perf_counter() - start
+        finally:
+            _profiler_lock.release()
+
+        stats = pstats.Stats(profiler, stream=io.StringIO())
+        store = get_store()
+        profile_id = store.new_id()
+        match = request.resolver_match
+        store.save(profile_id, stats, sampler.collapsed(), {
+            'id': profile_id,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'user_id': user.pk,
+            'duration_ms': round(duration * 1000, 2),
+            'samples': sum(sampler.stacks.values()),
+            'phases_ms': phase_times(stats),
+            'top_functions': top_functions(stats),
+        })
+        response['X-Profile-Id'] = profile_id
+        return response
+
+
+class ProfileListView(APIView):
+    permission_classes = [IsAdminUser]
+
+    @swagger_auto_schema(operation_description="Сохраненные профили запросов, новые первыми (без списка функций).")
+    def get(self, request):
+        profiles = [
+            {key: value for key, value in profile.items() if key != 'top_functions'}
+            for profile in get_store().list()
+        ]
+        return Response(profiles)
+
+
+class ProfileFileView(APIView):
+    permission_classes = [IsAdminUser]
+
+    @swagger_auto_schema(operation_description="Файл профиля: prof (cProfile), collapsed (флеймграф) или json.")
+    def get(self, request, profile_id, kind):
+        store = get_store()
+        if kind not in FILE_KINDS or profile_id not in store.ids():
+            raise Http404
+        path = store.path(profile_id, kind)
+        return FileResponse(path.open('rb'), content_type=FILE_KINDS[kind][1],
+                            as_attachment=kind != 'json', filename=path.name)
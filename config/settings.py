@@ -3,6 +3,7 @@ from pathlib import Path
 from dotenv import load_dotenv
 import stripe
 
+# Пустое значение из .env (KEY=) означает значение по умолчанию: настройки читаются как os.getenv(...) or <default>
 load_dotenv()
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -39,9 +40,20 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # JSON через orjson, если он установлен (см. config/fastjson.py)
+    'DEFAULT_RENDERER_CLASSES': [
+        'config.fastjson.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'config.fastjson.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 MIDDLEWARE = [
+    'config.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -49,6 +61,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'config.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -73,7 +86,8 @@ WSGI_APPLICATION = 'config.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql_psycopg2',
+        # DB_ENGINE=django.db.backends.sqlite3 и NAME=<файл> — локальная SQLite, например для benchmark_api
+        'ENGINE': os.getenv('DB_ENGINE') or 'django.db.backends.postgresql_psycopg2',
         'NAME': os.getenv('NAME'),
         'USER': os.getenv('USER'),
         'PASSWORD': os.getenv('PASSWORD'),
@@ -99,9 +113,104 @@ AUTH_PASSWORD_VALIDATORS = [
 
 AUTH_USER_MODEL = 'users.CustomUser'
 
+CACHE_URL = os.getenv('CACHE_URL')
+
+if CACHE_URL:
+    # Общий кэш для всех процессов (Redis)
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'lms',
+        }
+    }
+
+# Кэш ответов списков курсов и уроков
+LMS_RESPONSE_CACHE_ALIAS = os.getenv('LMS_RESPONSE_CACHE_ALIAS') or 'default'
+LMS_RESPONSE_CACHE_TIMEOUT = int(os.getenv('LMS_RESPONSE_CACHE_TIMEOUT') or 300)
+
+# Асинхронное создание сессий оплаты (см. lms/checkout.py и команду run_checkout_worker)
+CHECKOUT_ASYNC = (os.getenv('CHECKOUT_ASYNC') or 'False') == 'True'
+CHECKOUT_MAX_ATTEMPTS = int(os.getenv('CHECKOUT_MAX_ATTEMPTS') or 5)
+CHECKOUT_LOCK_TIMEOUT = int(os.getenv('CHECKOUT_LOCK_TIMEOUT') or 300)
+# Ожидание в ?wait=N занимает WSGI-воркер, поэтому короткое; дальше клиент опрашивает по Retry-After
+CHECKOUT_STATUS_MAX_WAIT = int(os.getenv('CHECKOUT_STATUS_MAX_WAIT') or 3)
+
+# Вызовы Stripe (см. lms/stripe_client.py): таймаут, повторы, размыкатель цепи
+STRIPE_API_BASE = os.getenv('STRIPE_API_BASE')  # Например, адрес локального фейкового Stripe
+STRIPE_TIMEOUT = float(os.getenv('STRIPE_TIMEOUT') or 10)
+STRIPE_MAX_RETRIES = int(os.getenv('STRIPE_MAX_RETRIES') or 2)
+STRIPE_BACKOFF_BASE = float(os.getenv('STRIPE_BACKOFF_BASE') or 0.5)
+STRIPE_BACKOFF_MAX = float(os.getenv('STRIPE_BACKOFF_MAX') or 5)
+STRIPE_BREAKER_THRESHOLD = int(os.getenv('STRIPE_BREAKER_THRESHOLD') or 5)
+STRIPE_BREAKER_RESET_TIMEOUT = int(os.getenv('STRIPE_BREAKER_RESET_TIMEOUT') or 30)
+
+# Размер LRU-кэша продуктов и цен Stripe в процессе (см. lms/services.py)
+STRIPE_CATALOG_CACHE_SIZE = int(os.getenv('STRIPE_CATALOG_CACHE_SIZE') or 1024)
+
+# Заголовок Idempotency-Key: срок хранения ответа и ожидание параллельного повтора, сек
+IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL') or 24 * 60 * 60)
+IDEMPOTENCY_WAIT_TIMEOUT = int(os.getenv('IDEMPOTENCY_WAIT_TIMEOUT') or 10)
+# Незавершенный запрос старше этого считается прерванным (упал процесс), и повтор выполняет его заново.
+# Должно быть больше IDEMPOTENCY_WAIT_TIMEOUT и таймаута запроса в WSGI-сервере
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.getenv('IDEMPOTENCY_LOCK_TIMEOUT') or 120)
+
+# Помесячное партиционирование таблиц платежей на PostgreSQL: включается командой partition_payments --convert
+PAYMENT_PARTITIONS_AHEAD = int(os.getenv('PAYMENT_PARTITIONS_AHEAD') or 3)  # Месяцев вперед
+# Месяцев истории, 0 — хранить все
+PAYMENT_PARTITIONS_RETENTION = int(os.getenv('PAYMENT_PARTITIONS_RETENTION') or 0)
+
+# Замеры запросов: заголовок Server-Timing и эндпоинт /metrics для Prometheus (см. config/metrics.py)
+METRICS_ENABLED = (os.getenv('METRICS_ENABLED') or 'True') == 'True'
+METRICS_SERVER_TIMING = (os.getenv('METRICS_SERVER_TIMING') or 'True') == 'True'
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')  # /metrics: Authorization: Bearer <токен>; без токена — только сотрудники
+
+# Профилирование запросов по заголовку X-Profile: 1 или ?_profile=1 от сотрудников (см. config/profiling.py)
+PROFILING_ENABLED = (os.getenv('PROFILING_ENABLED') or 'False') == 'True'
+# Доля помеченных запросов, которые профилируются
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE') or 1)
+PROFILING_DIR = os.getenv('PROFILING_DIR') or BASE_DIR / 'profiles'  # Каталог в .gitignore
+PROFILING_MAX_PROFILES = int(os.getenv('PROFILING_MAX_PROFILES') or 50)
+PROFILING_SAMPLER_INTERVAL = float(os.getenv('PROFILING_SAMPLER_INTERVAL') or 0.001)  # Шаг сэмплера стеков, с
+
+# Рендеринг и разбор JSON через orjson; False — стандартный json DRF (например, для сравнения)
+FAST_JSON_ENABLED = (os.getenv('FAST_JSON_ENABLED') or 'True') == 'True'
+
+# Списки курсов, уроков, платежей и пользователей через .values() без моделей (см. config/fastpath.py)
+SERIALIZER_FAST_PATH = (os.getenv('SERIALIZER_FAST_PATH') or 'True') == 'True'
+
+# Уменьшенные копии превью и аватаров (см. lms/images.py и команду run_image_worker)
+IMAGE_VARIANT_WIDTHS = [int(width) for width in (os.getenv('IMAGE_VARIANT_WIDTHS') or '160,320,640').split(',')]
+IMAGE_VARIANT_FORMATS = (os.getenv('IMAGE_VARIANT_FORMATS') or 'webp,jpeg').split(',')
+IMAGE_VARIANT_QUALITY = int(os.getenv('IMAGE_VARIANT_QUALITY') or 80)
+IMAGE_JOB_MAX_ATTEMPTS = int(os.getenv('IMAGE_JOB_MAX_ATTEMPTS') or 5)
+IMAGE_JOB_LOCK_TIMEOUT = int(os.getenv('IMAGE_JOB_LOCK_TIMEOUT') or 300)
+
+# Загрузки больше этого размера пишутся во временный файл на диске, а не держатся в памяти запроса
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(os.getenv('FILE_UPLOAD_MAX_MEMORY_SIZE') or 256 * 1024)
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Отдача загруженных файлов через config/media.py; False — MEDIA_URL целиком обслуживает фронтовой сервер
+MEDIA_SERVE = (os.getenv('MEDIA_SERVE') or 'True') == 'True'
+MEDIA_REQUIRE_AUTH = (os.getenv('MEDIA_REQUIRE_AUTH') or 'True') == 'True'  # False — файлы без правила публичны
+# Каталог -> функция (пользователь, путь) -> bool; правило действует и при MEDIA_REQUIRE_AUTH=False
+MEDIA_ACCESS_CHECKS = {
+    'avatars/': 'users.permissions.can_view_avatar',
+}
+# nginx (X-Accel-Redirect), sendfile (X-Sendfile) или пусто — файл отдает Django
+MEDIA_ACCEL = os.getenv('MEDIA_ACCEL') or ''
+MEDIA_ACCEL_PREFIX = os.getenv('MEDIA_ACCEL_PREFIX') or '/protected-media/'  # Внутренний location nginx
+MEDIA_CACHE_MAX_AGE = int(os.getenv('MEDIA_CACHE_MAX_AGE') or 60 * 60)  # Для файлов без хэша в имени, сек
+MEDIA_CHUNK_SIZE = int(os.getenv('MEDIA_CHUNK_SIZE') or 64 * 1024)
+
 LANGUAGE_CODE = 'en-us'
 
 TIME_ZONE = 'UTC'
@@ -1,5 +1,4 @@
 from django.conf import settings
-from django.conf.urls.static import static
 from django.urls import path, include
 from django.contrib import admin
 from rest_framework.authentication import TokenAuthentication
@@ -9,6 +8,9 @@ from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+from config.media import serve_media
+from config.metrics import metrics_view
+from config.profiling import ProfileFileView, ProfileListView
 from lms.views import success_view, cancel_view
 
 schema_view = get_schema_view(
@@ -38,10 +40,20 @@ urlpatterns = [
     path('swagger.json', schema_view.without_ui(cache_timeout=0), name='schema-json'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
 
+    # Метрики Prometheus
+    path('metrics', metrics_view, name='metrics'),
+
+    # Профили запросов (только сотрудники)
+    path('api/profiles/', ProfileListView.as_view(), name='profile-list'),
+    path('api/profiles/<str:profile_id>/<str:kind>/', ProfileFileView.as_view(), name='profile-file'),
+
     # Пути для успеха и отмены
     path('success/', success_view, name='success'),
     path('cancel/', cancel_view, name='cancel'),
 ]
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+if settings.MEDIA_SERVE:
+    # Загруженные файлы: проверка доступа, Range, ETag, отдача через прокси (config/media.py)
+    urlpatterns += [
+        path(f"{settings.MEDIA_URL.strip('/')}/<path:path>", serve_media, name='media'),
+    ]
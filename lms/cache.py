@@ -0,0 +1,118 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+COURSES = 'courses'
+LESSONS = 'lessons'
+
+GENERATION_KEY = 'lms:gen:{}'
+RESPONSE_KEY = 'lms:resp:{resource}:{generation}:{scope}:{digest}'
+HITS_KEY = 'lms:stats:hits'
+MISSES_KEY = 'lms:stats:misses'
+
+
+def get_cache():
+    return caches[settings.LMS_RESPONSE_CACHE_ALIAS]
+
+
+def _initial_generation():
+    # Если счётчик вытеснен из кэша, начинаем с метки времени, чтобы не совпасть со старыми ключами
+    return int(time.time() * 1000)
+
+
+def get_generations(resources):
+    """
+    Возвращает текущие поколения ресурсов одним обращением к кэшу.
+    """
+    cache = get_cache()
+    keys = {resource: GENERATION_KEY.format(resource) for resource in resources}
+    values = cache.get_many(keys.values())
+    generations = []
+    for resource, key in keys.items():
+        if key not in values:
+            cache.add(key, _initial_generation(), timeout=None)
+            values[key] = cache.get(key)
+        generations.append(str(values[key]))
+    return generations
+
+
+def _bump(resources):
+    cache = get_cache()
+    for resource in resources:
+        key = GENERATION_KEY.format(resource)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial_generation(), timeout=None)
+
+
+def bump_generations(*resources):
+    """
+    Инвалидирует закэшированные ответы ресурсов.
+    Поколение увеличивается сразу (свежие данные видны внутри транзакции) и ещё раз после коммита,
+    чтобы ответы, закэшированные другими запросами до коммита, тоже стали недоступны.
+    """
+    _bump(resources)
+    transaction.on_commit(lambda: _bump(resources))
+
+
+def _incr_stat(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def get_cache_stats():
+    cache = get_cache()
+    values = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits, misses = values.get(HITS_KEY, 0), values.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else None,
+    }
+
+
+class CachedListMixin:
+    """
+    Кэширует ответ list() по пользователю или роли, странице и параметрам запроса.
+    Ключ включает поколения ресурсов из cache_resources, поэтому запись в модели
+    (см. lms/signals.py и bump_generations) сразу делает старые ответы недоступными.
+    """
+    cache_resources = ()
+
+    def get_list_cache_scope(self):
+        user = self.request.user
+        return f"user:{user.pk}:{'moderator' if user.is_moderator else 'user'}"
+
+    def get_list_cache_key(self, request):
+        params = sorted((key, value) for key in request.query_params for value in request.query_params.getlist(key))
+        raw = f'{request.get_host()}|{request.path}|{params}'
+        return RESPONSE_KEY.format(
+            resource='-'.join(self.cache_resources),
+            generation='-'.join(get_generations(self.cache_resources)),
+            scope=self.get_list_cache_scope(),
+            digest=hashlib.md5(raw.encode()).hexdigest(),
+        )
+
+    def list(self, request, *args, **kwargs):
+        cache = get_cache()
+        key = self.get_list_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            _incr_stat(HITS_KEY)
+            return Response(data)
+
+        _incr_stat(MISSES_KEY)
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.LMS_RESPONSE_CACHE_TIMEOUT)
+        return response
@@ -0,0 +1,96 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Payment, PaymentOutbox
+from .services import create_stripe_session, get_or_create_stripe_price
+
+
+def run_checkout(payment: Payment) -> Payment:
+    """
+    Создает сессию оплаты в Stripe и сохраняет ее в платеже.
+    Продукт и цена берутся из каталога и создаются в Stripe только для новых пар (название, сумма).
+    """
+    payment.stripe_product_id, payment.stripe_price_id = get_or_create_stripe_price(
+        payment.product_name, payment.product_price,
+    )
+    payment.stripe_session_url = create_stripe_session(payment.stripe_price_id)
+    payment.status = Payment.STATUS_COMPLETED
+    payment.error = ''
+    payment.save()
+    return payment
+
+
+def enqueue_checkout(payment: Payment) -> PaymentOutbox:
+    """
+    Ставит создание сессии оплаты в очередь. Вызывается в той же транзакции, что и создание платежа.
+    """
+    return PaymentOutbox.objects.create(payment=payment)
+
+
+def claim_outbox_batch(batch_size: int) -> list:
+    """
+    Забирает пачку готовых к обработке задач и помечает их взятыми.
+    Задачи, зависшие у упавшего воркера дольше CHECKOUT_LOCK_TIMEOUT, забираются повторно.
+    """
+    now = timezone.now()
+    stale_lock = now - timedelta(seconds=settings.CHECKOUT_LOCK_TIMEOUT)
+    claimable = Q(locked_at__isnull=True) | Q(locked_at__lt=stale_lock)
+    with transaction.atomic():
+        queryset = PaymentOutbox.objects.filter(
+            claimable, processed_at__isnull=True, available_at__lte=now,
+        ).order_by('id')
+        if connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+            entries = list(queryset.select_related('payment')[:batch_size])
+            PaymentOutbox.objects.filter(pk__in=[entry.pk for entry in entries]).update(locked_at=now)
+            return entries
+        # Без SKIP LOCKED (SQLite) те же строки может выбрать и другой воркер: каждая задача забирается
+        # условным UPDATE, и обрабатываются только те, которые обновил этот воркер
+        candidates = list(queryset.select_related('payment')[:batch_size])
+        return [
+            entry for entry in candidates
+            if PaymentOutbox.objects.filter(claimable, pk=entry.pk, processed_at__isnull=True).update(locked_at=now)
+        ]
+
+
+def process_outbox_entry(entry: PaymentOutbox) -> bool:
+    """
+    Выполняет одну задачу. При ошибке повторяет с экспоненциальной задержкой,
+    после CHECKOUT_MAX_ATTEMPTS попыток помечает платеж как неуспешный.
+    """
+    payment = entry.payment
+    now = timezone.now()
+    try:
+        run_checkout(payment)
+    except Exception as e:
+        entry.attempts += 1
+        entry.last_error = str(e)
+        entry.locked_at = None
+        if entry.attempts >= settings.CHECKOUT_MAX_ATTEMPTS:
+            entry.processed_at = now
+            payment.status = Payment.STATUS_FAILED
+            payment.error = str(e)
+            payment.save(update_fields=['status', 'error'])
+        else:
+            entry.available_at = now + timedelta(seconds=2 ** entry.attempts)
+        entry.save()
+        return False
+
+    entry.attempts += 1
+    entry.processed_at = now
+    entry.save(update_fields=['attempts', 'processed_at'])
+    return True
+
+
+def process_outbox(batch_size: int = 10) -> int:
+    """
+    Обрабатывает одну пачку задач. Возвращает количество взятых задач.
+    """
+    entries = claim_outbox_batch(batch_size)
+    for entry in entries:
+        process_outbox_entry(entry)
+    return len(entries)
@@ -0,0 +1,83 @@
+import hashlib
+
+from django.db import transaction
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'Ресурс был изменён. Получите актуальную версию и повторите запрос.'
+    default_code = 'precondition_failed'
+
+
+def etag_matches(header, etag):
+    if not header:
+        return False
+    etags = parse_etags(header)
+    return '*' in etags or etag in etags
+
+
+class ConditionalDetailMixin:
+    """
+    ETag для детальных представлений без сериализации объекта.
+
+    Валидатор строится из версии строки (поля etag_fields, прежде всего updated_at),
+    которая читается одним лёгким запросом. GET с актуальным If-None-Match получает 304,
+    PUT/PATCH с устаревшим If-Match — 412 (версия перечитывается под блокировкой строки).
+    """
+    etag_fields = ('updated_at',)
+
+    def get_etag_queryset(self):
+        return self.get_queryset()
+
+    def make_etag(self, values):
+        # Ответ зависит и от параметров запроса, поэтому они входят в валидатор
+        raw = '|'.join(str(value) for value in values) + '|' + self.request.query_params.urlencode()
+        return quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
+    def get_current_etag(self):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        values = self.get_etag_queryset().filter(
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        ).values_list(*self.etag_fields).first()
+        if values is None:
+            return None
+        return self.make_etag(values)
+
+    def get_instance_etag(self, instance):
+        return self.make_etag([getattr(instance, field) for field in self.etag_fields])
+
+    def retrieve(self, request, *args, **kwargs):
+        etag = self.get_current_etag()
+        if etag and etag_matches(request.headers.get('If-None-Match'), etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        response = super().retrieve(request, *args, **kwargs)
+        if etag:
+            response['ETag'] = etag
+        return response
+
+    def update(self, request, *args, **kwargs):
+        response = super().update(request, *args, **kwargs)
+        instance = getattr(self, '_updated_instance', None)
+        if response.status_code == status.HTTP_200_OK and instance is not None:
+            response['ETag'] = self.get_instance_etag(instance)
+        return response
+
+    def perform_update(self, serializer):
+        if_match = self.request.headers.get('If-Match')
+        if not if_match:
+            super().perform_update(serializer)
+            self._updated_instance = serializer.instance
+            return
+        instance = serializer.instance
+        with transaction.atomic():
+            # Сравнение и запись под блокировкой строки: параллельное изменение с тем же ETag
+            # дождется коммита первого и получит 412, а не перезапишет его
+            list(type(instance)._default_manager.select_for_update().filter(pk=instance.pk).values_list('pk'))
+            if not etag_matches(if_match, self.get_current_etag()):
+                raise PreconditionFailed()
+            super().perform_update(serializer)
+        self._updated_instance = serializer.instance
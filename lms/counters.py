@@ -0,0 +1,77 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import Course, Lesson, Subscription
+
+COUNTED_RELATIONS = {
+    'lessons_count': Lesson,
+    'subscribers_count': Subscription,
+}
+
+
+def adjust_course_counters(course_ids, **deltas):
+    """
+    Изменяет счетчики курсов на delta одним UPDATE с F()-выражением, например
+    adjust_course_counters([1, 2], subscribers_count=-1). Вызывается в транзакции записи.
+    Версия курса (updated_at) тоже меняется, так как счетчики входят в ответ API.
+    """
+    course_ids = set(course_ids) - {None}
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not course_ids or not deltas:
+        return 0
+    updates = {
+        field: Greatest(F(field) + delta, 0) if delta < 0 else F(field) + delta
+        for field, delta in deltas.items()
+    }
+    return Course.objects.filter(pk__in=course_ids).update(updated_at=timezone.now(), **updates)
+
+
+def lock_courses(course_ids):
+    """
+    Блокирует строки курсов до конца транзакции в порядке id, чтобы параллельные изменения
+    подписок на одни и те же курсы не блокировали друг друга крест-накрест.
+    Возвращает множество id найденных курсов.
+    """
+    return set(Course.objects.select_for_update().filter(pk__in=course_ids).order_by('pk')
+               .values_list('pk', flat=True))
+
+
+def actual_count(field):
+    model = COUNTED_RELATIONS[field]
+    counts = model.objects.filter(course=OuterRef('pk')).values('course').annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts), 0)
+
+
+def recount_courses(course_ids):
+    """
+    Пересчитывает счетчики указанных курсов по фактическим данным.
+    Возвращает количество курсов, у которых значения расходились.
+    """
+    rows = Course.objects.filter(pk__in=course_ids).annotate(
+        **{f'actual_{field}': actual_count(field) for field in COUNTED_RELATIONS}
+    ).values_list('pk', *COUNTED_RELATIONS, *[f'actual_{field}' for field in COUNTED_RELATIONS])
+
+    size = len(COUNTED_RELATIONS)
+    drifted = []
+    for pk, *values in rows:
+        stored, actual = values[:size], values[size:]
+        if stored != actual:
+            drifted.append(Course(pk=pk, updated_at=timezone.now(), **dict(zip(COUNTED_RELATIONS, actual))))
+    Course.objects.bulk_update(drifted, [*COUNTED_RELATIONS, 'updated_at'])
+    return len(drifted)
+
+
+def recount_all_courses(batch_size=1000):
+    """
+    Пересчитывает счетчики всех курсов пачками по id. Возвращает (проверено, исправлено).
+    """
+    checked = fixed = 0
+    last_id = 0
+    while True:
+        ids = list(Course.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return checked, fixed
+        fixed += recount_courses(ids)
+        checked += len(ids)
+        last_id = ids[-1]
@@ -0,0 +1,145 @@
+import functools
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+
+
+def get_request_hash(request):
+    payload = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f'{request.get_full_path()}|{payload}'.encode()).hexdigest()
+
+
+def claim_key(user, scope, key, request_hash):
+    """
+    Создает запись для ключа. Возвращает (запись, True), если запрос выполняется впервые,
+    или (существующая запись, False) для повтора. Просроченная запись заменяется новой.
+    Незавершенный тот же запрос старше IDEMPOTENCY_LOCK_TIMEOUT (процесс упал) забирается повтором.
+    """
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    user=user, scope=scope, key=key, request_hash=request_hash, expires_at=expires_at, locked_at=now,
+                )
+            return record, True
+        except IntegrityError:
+            record = IdempotencyKey.objects.filter(user=user, scope=scope, key=key).first()
+            if record is None:
+                continue
+            if record.expires_at <= now:
+                record.delete()
+                continue
+            stale_lock = now - timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT)
+            if (record.state == IdempotencyKey.STATE_IN_PROGRESS and record.request_hash == request_hash
+                    and record.locked_at < stale_lock):
+                # Условный UPDATE: из нескольких повторов запрос забирает только один
+                taken = IdempotencyKey.objects.filter(
+                    pk=record.pk, state=IdempotencyKey.STATE_IN_PROGRESS, locked_at=record.locked_at,
+                ).update(locked_at=now, expires_at=expires_at)
+                if taken:
+                    record.locked_at, record.expires_at = now, expires_at
+                    return record, True
+                record.refresh_from_db()
+            return record, False
+    raise RuntimeError('Не удалось зарезервировать ключ идемпотентности.')
+
+
+def owned(record):
+    # Запись, пока ее не забрал повтор после истечения аренды
+    return IdempotencyKey.objects.filter(pk=record.pk, locked_at=record.locked_at)
+
+
+def wait_for_completion(record, timeout, interval=0.2):
+    """
+    Ждет, пока первый запрос с тем же ключом завершится. Возвращает актуальную запись или None.
+    """
+    deadline = time.monotonic() + timeout
+    while record.state == IdempotencyKey.STATE_IN_PROGRESS:
+        if time.monotonic() >= deadline:
+            return record
+        time.sleep(interval)
+        record = IdempotencyKey.objects.filter(pk=record.pk).first()
+        if record is None:
+            return None
+    return record
+
+
+def idempotent(method):
+    """
+    Декоратор метода APIView: запрос с заголовком Idempotency-Key выполняется один раз,
+    повторы получают сохраненный ответ (с заголовком Idempotent-Replayed: true).
+    Повтор, пришедший во время выполнения первого запроса, ждет его результата.
+    Ответы 5xx и исключения не сохраняются, чтобы клиент мог повторить запрос.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key or not request.user.is_authenticated:
+            return method(self, request, *args, **kwargs)
+        if len(key) > 255:
+            return Response({"error": f"{HEADER} is too long."}, status=status.HTTP_400_BAD_REQUEST)
+
+        scope = f'{self.__class__.__name__}.{method.__name__}'
+        request_hash = get_request_hash(request)
+        record, created = claim_key(request.user, scope, key, request_hash)
+
+        if not created:
+            if record.request_hash != request_hash:
+                return Response(
+                    {"error": f"{HEADER} was already used with a different request."},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+            record = wait_for_completion(record, settings.IDEMPOTENCY_WAIT_TIMEOUT)
+            if record is None:
+                # Первый запрос завершился ошибкой и освободил ключ — выполняем заново
+                return wrapper(self, request, *args, **kwargs)
+            if record.state == IdempotencyKey.STATE_IN_PROGRESS:
+                return Response(
+                    {"error": "A request with this Idempotency-Key is still in progress."},
+                    status=status.HTTP_409_CONFLICT,
+                    headers={"Retry-After": "1"},
+                )
+            return Response(record.response_body, status=record.status_code, headers={"Idempotent-Replayed": "true"})
+
+        try:
+            response = method(self, request, *args, **kwargs)
+        except Exception:
+            owned(record).delete()
+            raise
+
+        if response.status_code >= 500:
+            owned(record).delete()
+        else:
+            owned(record).update(
+                state=IdempotencyKey.STATE_COMPLETED, status_code=response.status_code, response_body=response.data,
+            )
+        return response
+
+    return wrapper
+
+
+def purge_expired_keys(batch_size=10000):
+    """
+    Удаляет просроченные ключи пачками. Возвращает количество удаленных записей.
+    """
+    deleted = 0
+    now = timezone.now()
+    while True:
+        ids = list(IdempotencyKey.objects.filter(expires_at__lt=now).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,264 @@
+"""
+Уменьшенные копии загруженных изображений: превью курсов и уроков, аватары пользователей.
+
+Сохранение модели с новым файлом только ставит задачу ImageVariantJob в той же транзакции,
+копии делает команда run_image_worker: ширины IMAGE_VARIANT_WIDTHS в форматах IMAGE_VARIANT_FORMATS
+рядом с оригиналом в media-хранилище. Оригинал читается из хранилища файлом, а JPEG декодируется
+сразу в уменьшенном масштабе (Image.draft), поэтому память воркера почти не зависит от размера исходника.
+Результат записывается в поле <поле>_variants модели:
+{'source': имя оригинала, 'images': [{'width': ..., 'height': ..., 'webp': имя, 'jpeg': имя}, ...]}.
+
+VariantImageField отдает URL копии по подсказке клиента ?image_width=<px> (и ?image_format=webp|jpeg):
+наименьшую копию не уже запрошенной ширины. Без подсказки или пока копий нет — URL оригинала.
+"""
+import hashlib
+import io
+import posixpath
+from datetime import timedelta
+from functools import cached_property
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image, ImageOps
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+
+from .models import ImageVariantJob
+
+# Модель -> {поле изображения: поле с копиями}
+IMAGE_FIELDS = {
+    'lms.course': {'preview': 'preview_variants'},
+    'lms.lesson': {'preview': 'preview_variants'},
+    'users.customuser': {'avatar': 'avatar_variants'},
+}
+WIDTH_PARAM = 'image_width'
+FORMAT_PARAM = 'image_format'
+DEFAULT_FORMAT = 'webp'
+FORMATS = {
+    'webp': ('WEBP', 'webp', {'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'optimize': True, 'progressive': True}),
+}
+
+
+def image_saved(sender, instance, update_fields=None, **kwargs):
+    """
+    post_save: ставит в очередь копии для нового файла, для удаленного файла очищает копии.
+    """
+    deferred = instance.get_deferred_fields()
+    for field_name, variants_field in IMAGE_FIELDS[sender._meta.label_lower].items():
+        if field_name in deferred or variants_field in deferred:
+            continue
+        if update_fields is not None and field_name not in update_fields:
+            continue  # В том числе сохранение самих копий воркером
+        name = getattr(instance, field_name).name
+        variants = getattr(instance, variants_field)
+        if not name:
+            if variants:
+                sender._default_manager.filter(pk=instance.pk).update(**{variants_field: None})
+                setattr(instance, variants_field, None)
+        elif not variants or variants.get('source') != name:
+            enqueue_variants(instance, field_name, name)
+
+
+def enqueue_variants(instance, field_name, name):
+    job, _ = ImageVariantJob.objects.get_or_create(
+        model_label=instance._meta.label_lower, object_id=instance.pk, field_name=field_name, source=name,
+    )
+    return job
+
+
+def variant_name(name, width, extension, content):
+    # Хэш содержимого в имени: файл по этому имени не меняется и кэшируется навсегда (config/media.py)
+    directory, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    return posixpath.join(directory, 'variants', f'{stem}-{width}w-{digest}.{extension}')
+
+
+def flatten(image):
+    # JPEG без прозрачности: прозрачные области — белым
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def generate_variants(storage, name, widths=None, formats=None, quality=None):
+    """
+    Создает копии файла name и возвращает их описание (по возрастанию ширины). Копии не шире оригинала;
+    если оригинал уже всех ширин, делается одна копия исходного размера в нужных форматах.
+    """
+    widths = sorted(set(widths or settings.IMAGE_VARIANT_WIDTHS))
+    formats = formats or settings.IMAGE_VARIANT_FORMATS
+    quality = quality or settings.IMAGE_VARIANT_QUALITY
+    with storage.open(name, 'rb') as file, Image.open(file) as original:
+        # Для JPEG декодирование сразу в масштабе 1/2..1/8, не меньше самой большой копии по обеим сторонам
+        original.draft(original.mode, (widths[-1], widths[-1]))
+        image = ImageOps.exif_transpose(original)
+        image.load()
+
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    rgb = flatten(image)
+    rich = image.convert('RGBA') if has_alpha else rgb
+    targets = [width for width in widths if width < image.width] or [image.width]
+    images = []
+    for width in targets:
+        height = max(1, round(image.height * width / image.width))
+        variant = {'width': width, 'height': height}
+        for format_name in formats:
+            pil_format, extension, options = FORMATS[format_name]
+            source = rgb if format_name == 'jpeg' else rich
+            resized = source if width == image.width else source.resize((width, height), Image.LANCZOS)
+            buffer = io.BytesIO()
+            resized.save(buffer, pil_format, quality=quality, **options)
+            content = buffer.getvalue()
+            variant[format_name] = storage.save(variant_name(name, width, extension, content), ContentFile(content))
+        images.append(variant)
+    return images
+
+
+def delete_variant_files(storage, variants):
+    for image in (variants or {}).get('images', []):
+        for format_name in FORMATS:
+            if image.get(format_name):
+                storage.delete(image[format_name])
+
+
+def save_variants(model, pk, field_name, variants):
+    """
+    Записывает копии, если у объекта все еще тот же оригинал. Сохранение идет через save(), чтобы
+    сработали сигналы (сброс кэша списков, версия для ETag). Старые копии удаляются после коммита.
+    """
+    variants_field = IMAGE_FIELDS[model._meta.label_lower][field_name]
+    storage = model._meta.get_field(field_name).storage
+    with transaction.atomic():
+        instance = model._default_manager.select_for_update().filter(pk=pk).first()
+        if instance is None or getattr(instance, field_name).name != variants['source']:
+            return False
+        previous = getattr(instance, variants_field)
+        setattr(instance, variants_field, variants)
+        update_fields = [variants_field]
+        if any(field.name == 'updated_at' for field in model._meta.concrete_fields):
+            update_fields.append('updated_at')
+        instance.save(update_fields=update_fields)
+        transaction.on_commit(lambda: delete_variant_files(storage, previous))
+    return True
+
+
+def claim_image_jobs(batch_size: int) -> list:
+    """
+    Забирает пачку готовых к обработке задач; зависшие дольше IMAGE_JOB_LOCK_TIMEOUT забираются повторно.
+    """
+    now = timezone.now()
+    stale_lock = now - timedelta(seconds=settings.IMAGE_JOB_LOCK_TIMEOUT)
+    claimable = Q(locked_at__isnull=True) | Q(locked_at__lt=stale_lock)
+    with transaction.atomic():
+        queryset = ImageVariantJob.objects.filter(
+            claimable, processed_at__isnull=True, available_at__lte=now,
+        ).order_by('id')
+        if connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+            jobs = list(queryset[:batch_size])
+            ImageVariantJob.objects.filter(pk__in=[job.pk for job in jobs]).update(locked_at=now)
+            return jobs
+        # Без SKIP LOCKED задача забирается условным UPDATE, как в lms/checkout.py
+        candidates = list(queryset[:batch_size])
+        return [
+            job for job in candidates
+            if ImageVariantJob.objects.filter(claimable, pk=job.pk, processed_at__isnull=True).update(locked_at=now)
+        ]
+
+
+def process_image_job(job: ImageVariantJob) -> bool:
+    """
+    Выполняет одну задачу. Если оригинал уже заменили или объект удален, задача просто закрывается.
+    При ошибке повторяет с экспоненциальной задержкой до IMAGE_JOB_MAX_ATTEMPTS попыток.
+    """
+    model = apps.get_model(job.model_label)
+    storage = model._meta.get_field(job.field_name).storage
+    now = timezone.now()
+    try:
+        current = model._default_manager.filter(pk=job.object_id).values_list(job.field_name, flat=True).first()
+        if current == job.source:
+            variants = {'source': job.source, 'images': generate_variants(storage, job.source)}
+            if not save_variants(model, job.object_id, job.field_name, variants):
+                delete_variant_files(storage, variants)  # Оригинал заменили во время обработки
+    except Exception as e:
+        job.attempts += 1
+        job.last_error = str(e)
+        job.locked_at = None
+        if job.attempts >= settings.IMAGE_JOB_MAX_ATTEMPTS:
+            job.processed_at = now
+        else:
+            job.available_at = now + timedelta(seconds=2 ** job.attempts)
+        job.save()
+        return False
+
+    job.attempts += 1
+    job.processed_at = now
+    job.save(update_fields=['attempts', 'processed_at'])
+    return True
+
+
+def process_image_jobs(batch_size: int = 10) -> int:
+    """
+    Обрабатывает одну пачку задач. Возвращает количество взятых задач.
+    """
+    jobs = claim_image_jobs(batch_size)
+    for job in jobs:
+        process_image_job(job)
+    return len(jobs)
+
+
+def image_hint(request):
+    """
+    (ширина, формат) из ?image_width= и ?image_format= или None, если подсказки нет.
+    """
+    if request is None:
+        return None
+    try:
+        width = int(request.query_params.get(WIDTH_PARAM, ''))
+    except ValueError:
+        return None
+    return width, request.query_params.get(FORMAT_PARAM, DEFAULT_FORMAT)
+
+
+class VariantImageField(serializers.ImageField):
+    """
+    ImageField, который по подсказке ?image_width= отдает URL уменьшенной копии из variants_field.
+    """
+
+    def __init__(self, variants_field, **kwargs):
+        self.variants_field = variants_field
+        self.row_sources = (variants_field,)  # Для only() и строк values() (config/fieldsets.py, config/fastpath.py)
+        super().__init__(**kwargs)
+
+    @cached_property
+    def storage(self):
+        return self.parent.Meta.model._meta.get_field(self.source).storage
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        variants = getattr(value.instance, self.variants_field, None)
+        return self.row_representation(value.name, variants, self.context.get('request'))
+
+    def row_representation(self, name, variants, request):
+        if not name:
+            return None
+        if not getattr(self, 'use_url', api_settings.UPLOADED_FILES_USE_URL):
+            return name
+        hint = image_hint(request)
+        if hint is not None and variants and variants.get('source') == name and variants.get('images'):
+            width, format_name = hint
+            images = variants['images']
+            image = next((image for image in images if image['width'] >= width), images[-1])
+            name = image.get(format_name) or name
+        url = self.storage.url(name)
+        return request.build_absolute_uri(url) if request is not None else url
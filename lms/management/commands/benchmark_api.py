@@ -0,0 +1,85 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from config.benchmark import WORKLOADS, compare_results, run_benchmark
+from lms.models import Course
+from users.models import CustomUser
+from users.seeding import seed_scale
+
+
+class Command(BaseCommand):
+    help = ("Нагрузочный прогон API внутри процесса через config.wsgi/config.asgi: RPS и задержки p50/p95/p99. "
+            "Пример на SQLite: DB_ENGINE=django.db.backends.sqlite3 NAME=bench.sqlite3 "
+            "python manage.py benchmark_api --seed --output bench.json")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workload', choices=list(WORKLOADS), action='append', dest='workloads',
+                            help="Сценарий (можно повторять); по умолчанию все")
+        parser.add_argument('--server', choices=['wsgi', 'asgi'], default='wsgi')
+        parser.add_argument('--concurrency', type=int, default=8, help="Число параллельных клиентов")
+        parser.add_argument('--duration', type=float, default=10, help="Длительность сценария, с")
+        parser.add_argument('--requests', type=int, help="Число запросов на клиента вместо --duration")
+        parser.add_argument('--warmup', type=int, default=5, help="Запросов на клиента до начала замера")
+        parser.add_argument('--stripe-latency', type=float, default=0, help="Задержка заглушки Stripe, мс")
+        parser.add_argument('--seed', action='store_true',
+                            help="Заполнить пустую БД данными seed_scale (пользователи с префиксом bench)")
+        parser.add_argument('--output', help="Записать результаты в JSON-файл")
+        parser.add_argument('--compare', help="JSON прошлого прогона для сравнения")
+        parser.add_argument('--max-regression', type=float, default=10,
+                            help="Допустимое ухудшение метрик относительно --compare, %%")
+
+    def handle(self, *args, **options):
+        if options['seed'] and not Course.objects.exists():
+            self.stdout.write("Заполнение БД данными для прогона...")
+            seed_scale(prefix='bench')
+
+        # Клиенты — владельцы курсов: у них непустые списки и права на свои объекты
+        users = list(CustomUser.objects.filter(
+            is_active=True, is_staff=False, is_superuser=False, id__in=Course.objects.values('owner_id'),
+        ).exclude(groups__name='Модераторы').order_by('id')[:options['concurrency']])
+        course_ids = list(Course.objects.order_by('id').values_list('id', flat=True)[:200])
+        if not users or not course_ids:
+            raise CommandError("В БД нет пользователей или курсов: запустите seed_scale или укажите --seed.")
+
+        result = run_benchmark(
+            options['workloads'] or list(WORKLOADS), users, course_ids, server=options['server'],
+            concurrency=options['concurrency'], duration=options['duration'], requests=options['requests'],
+            warmup=options['warmup'], stripe_latency=options['stripe_latency'] / 1000,
+        )
+
+        for name, stats in result['scenarios'].items():
+            self.stdout.write(self.style.SUCCESS(
+                f"{name}: {stats['requests']} запросов, {stats['rps']} RPS, ошибок {stats['errors']}, "
+                f"p50 {stats['p50_ms']} мс, p95 {stats['p95_ms']} мс, p99 {stats['p99_ms']} мс"
+            ))
+            for operation, operation_stats in stats['operations'].items():
+                self.stdout.write(
+                    f"  {operation}: {operation_stats['requests']} запросов, p50 {operation_stats['p50_ms']} мс, "
+                    f"p95 {operation_stats['p95_ms']} мс, ответы {operation_stats['statuses']}"
+                )
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(result, file, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Результаты записаны в {options['output']}")
+
+        if options['compare']:
+            with open(options['compare']) as file:
+                baseline = json.load(file)
+            differences = [key for key in ('server', 'database', 'concurrency')
+                           if baseline['meta'].get(key) != result['meta'][key]]
+            if differences:
+                self.stdout.write(self.style.WARNING(
+                    f"Прогоны отличаются условиями ({', '.join(differences)}), сравнение неточно."
+                ))
+            rows = compare_results(baseline, result, options['max_regression'])
+            regressions = [row for row in rows if row[-1]]
+            for scenario, operation, metric, old, new, change, regressed in rows:
+                line = f"{scenario} {operation} {metric}: {old} -> {new} ({change:+}%)"
+                self.stdout.write(self.style.ERROR(line) if regressed else line)
+            if regressions:
+                raise CommandError(
+                    f"Метрик хуже чем на {options['max_regression']}% относительно "
+                    f"{baseline['meta'].get('revision')}: {len(regressions)}"
+                )
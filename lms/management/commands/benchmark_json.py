@@ -0,0 +1,60 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Value
+
+from config.fastjson import benchmark_payloads, orjson
+from lms.models import Course, Lesson
+from lms.serializers import CourseSerializer, LessonSerializer
+from users.models import CustomUser, Payment
+from users.seeding import seed_scale
+from users.serializers import CustomUserSerializer, PaymentSerializer
+
+
+def page(data):
+    return {'count': len(data), 'next': None, 'previous': None, 'results': data}
+
+
+class Command(BaseCommand):
+    help = ("Сравнивает рендеринг и разбор JSON стандартным json DRF и orjson (config/fastjson.py) "
+            "на ответах API, собранных из БД сериализаторами")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=500, help="Объектов в каждом ответе")
+        parser.add_argument('--rounds', type=int, default=20, help="Прогонов на замер, берется лучший")
+        parser.add_argument('--seed', action='store_true',
+                            help="Заполнить пустую БД данными seed_scale (пользователи с префиксом bench)")
+        parser.add_argument('--output', help="Записать результаты в JSON-файл")
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            raise CommandError("orjson не установлен: сравнивать не с чем.")
+        if options['seed'] and not Course.objects.exists():
+            self.stdout.write("Заполнение БД данными для прогона...")
+            seed_scale(prefix='bench')
+
+        size = options['size']
+        courses = Course.objects.prefetch_related('lessons').annotate(user_subscribed=Value(False)).order_by('id')
+        payloads = {
+            'courses': page(CourseSerializer(courses[:size], many=True).data),
+            'lessons': page(LessonSerializer(Lesson.objects.order_by('id')[:size], many=True).data),
+            'payments': page(PaymentSerializer(Payment.objects.order_by('id')[:size], many=True).data),
+            'users': page(CustomUserSerializer(
+                CustomUser.objects.prefetch_related('payment_set').order_by('id')[:size], many=True,
+            ).data),
+        }
+        if not any(payload['results'] for payload in payloads.values()):
+            raise CommandError("В БД нет данных: запустите seed_scale или укажите --seed.")
+
+        results = benchmark_payloads(payloads, options['rounds'])
+        for name, row in results.items():
+            self.stdout.write(self.style.SUCCESS(
+                f"{name} ({row['size_kb']} КБ): рендеринг {row['render_stdlib_ms']} -> {row['render_fast_ms']} мс "
+                f"(x{row['render_speedup']}), разбор {row['parse_stdlib_ms']} -> {row['parse_fast_ms']} мс "
+                f"(x{row['parse_speedup']})"
+            ))
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Результаты записаны в {options['output']}")
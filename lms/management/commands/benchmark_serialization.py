@@ -0,0 +1,50 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Value
+
+from config.fastpath import benchmark_list
+from lms.models import Course, Lesson
+from lms.serializers import CourseListSerializer, LessonSerializer
+from users.models import CustomUser, Payment
+from users.seeding import seed_scale
+from users.serializers import CustomUserSerializer, PaymentSerializer
+
+
+class Command(BaseCommand):
+    help = ("Сравнивает вывод списков обычными сериализаторами и через .values() "
+            "(config/fastpath.py): строк в секунду, вместе с запросами к БД")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=1000, help="Строк в каждом списке")
+        parser.add_argument('--rounds', type=int, default=5, help="Прогонов на замер, берется лучший")
+        parser.add_argument('--seed', action='store_true',
+                            help="Заполнить пустую БД данными seed_scale (пользователи с префиксом bench)")
+        parser.add_argument('--output', help="Записать результаты в JSON-файл")
+
+    def handle(self, *args, **options):
+        if options['seed'] and not Course.objects.exists():
+            self.stdout.write("Заполнение БД данными для прогона...")
+            seed_scale(prefix='bench')
+
+        size = options['size']
+        lists = {
+            'courses': (CourseListSerializer, Course.objects.annotate(user_subscribed=Value(False)).order_by('id')),
+            'lessons': (LessonSerializer, Lesson.objects.order_by('id')),
+            'payments': (PaymentSerializer, Payment.objects.order_by('id')),
+            'users': (CustomUserSerializer, CustomUser.objects.prefetch_related('payment_set').order_by('id')),
+        }
+        results = {}
+        for name, (serializer_class, queryset) in lists.items():
+            results[name] = row = benchmark_list(serializer_class, queryset[:size], rounds=options['rounds'])
+            if not row['rows']:
+                raise CommandError("В БД нет данных: запустите seed_scale или укажите --seed.")
+            self.stdout.write(self.style.SUCCESS(
+                f"{name} ({row['rows']} строк): {row['regular_rows_per_sec']} -> {row['fast_rows_per_sec']} "
+                f"строк/с (x{row['speedup']})"
+            ))
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Результаты записаны в {options['output']}")
@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from config.partitioning import (
+    PARTITIONED_TABLES, add_months, convert_table, detach_partitions, ensure_partitions, is_partitioned,
+    is_supported, month_start,
+)
+
+
+class Command(BaseCommand):
+    help = "Создает помесячные секции таблиц платежей заранее и отсоединяет устаревшие (PostgreSQL)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--table', choices=list(PARTITIONED_TABLES), action='append', dest='tables',
+                            help="Обработать только указанную таблицу (можно повторять)")
+        parser.add_argument('--ahead', type=int, default=settings.PAYMENT_PARTITIONS_AHEAD,
+                            help="На сколько месяцев вперед создавать секции")
+        parser.add_argument('--retention', type=int, default=settings.PAYMENT_PARTITIONS_RETENTION,
+                            help="Сколько месяцев истории оставлять подключенными (0 — все)")
+        parser.add_argument('--drop', action='store_true', help="Удалять отсоединенные секции, а не архивировать")
+        parser.add_argument('--convert', action='store_true',
+                            help="Перестроить обычные таблицы в секционированные (блокирует таблицу)")
+
+    def handle(self, *args, **options):
+        if not is_supported(connection):
+            self.stdout.write(self.style.WARNING("Секционирование доступно только на PostgreSQL, таблицы остаются обычными."))
+            return
+
+        for table in options['tables'] or PARTITIONED_TABLES:
+            with transaction.atomic(), connection.cursor() as cursor:
+                if options['convert'] and convert_table(connection, table):
+                    self.stdout.write(f"{table}: таблица перестроена в секционированную")
+                if not is_partitioned(cursor, table):
+                    self.stdout.write(self.style.WARNING(f"{table}: таблица не секционирована (см. --convert)"))
+                    continue
+
+                created = ensure_partitions(cursor, table, options['ahead'])
+                detached = []
+                if options['retention']:
+                    before = add_months(month_start(timezone.now()), -options['retention'])
+                    detached = detach_partitions(cursor, table, before, drop=options['drop'])
+
+            self.stdout.write(self.style.SUCCESS(
+                f"{table}: создано секций {len(created)}, "
+                f"{'удалено' if options['drop'] else 'отсоединено в архив'} {len(detached)}"
+            ))
+            for name in detached:
+                self.stdout.write(f"  {name}")
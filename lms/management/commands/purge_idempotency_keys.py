@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from lms.idempotency import purge_expired_keys
+
+
+class Command(BaseCommand):
+    help = "Удаляет просроченные ключи идемпотентности"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help="Сколько записей удалять за один запрос")
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_keys(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Удалено ключей: {deleted}"))
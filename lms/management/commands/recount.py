@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from lms.counters import recount_all_courses, recount_courses
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает счетчики уроков и подписчиков курсов"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Сколько курсов обрабатывать за раз")
+        parser.add_argument('--course', type=int, action='append', dest='course_ids',
+                            help="Пересчитать только указанный курс (можно повторять)")
+
+    def handle(self, *args, **options):
+        if options['course_ids']:
+            with transaction.atomic():
+                fixed = recount_courses(options['course_ids'])
+            checked = len(options['course_ids'])
+        else:
+            checked, fixed = recount_all_courses(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Проверено курсов: {checked}, исправлено: {fixed}"))
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from lms.images import process_image_jobs
+
+
+class Command(BaseCommand):
+    help = "Обрабатывает очередь создания уменьшенных копий изображений"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10, help="Сколько задач брать за раз")
+        parser.add_argument('--interval', type=float, default=1.0, help="Пауза между опросами пустой очереди, сек")
+        parser.add_argument('--once', action='store_true', help="Обработать одну пачку и выйти")
+
+    def handle(self, *args, **options):
+        self.stdout.write("Воркер изображений запущен.")
+        try:
+            while True:
+                processed = process_image_jobs(options['batch_size'])
+                if processed:
+                    self.stdout.write(f"Обработано задач: {processed}")
+                if options['once']:
+                    break
+                if not processed:
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write("Воркер остановлен.")
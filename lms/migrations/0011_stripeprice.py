@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lms', '0010_payment_error_payment_status_payment_user_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StripePrice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_name', models.CharField(max_length=255, verbose_name='Название продукта')),
+                ('unit_amount', models.PositiveIntegerField(verbose_name='Цена в минимальных единицах валюты')),
+                ('currency', models.CharField(max_length=3, verbose_name='Валюта')),
+                ('stripe_product_id', models.CharField(max_length=255, verbose_name='ID продукта в Stripe')),
+                ('stripe_price_id', models.CharField(max_length=255, verbose_name='ID цены в Stripe')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('product_name', 'unit_amount', 'currency'), name='lms_stripe_price_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:44
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Course = apps.get_model('lms', 'Course')
+    Lesson = apps.get_model('lms', 'Lesson')
+    Subscription = apps.get_model('lms', 'Subscription')
+
+    def count_of(model):
+        counts = model.objects.filter(course=OuterRef('pk')).values('course').annotate(total=Count('pk')).values('total')
+        return Coalesce(Subquery(counts), 0)
+
+    Course.objects.update(lessons_count=count_of(Lesson), subscribers_count=count_of(Subscription))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lms', '0012_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='lessons_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='subscribers_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
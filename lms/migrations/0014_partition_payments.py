@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lms', '0013_course_lessons_count_course_subscribers_count'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='paymentoutbox',
+            name='payment',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='outbox', to='lms.payment'),
+        ),
+    ]
@@ -1,25 +1,57 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 
 
 class Course(models.Model):
     title = models.CharField(max_length=255)
     preview = models.ImageField(upload_to='course_previews/', blank=True, null=True)
+    preview_variants = models.JSONField(blank=True, null=True, editable=False)  # Уменьшенные копии (lms/images.py)
     description = models.TextField()
     owner = models.ForeignKey('users.CustomUser', on_delete=models.CASCADE,
                               related_name='owned_courses')  # Строковое представление
+    updated_at = models.DateTimeField(auto_now=True)  # Версия строки для ETag (меняется и при изменении уроков)
+    # Денормализованные счетчики, поддерживаются в lms/counters.py (исправляются командой recount)
+    lessons_count = models.PositiveIntegerField(default=0)
+    subscribers_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', 'id'], name='lms_course_owner_id_idx'),  # Ключ keyset-пагинации
+        ]
 
     def __str__(self):
         return self.title
 
 
 class Lesson(models.Model):
-    course = models.ForeignKey(Course, related_name='lessons', on_delete=models.CASCADE)
+    # Отдельный индекс по course_id не нужен: его заменяет составной индекс (course, id)
+    course = models.ForeignKey(Course, related_name='lessons', on_delete=models.CASCADE, db_index=False)
     title = models.CharField(max_length=255)
     description = models.TextField()
     preview = models.ImageField(upload_to='lesson_previews/', blank=True, null=True)
+    preview_variants = models.JSONField(blank=True, null=True, editable=False)  # Уменьшенные копии (lms/images.py)
     video_url = models.URLField()
     owner = models.ForeignKey('users.CustomUser', on_delete=models.CASCADE,
                               related_name='owned_lessons')  # Строковое представление
+    updated_at = models.DateTimeField(auto_now=True)  # Версия строки для ETag
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', 'id'], name='lms_lesson_owner_id_idx'),  # Ключ keyset-пагинации
+            models.Index(fields=['course', 'id'], name='lms_lesson_course_id_idx'),  # Уроки курса по порядку
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем курс на момент загрузки, чтобы при переносе урока обновить и старый курс
+        instance._loaded_course_id = instance.__dict__.get('course_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Счетчик уроков курса обновляется в post_save в той же транзакции
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return self.title
@@ -30,6 +62,11 @@ class Subscription(models.Model):
                              related_name='subscriptions')  # Строковое представление
     course = models.ForeignKey('Course', on_delete=models.CASCADE, related_name='subscribers')
 
+    def save(self, *args, **kwargs):
+        # Счетчик подписчиков курса обновляется в post_save в той же транзакции
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
     def __str__(self):
         return f'{self.user} subscribed to {self.course}'
 
@@ -38,12 +75,125 @@ class Subscription(models.Model):
 
 
 class Payment(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUSES = [
+        (STATUS_PENDING, 'Ожидает создания сессии'),
+        (STATUS_COMPLETED, 'Сессия оплаты создана'),
+        (STATUS_FAILED, 'Ошибка'),
+    ]
+
     product_name = models.CharField(max_length=255, verbose_name="Название продукта")
     product_price = models.PositiveIntegerField(verbose_name="Цена продукта")
     stripe_product_id = models.CharField(max_length=255, blank=True, null=True, verbose_name="ID продукта в Stripe")
     stripe_price_id = models.CharField(max_length=255, blank=True, null=True, verbose_name="ID цены в Stripe")
     stripe_session_url = models.URLField(max_length=2048, blank=True, null=True, verbose_name="URL оплаты в Stripe")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    user = models.ForeignKey('users.CustomUser', on_delete=models.SET_NULL, blank=True, null=True,
+                             related_name='checkout_payments', verbose_name="Пользователь")
+    status = models.CharField(max_length=20, choices=STATUSES, default=STATUS_PENDING, verbose_name="Статус")
+    error = models.TextField(blank=True, verbose_name="Ошибка")
 
     def __str__(self):
         return self.product_name
+
+
+class PaymentOutbox(models.Model):
+    """
+    Очередь задач на создание сессии оплаты в Stripe (обрабатывается командой run_checkout_worker).
+    """
+    # Без ограничения в БД: таблица платежей может быть секционированной (config/partitioning.py)
+    payment = models.OneToOneField(Payment, on_delete=models.CASCADE, related_name='outbox', db_constraint=False)
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)  # Не раньше этого времени (повторы с задержкой)
+    locked_at = models.DateTimeField(blank=True, null=True)  # Взята воркером
+    processed_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['processed_at', 'available_at'], name='lms_outbox_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f'Outbox for payment {self.payment_id}'
+
+
+class ImageVariantJob(models.Model):
+    """
+    Очередь задач на создание уменьшенных копий загруженного изображения (обрабатывается командой
+    run_image_worker). source — имя файла на момент загрузки: если его успели заменить, задача пропускается.
+    """
+    model_label = models.CharField(max_length=100)  # Например, lms.course
+    object_id = models.BigIntegerField()
+    field_name = models.CharField(max_length=100)
+    source = models.CharField(max_length=255)
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['processed_at', 'available_at'], name='lms_image_job_pending_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['model_label', 'object_id', 'field_name', 'source'],
+                                    name='lms_image_job_source_key'),
+        ]
+
+    def __str__(self):
+        return f'Variants for {self.model_label}:{self.object_id}.{self.field_name}'
+
+
+class StripePrice(models.Model):
+    """
+    Каталог уже созданных в Stripe продуктов и цен, чтобы не создавать дубликаты на каждый платеж.
+    """
+    product_name = models.CharField(max_length=255, verbose_name="Название продукта")
+    unit_amount = models.PositiveIntegerField(verbose_name="Цена в минимальных единицах валюты")
+    currency = models.CharField(max_length=3, verbose_name="Валюта")
+    stripe_product_id = models.CharField(max_length=255, verbose_name="ID продукта в Stripe")
+    stripe_price_id = models.CharField(max_length=255, verbose_name="ID цены в Stripe")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product_name', 'unit_amount', 'currency'], name='lms_stripe_price_key'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_name} ({self.unit_amount} {self.currency})'
+
+
+class IdempotencyKey(models.Model):
+    """
+    Сохраненный ответ на запрос с заголовком Idempotency-Key (повторы получают тот же ответ).
+    """
+    STATE_IN_PROGRESS = 'in_progress'
+    STATE_COMPLETED = 'completed'
+    STATES = [
+        (STATE_IN_PROGRESS, 'Выполняется'),
+        (STATE_COMPLETED, 'Выполнен'),
+    ]
+
+    user = models.ForeignKey('users.CustomUser', on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    scope = models.CharField(max_length=100)  # Имя маршрута: один ключ нельзя использовать для разных операций
+    request_hash = models.CharField(max_length=64)
+    state = models.CharField(max_length=20, choices=STATES, default=STATE_IN_PROGRESS)
+    status_code = models.PositiveSmallIntegerField(blank=True, null=True)
+    response_body = models.JSONField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    locked_at = models.DateTimeField(default=timezone.now)  # Начало выполнения (аренда ключа)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'scope', 'key'], name='lms_idempotency_key_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.scope}:{self.key}'
@@ -1,7 +1,119 @@
+import base64
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
 
+class KeysetPageNumberPagination(PageNumberPagination):
+    """
+    Постраничная пагинация с опциональным keyset-режимом (курсоры).
 
-class CoursePagination(PageNumberPagination):
+    Keyset-режим включается параметром ?pagination=cursor, наличием ?cursor=...
+    или атрибутом представления pagination_mode = 'cursor'. Страница выбирается
+    по индексированному ключу keyset_fields без COUNT(*) и OFFSET, поэтому её
+    стоимость не зависит от глубины. Клиенты с ?page=N работают как раньше.
+    """
+    pagination_query_param = 'pagination'
+    cursor_query_param = 'cursor'
+    keyset_fields = ('owner_id', 'id')
+    invalid_cursor_message = 'Некорректный курсор.'
+
+    cursor_mode = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.is_cursor_mode(request, view)
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+        return self.paginate_keyset(queryset, request)
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.next_link,
+            'previous': self.previous_link,
+            'results': data,
+        })
+
+    def is_cursor_mode(self, request, view):
+        if self.cursor_query_param in request.query_params:
+            return True
+        mode = request.query_params.get(self.pagination_query_param)
+        if mode is None:
+            mode = getattr(view, 'pagination_mode', None)
+        return mode == 'cursor'
+
+    def paginate_keyset(self, queryset, request):
+        self.request = request
+        page_size = self.get_page_size(request) or self.max_page_size
+        cursor = self.decode_cursor(request)
+
+        if cursor is not None:
+            key, reverse = cursor
+            queryset = queryset.filter(self.get_keyset_filter(key, reverse))
+        else:
+            key, reverse = None, False
+
+        prefix = '-' if reverse else ''
+        queryset = queryset.order_by(*[prefix + field for field in self.keyset_fields])
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+
+        has_next = True if reverse else has_more
+        has_previous = has_more if reverse else cursor is not None
+        self.next_link = self.get_cursor_link(results[-1], False) if has_next and results else None
+        self.previous_link = self.get_cursor_link(results[0], True) if has_previous and results else None
+        return results
+
+    def get_keyset_filter(self, key, reverse):
+        """
+        Условие "ключ строки строго после (или до) курсора" в лексикографическом порядке.
+        Первое поле дополнительно ограничено диапазоном, чтобы БД могла пройти по индексу.
+        """
+        lookup = 'lt' if reverse else 'gt'
+        first_field, first_value = self.keyset_fields[0], key[0]
+        condition = Q()
+        for index, field in enumerate(self.keyset_fields):
+            term = Q(**{f'{field}__{lookup}': key[index]})
+            for prev_field, prev_value in zip(self.keyset_fields[:index], key[:index]):
+                term &= Q(**{prev_field: prev_value})
+            condition |= term
+        return Q(**{f'{first_field}__{lookup}e': first_value}) & condition
+
+    def get_row_key(self, row):
+        if isinstance(row, dict):
+            return [row[field] if field in row else row[field.removesuffix('_id')] for field in self.keyset_fields]
+        return [getattr(row, field) for field in self.keyset_fields]
+
+    def get_cursor_link(self, row, reverse):
+        payload = json.dumps({'k': self.get_row_key(row), 'r': int(reverse)}, separators=(',', ':'))
+        encoded = base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4)))
+            key = [int(value) for value in payload['k']]
+            reverse = bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError, AttributeError):
+            raise NotFound(self.invalid_cursor_message)
+        if len(key) != len(self.keyset_fields):
+            raise NotFound(self.invalid_cursor_message)
+        return key, reverse
+
+
+class CoursePagination(KeysetPageNumberPagination):
     """
     Пагинация для курсов
     """
@@ -10,10 +122,28 @@ class CoursePagination(PageNumberPagination):
     max_page_size = 20  # Максимальное количество элементов на странице
 
 
-class LessonPagination(PageNumberPagination):
+class LessonPagination(KeysetPageNumberPagination):
     """
     Пагинация для уроков
     """
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 50
+
+
+class CourseLessonPagination(LessonPagination):
+    """
+    Пагинация уроков одного курса (/courses/{id}/lessons/): страница читается по индексу (course_id, id).
+    """
+    keyset_fields = ('course_id', 'id')
+
+
+class PaymentPagination(KeysetPageNumberPagination):
+    """
+    Пагинация для платежей. Полная выгрузка — через payments/export/.
+    В keyset-режиме порядок задаётся ключом (user_id, id), параметр ordering не применяется.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    keyset_fields = ('user_id', 'id')
@@ -1,38 +1,64 @@
 from rest_framework import serializers
+
+from config.fieldsets import SparseFieldsetMixin
+from config.metrics import TimedSerializerMixin
+from .images import VariantImageField
 from .models import Course, Lesson, Subscription
 from .validators import validate_youtube_url
 
+# Поля курса при раскрытии (?expand=course): без уроков и признака подписки
+COURSE_SUMMARY = ('lms.serializers.CourseSerializer', {
+    'fields': ['id', 'title', 'description', 'preview', 'lessons_count', 'subscribers_count'],
+})
+
 
-class LessonSerializer(serializers.ModelSerializer):
+class LessonSerializer(TimedSerializerMixin, SparseFieldsetMixin, serializers.ModelSerializer):
     video_url = serializers.URLField(validators=[validate_youtube_url])
+    preview = VariantImageField('preview_variants', required=False, allow_null=True)
+    expandable_fields = {'course': COURSE_SUMMARY}
 
     class Meta:
         model = Lesson
-        fields = '__all__'
+        exclude = ['preview_variants']
         read_only_fields = ['owner']
 
 
-class CourseSerializer(serializers.ModelSerializer):
+class CourseSerializer(TimedSerializerMixin, SparseFieldsetMixin, serializers.ModelSerializer):
     lessons = LessonSerializer(many=True, read_only=True)
-    lessons_count = serializers.SerializerMethodField()
+    preview = VariantImageField('preview_variants', required=False, allow_null=True)
     is_subscribed = serializers.SerializerMethodField()
+    field_dependencies = {'is_subscribed': ()}  # Аннотация user_subscribed из CourseViewSet
+    fast_path_sources = {'is_subscribed': 'user_subscribed'}  # Для списка через .values() (config/fastpath.py)
 
     class Meta:
         model = Course
-        fields = '__all__'
-        read_only_fields = ['owner']
-
-    def get_lessons_count(self, obj):
-        return obj.lessons.count()
+        exclude = ['preview_variants']
+        read_only_fields = ['owner', 'lessons_count', 'subscribers_count']
 
     def get_is_subscribed(self, obj):
+        # Значение аннотируется в CourseViewSet.get_queryset, запрос — только для объектов без аннотации
+        if hasattr(obj, 'user_subscribed'):
+            return obj.user_subscribed
         user = self.context.get('request').user  # Получаем текущего пользователя
         return Subscription.objects.filter(user=user, course=obj).exists()  # Проверяем, есть ли подписка
 
 
-class SubscriptionSerializer(serializers.ModelSerializer):
+class CourseListSerializer(CourseSerializer):
+    """
+    Курс в списке: без уроков, они доступны постранично по /courses/{id}/lessons/.
+    """
+    lessons = None
+
+
+class SubscriptionSerializer(TimedSerializerMixin, SparseFieldsetMixin, serializers.ModelSerializer):
     course_title = serializers.CharField(source='course.title', read_only=True)
+    expandable_fields = {'course': COURSE_SUMMARY}
 
     class Meta:
         model = Subscription
         fields = ['user', 'course', 'course_title']
+
+
+class BulkSubscriptionSerializer(serializers.Serializer):
+    course_ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=500)
+    subscribed = serializers.BooleanField()
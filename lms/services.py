@@ -1,4 +1,12 @@
+import threading
+from collections import OrderedDict
+
 import stripe
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from .models import StripePrice
+from .stripe_client import stripe_client
 
 
 def create_stripe_product(product_name: str) -> str:
@@ -6,18 +14,20 @@ def create_stripe_product(product_name: str) -> str:
     Создает продукт в Stripe.
     Возвращает ID продукта.
     """
-    product = stripe.Product.create(name=product_name)
+    product = stripe_client.call('product.create', stripe.Product.create, name=product_name)
     return product['id']
 
 
-def create_stripe_price(product_id: str, price: int) -> str:
+def create_stripe_price(product_id: str, price: int, currency: str = "usd") -> str:
     """
     Создает цену в Stripe.
     Возвращает ID цены.
     """
-    price_data = stripe.Price.create(
+    price_data = stripe_client.call(
+        'price.create',
+        stripe.Price.create,
         unit_amount=price,
-        currency="usd",
+        currency=currency,
         product=product_id
     )
     return price_data['id']
@@ -28,7 +38,9 @@ def create_stripe_session(price_id: str) -> str:
     Создает сессию оплаты в Stripe.
     Возвращает URL сессии оплаты.
     """
-    session = stripe.checkout.Session.create(
+    session = stripe_client.call(
+        'checkout.session.create',
+        stripe.checkout.Session.create,
         payment_method_types=["card"],
         line_items=[{"price": price_id, "quantity": 1}],
         mode="payment",
@@ -36,3 +48,102 @@ def create_stripe_session(price_id: str) -> str:
         cancel_url="http://127.0.0.1:8000/cancel/",
     )
     return session['url']
+
+
+class LRUCache:
+    """
+    Потокобезопасный LRU-кэш фиксированного размера.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+stripe_catalog_cache = LRUCache(settings.STRIPE_CATALOG_CACHE_SIZE)
+
+# Блокировки по ключу каталога: одновременные промахи по одному ключу создают объекты в Stripe один раз
+_key_locks = {}
+_key_locks_guard = threading.Lock()
+
+
+class _KeyLock:
+    def __init__(self, key):
+        self.key = key
+
+    def __enter__(self):
+        with _key_locks_guard:
+            lock, users = _key_locks.get(self.key, (threading.Lock(), 0))
+            _key_locks[self.key] = (lock, users + 1)
+        lock.acquire()
+
+    def __exit__(self, *exc_info):
+        with _key_locks_guard:
+            lock, users = _key_locks[self.key]
+            lock.release()
+            if users == 1:
+                del _key_locks[self.key]
+            else:
+                _key_locks[self.key] = (lock, users - 1)
+
+
+def load_catalog_entry(product_name: str, unit_amount: int, currency: str):
+    return StripePrice.objects.filter(
+        product_name=product_name, unit_amount=unit_amount, currency=currency,
+    ).values_list('stripe_product_id', 'stripe_price_id').first()
+
+
+def save_catalog_entry(product_name: str, unit_amount: int, currency: str, product_id: str, price_id: str):
+    """
+    Сохраняет продукт и цену в каталоге. Если другой процесс успел раньше, возвращает его запись.
+    """
+    try:
+        with transaction.atomic():
+            StripePrice.objects.create(
+                product_name=product_name, unit_amount=unit_amount, currency=currency,
+                stripe_product_id=product_id, stripe_price_id=price_id,
+            )
+    except IntegrityError:
+        return load_catalog_entry(product_name, unit_amount, currency)
+    return product_id, price_id
+
+
+def get_or_create_stripe_price(product_name: str, unit_amount: int, currency: str = "usd") -> tuple:
+    """
+    Возвращает (ID продукта, ID цены) в Stripe для названия, суммы и валюты.
+    Сначала ищет в LRU-кэше процесса, затем в таблице каталога; в Stripe создает только при промахе.
+    """
+    key = (product_name, unit_amount, currency)
+    entry = stripe_catalog_cache.get(key)
+    if entry is not None:
+        return entry
+
+    with _KeyLock(key):
+        entry = stripe_catalog_cache.get(key)
+        if entry is None:
+            entry = load_catalog_entry(*key)
+        if entry is None:
+            product_id = create_stripe_product(product_name)
+            price_id = create_stripe_price(product_id, unit_amount, currency)
+            entry = save_catalog_entry(*key, product_id, price_id)
+        stripe_catalog_cache.set(key, entry)
+    return entry
@@ -0,0 +1,78 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Count, QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .cache import COURSES, LESSONS, bump_generations
+from .counters import adjust_course_counters
+from .images import IMAGE_FIELDS, image_saved
+from .models import Course, Lesson, Subscription
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def course_changed(sender, **kwargs):
+    bump_generations(COURSES)
+
+
+@receiver(post_save, sender=Lesson)
+def lesson_saved(sender, instance, created, **kwargs):
+    # Уроки вложены в ответ курсов, поэтому сбрасываем оба ресурса
+    bump_generations(COURSES, LESSONS)
+    loaded_course_id = getattr(instance, '_loaded_course_id', None)
+    if created:
+        adjust_course_counters([instance.course_id], lessons_count=1)
+    elif loaded_course_id is not None and loaded_course_id != instance.course_id:
+        adjust_course_counters([loaded_course_id], lessons_count=-1)
+        adjust_course_counters([instance.course_id], lessons_count=1)
+    else:
+        # Меняем версию курса (и ETag его детального ответа)
+        Course.objects.filter(pk=instance.course_id).update(updated_at=timezone.now())
+    instance._loaded_course_id = instance.course_id
+
+
+def deleted_with(origin, model):
+    """
+    Удаление пришло каскадом от объекта (или QuerySet) модели model.
+    """
+    return isinstance(origin, model) or (isinstance(origin, QuerySet) and issubclass(origin.model, model))
+
+
+@receiver(post_delete, sender=Lesson)
+def lesson_deleted(sender, instance, origin=None, **kwargs):
+    bump_generations(COURSES, LESSONS)
+    # При удалении курса счетчик не нужен, при удалении владельца его уже уменьшил user_deleted
+    if deleted_with(origin, Course) or deleted_with(origin, get_user_model()):
+        return
+    adjust_course_counters([getattr(instance, '_loaded_course_id', None) or instance.course_id], lessons_count=-1)
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_created(sender, instance, created, **kwargs):
+    # Удаление подписок обрабатывается явно (представления, user_deleted): обработчик post_delete
+    # лишил бы QuerySet.delete() быстрого удаления одним запросом
+    bump_generations(COURSES)
+    if created:
+        adjust_course_counters([instance.course_id], subscribers_count=1)
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def user_deleted(sender, instance, **kwargs):
+    # Подписки пользователя удалятся каскадом без сигналов, поэтому уменьшаем счетчики заранее
+    course_ids = Subscription.objects.filter(user=instance).values_list('course_id', flat=True)
+    adjust_course_counters(course_ids, subscribers_count=-1)
+
+    # Уроки пользователя в чужих курсах: одно обновление на каждое различное число уроков, а не на урок
+    lessons = Lesson.objects.filter(owner=instance).exclude(course__owner=instance)
+    by_count = {}
+    for course_id, count in lessons.values('course_id').annotate(count=Count('id')).values_list('course_id', 'count'):
+        by_count.setdefault(count, []).append(course_id)
+    for count, course_ids in by_count.items():
+        adjust_course_counters(course_ids, lessons_count=-count)
+
+
+# Новые изображения: уменьшенные копии делает воркер (lms/images.py, команда run_image_worker)
+for label in IMAGE_FIELDS:
+    post_save.connect(image_saved, sender=label, dispatch_uid=f'lms.images.{label}')
@@ -0,0 +1,202 @@
+import random
+import threading
+import time
+import uuid
+from collections import deque
+
+import stripe
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from config.metrics import record_stripe_time
+
+# Ошибки, после которых повтор безопасен: сеть, таймауты, лимиты и 5xx на стороне Stripe.
+# Повторы POST безопасны, так как каждому вызову присваивается idempotency_key.
+RETRYABLE_ERRORS = (stripe.APIConnectionError, stripe.RateLimitError, stripe.APIError)
+
+
+class StripeUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Платежный сервис временно недоступен. Повторите запрос позже.'
+    default_code = 'stripe_unavailable'
+
+    def __init__(self, wait=None, detail=None):
+        super().__init__(detail)
+        self.wait = wait  # Обработчик исключений DRF выставит заголовок Retry-After
+
+
+class CircuitBreaker:
+    """
+    Размыкатель цепи: после threshold ошибок подряд вызовы сразу отклоняются на reset_timeout секунд,
+    затем пропускается один пробный вызов (half-open).
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, threshold, reset_timeout):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == self.OPEN:
+                remaining = self.opened_at + self.reset_timeout - time.monotonic()
+                if remaining > 0:
+                    raise StripeUnavailable(wait=int(remaining) + 1)
+                self.state = self.HALF_OPEN
+            elif self.state == self.HALF_OPEN:
+                # Пробный вызов уже выполняется
+                raise StripeUnavailable(wait=1)
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        # Вызов завершился ошибкой клиента (не сбоем Stripe): пробный вызов считается успешным
+        self.record_success()
+
+    def get_state(self):
+        with self._lock:
+            return {'state': self.state, 'consecutive_failures': self.failures}
+
+
+class LatencyStats:
+    """
+    Счетчики и задержки последних вызовов по операциям.
+    """
+
+    def __init__(self, window=1000):
+        self.window = window
+        self._operations = {}
+        self._lock = threading.Lock()
+
+    def record(self, operation, seconds, ok):
+        with self._lock:
+            stats = self._operations.setdefault(
+                operation, {'calls': 0, 'errors': 0, 'latencies': deque(maxlen=self.window)}
+            )
+            stats['calls'] += 1
+            stats['errors'] += 0 if ok else 1
+            stats['latencies'].append(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for operation, stats in self._operations.items():
+                latencies = sorted(stats['latencies'])
+                result[operation] = {
+                    'calls': stats['calls'],
+                    'errors': stats['errors'],
+                    'p50_ms': _percentile(latencies, 0.50),
+                    'p95_ms': _percentile(latencies, 0.95),
+                    'p99_ms': _percentile(latencies, 0.99),
+                }
+            return result
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    index = min(len(values) - 1, int(len(values) * fraction))
+    return round(values[index] * 1000, 2)
+
+
+class StripeClient:
+    """
+    Обертка над вызовами stripe SDK: переиспользуемое HTTP-соединение, таймауты,
+    повторы с экспоненциальной задержкой и джиттером, размыкатель цепи и метрики.
+    """
+
+    def __init__(self, timeout, max_retries, backoff_base, backoff_max, breaker, api_base=None):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker
+        self.api_base = api_base
+        self.stats = LatencyStats()
+        self._configured = False
+        self._configure_lock = threading.Lock()
+
+    def configure(self):
+        """
+        Настраивает SDK один раз на процесс: общий HTTP-клиент с пулом соединений и таймаутом.
+        Повторы выполняет обертка, поэтому встроенные повторы SDK отключены.
+        """
+        with self._configure_lock:
+            if self._configured:
+                return
+            stripe.default_http_client = stripe.RequestsClient(timeout=self.timeout)
+            stripe.max_network_retries = 0
+            if self.api_base:
+                stripe.api_base = self.api_base
+            self._configured = True
+
+    def get_backoff(self, attempt):
+        # Full jitter: случайная пауза от 0 до base * 2^attempt (но не больше backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def call(self, operation, func, **params):
+        self.configure()
+        self.breaker.before_call()
+        params.setdefault('idempotency_key', str(uuid.uuid4()))
+        started = time.monotonic()
+        try:
+            return self._call_with_retries(operation, func, params)
+        finally:
+            # Время запроса к API, включая повторы и паузы между ними (Server-Timing, /metrics)
+            record_stripe_time(time.monotonic() - started)
+
+    def _call_with_retries(self, operation, func, params):
+        for attempt in range(self.max_retries + 1):
+            start = time.monotonic()
+            try:
+                result = func(**params)
+            except RETRYABLE_ERRORS:
+                self.stats.record(operation, time.monotonic() - start, ok=False)
+                if attempt == self.max_retries:
+                    self.breaker.record_failure()
+                    raise
+                time.sleep(self.get_backoff(attempt))
+                continue
+            except Exception:
+                # Ошибки запроса (неверные параметры, авторизация) не говорят о сбое Stripe
+                self.stats.record(operation, time.monotonic() - start, ok=False)
+                self.breaker.release()
+                raise
+            elapsed = time.monotonic() - start
+            self.stats.record(operation, elapsed, ok=True)
+            self.breaker.record_success()
+            return result
+
+    def get_stats(self):
+        return {
+            'breaker': self.breaker.get_state(),
+            'operations': self.stats.snapshot(),
+        }
+
+
+stripe_client = StripeClient(
+    timeout=settings.STRIPE_TIMEOUT,
+    max_retries=settings.STRIPE_MAX_RETRIES,
+    backoff_base=settings.STRIPE_BACKOFF_BASE,
+    backoff_max=settings.STRIPE_BACKOFF_MAX,
+    breaker=CircuitBreaker(settings.STRIPE_BREAKER_THRESHOLD, settings.STRIPE_BREAKER_RESET_TIMEOUT),
+    api_base=settings.STRIPE_API_BASE,
+)
@@ -1,9 +1,137 @@
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time as dt_time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from unittest import mock, skipIf, skipUnless
+
+import stripe
+from PIL import Image
+
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections, connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
 from rest_framework.utils import json
+from rest_framework_simplejwt.tokens import AccessToken
 
-from .models import Course, Lesson, Subscription
+from config.benchmark import WORKLOADS, WSGIDriver, compare_results, stub_stripe
+from config.fastjson import FastJSONParser, FastJSONRenderer, orjson
+from config.fastpath import compile_serializer
+from config.metrics import registry
+from config.partitioning import add_months, bound, is_partitioned, month_range, partition_name
+from .cache import get_cache, get_cache_stats
+from .checkout import claim_outbox_batch
+from .models import (Course, Lesson, Subscription, Payment, PaymentOutbox, StripePrice, IdempotencyKey,
+                     ImageVariantJob)
+from .serializers import CourseListSerializer, CourseSerializer, SubscriptionSerializer
+from .services import get_or_create_stripe_price, stripe_catalog_cache
+from .stripe_client import CircuitBreaker, StripeClient
+from .views import LessonDetailView
 from users.models import CustomUser
+from users.seeding import seed_scale
+
+
+def data_queries(queries):
+    """
+    Запросы к данным без служебных SAVEPOINT/RELEASE.
+    """
+    return [query for query in queries if not query["sql"].startswith(("SAVEPOINT", "RELEASE"))]
+
+
+def sql_template(sql):
+    """
+    SQL без значений параметров: одинаковые шаблоны с разными id — признак N+1.
+    """
+    return re.sub(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b", "?", sql)
+
+
+class QueryBudgetMixin:
+    """
+    Проверка бюджета SQL-запросов эндпоинтов на засеянных данных от имени владельца, модератора и администратора.
+    Каждый вызов выполняется в откатываемой транзакции, кэш ответов очищается, аутентификация — по JWT,
+    как у реальных клиентов. При превышении бюджета или повторе запроса печатается список запросов.
+    """
+    roles = ('owner', 'moderator', 'admin')
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_scale(users=40, courses=12, lessons_per_course=4, subscriptions=120, payments=300, batch_size=100)
+        course = Course.objects.order_by('id').first()
+        moderators = Group.objects.create(name="Модераторы")
+        cls.users = {
+            'owner': course.owner,
+            'moderator': CustomUser.objects.create_user(email="moderator@test.ru", password="password"),
+            'admin': CustomUser.objects.create_superuser(email="admin@test.ru", password="password"),
+        }
+        cls.users['moderator'].groups.add(moderators)
+        cls.course = course
+        cls.lesson = course.lessons.order_by('id').first()
+
+    def request_as(self, role, method, url, data=None, **extra):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.users[role])}")
+        return getattr(self.client, method)(url, data, format='json', **extra)
+
+    def assertQueryBudget(self, budget, method, url, data=None, roles=None, allow_repeats=0, **extra):
+        """
+        Вызывает эндпоинт от имени каждой роли и проверяет, что запросов не больше budget
+        и ни один шаблон запроса не повторяется больше allow_repeats раз.
+        """
+        for role in roles or self.roles:
+            with self.subTest(role=role, method=method, url=url):
+                get_cache().clear()
+                with transaction.atomic():
+                    with CaptureQueriesContext(connection) as context:
+                        response = self.request_as(role, method, url, data, **extra)
+                        if response.streaming:
+                            b"".join(response.streaming_content)  # Запросы потоковой выгрузки выполняются при чтении
+                    transaction.set_rollback(True)
+                self.assertLess(response.status_code, 500, getattr(response, "content", b""))
+                queries = [query["sql"] for query in data_queries(context.captured_queries)]
+                listing = "\n".join(f"{number}. {sql}" for number, sql in enumerate(queries, 1))
+                self.assertLessEqual(
+                    len(queries), budget,
+                    f"{method.upper()} {url} ({role}, {response.status_code}): "
+                    f"{len(queries)} запросов при бюджете {budget}\n{listing}",
+                )
+                templates = [sql_template(sql) for sql in queries]
+                repeated = {template for template in templates if templates.count(template) > allow_repeats + 1}
+                self.assertFalse(
+                    repeated, f"{method.upper()} {url} ({role}): повторяющиеся запросы\n" + "\n".join(repeated)
+                )
+
+    def assertFastPathIdentical(self, url, roles=None):
+        """
+        Ответ списка через .values() (config/fastpath.py) побайтно совпадает с ответом обычных сериализаторов.
+        """
+        for role in roles or self.roles:
+            with self.subTest(role=role, url=url):
+                responses = []
+                for enabled in (False, True):
+                    get_cache().clear()
+                    with override_settings(SERIALIZER_FAST_PATH=enabled):
+                        responses.append(self.request_as(role, "get", url))
+                regular, fast = responses
+                self.assertEqual(regular.status_code, 200)
+                self.assertEqual(fast.content, regular.content)
 
 
 class TestCase(APITestCase):
@@ -20,6 +148,21 @@ class TestCase(APITestCase):
         self.client.force_authenticate(user=self.user)
 
 
+class TempDirectoryMixin:
+    """
+    Временный каталог на время теста: путь к нему подставляется в настройку setting
+    вместе с остальными переопределениями настроек
+    """
+
+    def use_temp_directory(self, setting, **overrides):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patcher = override_settings(**{setting: directory.name}, **overrides)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+        return directory.name
+
+
 class CourseTestCase(TestCase):
     """
     Тесты для работы с курсами
@@ -70,6 +213,89 @@ class CourseTestCase(TestCase):
         self.assertEqual(response.status_code, 204)
         self.assertEqual(Course.objects.count(), 0)
 
+    def test_course_list_query_count(self):
+        """
+        Тест: количество запросов к БД не зависит от размера страницы
+        """
+        url = reverse("course-list")
+        self.client.get(url)  # Прогрев кэша ролей пользователя
+        get_cache().clear()
+        with CaptureQueriesContext(connection) as single_page:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        for i in range(4):
+            course = Course.objects.create(title=f"Course {i}", owner=self.user, description="Description")
+            Lesson.objects.create(
+                title=f"Lesson {i}", course=course, owner=self.user, description="Description",
+                video_url="https://www.youtube.com/"
+            )
+            Subscription.objects.create(user=self.user, course=course)
+
+        get_cache().clear()
+        with CaptureQueriesContext(connection) as full_page:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["results"]), 5)
+        self.assertEqual(len(full_page), len(single_page))
+
+        results = {item["id"]: item for item in response.json()["results"]}
+        self.assertEqual(results[self.course.pk]["lessons_count"], 1)
+        self.assertFalse(results[self.course.pk]["is_subscribed"])
+        self.assertTrue(results[course.pk]["is_subscribed"])
+
+
+class CourseCountersTestCase(TestCase):
+    """
+    Тесты для денормализованных счетчиков уроков и подписчиков
+    """
+
+    def counters(self, course):
+        course.refresh_from_db()
+        return course.lessons_count, course.subscribers_count
+
+    def test_lesson_counter(self):
+        self.assertEqual(self.counters(self.course), (1, 0))
+        other = Course.objects.create(title="Other", owner=self.user, description="Description")
+        self.lesson.course = other
+        self.lesson.save()
+        self.assertEqual(self.counters(self.course), (0, 0))
+        self.assertEqual(self.counters(other), (1, 0))
+        self.lesson.delete()
+        self.assertEqual(self.counters(other), (0, 0))
+
+    def test_subscriber_counter(self):
+        url = reverse("subscribe-course")
+        self.client.post(url, data={"course_id": self.course.pk})
+        self.assertEqual(self.counters(self.course), (1, 1))
+        self.client.post(url, data={"course_id": self.course.pk})
+        self.assertEqual(self.counters(self.course), (1, 0))
+
+        self.client.post(url, data={"course_id": self.course.pk})
+        self.client.delete(reverse("subscription"), data={"course_id": self.course.pk})
+        self.assertEqual(self.counters(self.course), (1, 0))
+
+    def test_cascade_on_user_delete(self):
+        other = CustomUser.objects.create_user(email="other@test.ru", password="password")
+        Subscription.objects.create(user=other, course=self.course)
+        Lesson.objects.create(
+            title="Other Lesson", course=self.course, owner=other, description="Description",
+            video_url="https://www.youtube.com/"
+        )
+        self.assertEqual(self.counters(self.course), (2, 1))
+        other.delete()
+        self.assertEqual(self.counters(self.course), (1, 0))
+
+    def test_serializer_reads_columns(self):
+        Course.objects.filter(pk=self.course.pk).update(lessons_count=7, subscribers_count=3)
+        data = self.client.get(reverse("course-detail", args=[self.course.pk])).json()
+        self.assertEqual((data["lessons_count"], data["subscribers_count"]), (7, 3))
+
+    def test_recount_repairs_drift(self):
+        Course.objects.filter(pk=self.course.pk).update(lessons_count=7, subscribers_count=3)
+        call_command("recount", batch_size=1, stdout=mock.MagicMock())
+        self.assertEqual(self.counters(self.course), (1, 0))
+
 
 class LessonTestCase(TestCase):
     """
@@ -124,6 +350,183 @@ class LessonTestCase(TestCase):
         self.assertEqual(Lesson.objects.count(), 0)
 
 
+class CourseLessonsTestCase(TestCase):
+    """
+    Тесты для облегченного списка курсов и уроков курса (/courses/{id}/lessons/)
+    """
+
+    def setUp(self):
+        super().setUp()
+        for i in range(11):
+            Lesson.objects.create(
+                title=f"Lesson {i}", course=self.course, owner=self.user, description="Description",
+                video_url="https://www.youtube.com/",
+            )
+        self.url = reverse("course-lessons", args=[self.course.pk])
+
+    def test_course_list_has_no_lessons(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse("course-list"))
+        course = response.json()["results"][0]
+        self.assertNotIn("lessons", course)
+        self.assertEqual(course["lessons_count"], 12)
+        self.assertFalse(any('FROM "lms_lesson"' in query["sql"] for query in context.captured_queries))
+
+    def test_lessons_are_paginated(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["count"], 12)
+        self.assertEqual([lesson["id"] for lesson in data["results"]],
+                         list(self.course.lessons.order_by("id").values_list("id", flat=True)[:10]))
+        self.assertEqual(len(self.client.get(data["next"]).json()["results"]), 2)
+
+    def test_cursor_mode(self):
+        data = self.client.get(self.url, {"pagination": "cursor", "page_size": 5}).json()
+        ids = [lesson["id"] for lesson in data["results"]]
+        while data["next"]:
+            data = self.client.get(data["next"]).json()
+            ids.extend(lesson["id"] for lesson in data["results"])
+        self.assertEqual(ids, list(self.course.lessons.order_by("id").values_list("id", flat=True)))
+
+    def test_lessons_of_other_course(self):
+        other = CustomUser.objects.create_user(email="other@test.ru", password="password")
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class LessonPaginationTestCase(TestCase):
+    """
+    Тесты для курсорной (keyset) пагинации уроков
+    """
+
+    def setUp(self):
+        super().setUp()
+        for i in range(4):
+            Lesson.objects.create(
+                title=f"Lesson {i}", course=self.course, owner=self.user, description="Description",
+                video_url="https://www.youtube.com/"
+            )
+
+    def test_page_number_mode_is_default(self):
+        response = self.client.get(reverse("lesson-list"), {"page_size": 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["count"], 5)
+
+    def test_cursor_mode_walks_forward_and_back(self):
+        url = reverse("lesson-list")
+        response = self.client.get(url, {"pagination": "cursor", "page_size": 2})
+        data = response.json()
+        self.assertNotIn("count", data)
+        self.assertIsNone(data["previous"])
+        first_page = [item["id"] for item in data["results"]]
+
+        seen = list(first_page)
+        while data["next"]:
+            data = self.client.get(data["next"]).json()
+            seen.extend(item["id"] for item in data["results"])
+        self.assertEqual(seen, sorted(Lesson.objects.values_list("id", flat=True)))
+
+        second_page = self.client.get(
+            self.client.get(url, {"pagination": "cursor", "page_size": 2}).json()["next"]
+        ).json()
+        previous_page = self.client.get(second_page["previous"]).json()
+        self.assertEqual([item["id"] for item in previous_page["results"]], first_page)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse("lesson-list"), {"cursor": "garbage"})
+        self.assertEqual(response.status_code, 404)
+
+
+class ConditionalRequestTestCase(TestCase):
+    """
+    Тесты для ETag / If-None-Match / If-Match
+    """
+
+    def test_course_not_modified(self):
+        url = reverse("course-detail", args=[self.course.pk])
+        etag = self.client.get(url)["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Lesson.objects.create(
+            title="Another Lesson", course=self.course, owner=self.user, description="Description",
+            video_url="https://www.youtube.com/"
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_course_etag_depends_on_subscription(self):
+        url = reverse("course-detail", args=[self.course.pk])
+        etag = self.client.get(url)["ETag"]
+        Subscription.objects.create(user=self.user, course=self.course)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_lesson_if_match(self):
+        url = reverse("lesson-detail", args=[self.lesson.pk])
+        etag = self.client.get(url)["ETag"]
+        response = self.client.patch(url, data={"title": "First"}, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+        response = self.client.patch(url, data={"title": "Second"}, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(Lesson.objects.get(pk=self.lesson.pk).title, "First")
+
+    def test_if_match_rechecks_version_before_saving(self):
+        url = reverse("lesson-detail", args=[self.lesson.pk])
+        etag = self.client.get(url)["ETag"]
+        get_object = LessonDetailView.get_object
+
+        def concurrent_get_object(view):
+            instance = get_object(view)
+            # Другой клиент с тем же ETag успел сохранить урок после загрузки объекта
+            Lesson.objects.filter(pk=self.lesson.pk).update(title="Other", updated_at=timezone.now())
+            return instance
+
+        with mock.patch.object(LessonDetailView, "get_object", concurrent_get_object):
+            response = self.client.patch(url, data={"title": "Mine"}, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(Lesson.objects.get(pk=self.lesson.pk).title, "Other")
+
+
+class ResponseCacheTestCase(TestCase):
+    """
+    Тесты для кэша ответов списков
+    """
+
+    def test_repeated_list_is_served_from_cache(self):
+        url = reverse("course-list")
+        self.client.get(url)
+        stats = get_cache_stats()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(get_cache_stats()["hits"], stats["hits"] + 1)
+
+    def test_writes_invalidate_cache(self):
+        url = reverse("course-list")
+        self.assertEqual(self.client.get(url).json()["results"][0]["lessons_count"], 1)
+
+        Lesson.objects.create(
+            title="Another Lesson", course=self.course, owner=self.user, description="Description",
+            video_url="https://www.youtube.com/"
+        )
+        self.assertEqual(self.client.get(url).json()["results"][0]["lessons_count"], 2)
+
+        self.client.post(reverse("subscribe-course"), data={"course_id": self.course.pk})
+        self.assertTrue(self.client.get(url).json()["results"][0]["is_subscribed"])
+
+    def test_cache_is_scoped_by_user(self):
+        url = reverse("lesson-list")
+        self.assertEqual(self.client.get(url).json()["count"], 1)
+        other = CustomUser.objects.create_user(email="other@test.ru", password="password")
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get(url).json()["count"], 0)
+
+
 class SubscriptionTest(TestCase):
     """
     Тесты для работы с подписками
@@ -138,6 +541,100 @@ class SubscriptionTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn("Subscription added.", response.json()["message"])
 
+    def test_subscription_retry_does_not_toggle_back(self):
+        url = reverse("subscribe-course")
+        for _ in range(2):
+            response = self.client.post(url, data={"course_id": self.course.pk}, HTTP_IDEMPOTENCY_KEY="subscribe-1")
+            self.assertEqual(response.json()["message"], "Subscription added.")
+        self.assertEqual(Subscription.objects.count(), 1)
+
+    def test_subscription_toggle_query_count(self):
+        url = reverse("subscribe-course")
+        for message in ("Subscription added.", "Subscription removed."):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(url, data={"course_id": self.course.pk})
+            self.assertEqual(response.json()["message"], message)
+            self.assertLessEqual(len(data_queries(queries)), 4)
+        self.assertEqual(self.client.post(url, data={"course_id": 999999}).status_code, 404)
+
+    def test_bulk_subscription(self):
+        courses = [
+            Course.objects.create(title=f"Course {i}", owner=self.user, description="Description") for i in range(3)
+        ]
+        course_ids = [course.pk for course in courses]
+        url = reverse("subscription-bulk")
+
+        # Блокировка курсов, чтение подписок, вставка и обновление счетчиков
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, data={"course_ids": course_ids, "subscribed": True}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(data_queries(queries)), 4)
+        self.assertEqual(Subscription.objects.filter(user=self.user).count(), 3)
+
+        # Повторная подписка не создает дубликатов
+        self.client.post(url, data={"course_ids": course_ids, "subscribed": True}, format="json")
+        self.assertEqual(Subscription.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(set(Course.objects.filter(pk__in=course_ids).values_list("subscribers_count", flat=True)), {1})
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, data={"course_ids": course_ids[:2], "subscribed": False}, format="json")
+        self.assertEqual(len(data_queries(queries)), 4)
+        self.assertEqual(list(Subscription.objects.values_list("course_id", flat=True)), [course_ids[2]])
+        self.assertEqual(Course.objects.get(pk=course_ids[0]).subscribers_count, 0)
+
+    def bulk_subscribe_after(self, concurrent, courses, subscribed):
+        """
+        Массовая подписка, перед которой (до блокировки курсов) успел выполниться параллельный запрос concurrent
+        """
+        select_for_update = Course.objects.select_for_update
+        pending = [concurrent]
+
+        def locked(*args, **kwargs):
+            if pending:
+                pending.pop()()
+            return select_for_update(*args, **kwargs)
+
+        with mock.patch.object(Course.objects, "select_for_update", locked):
+            response = self.client.post(
+                reverse("subscription-bulk"),
+                data={"course_ids": [course.pk for course in courses], "subscribed": subscribed}, format="json",
+            )
+        self.assertEqual(response.status_code, 200)
+        return [Course.objects.get(pk=course.pk).subscribers_count for course in courses]
+
+    def test_bulk_subscription_concurrent_subscribe(self):
+        courses = [
+            Course.objects.create(title=f"Course {i}", owner=self.user, description="Description") for i in range(2)
+        ]
+        counts = self.bulk_subscribe_after(
+            lambda: Subscription.objects.create(user=self.user, course=courses[0]), courses, subscribed=True
+        )
+        self.assertEqual(counts, [1, 1])
+        self.assertEqual(Subscription.objects.filter(user=self.user).count(), 2)
+
+    def test_bulk_subscription_concurrent_unsubscribe(self):
+        courses = [
+            Course.objects.create(title=f"Course {i}", owner=self.user, description="Description") for i in range(2)
+        ]
+        for course in courses:
+            Subscription.objects.create(user=self.user, course=course)
+
+        def unsubscribe():
+            self.client.delete(reverse("subscription"), {"course_id": courses[0].pk}, format="json")
+
+        counts = self.bulk_subscribe_after(unsubscribe, courses, subscribed=False)
+        self.assertEqual(counts, [0, 0])
+        self.assertFalse(Subscription.objects.filter(user=self.user).exists())
+
+    def test_bulk_subscription_unknown_course(self):
+        response = self.client.post(
+            reverse("subscription-bulk"), data={"course_ids": [self.course.pk, 999999], "subscribed": True},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["course_ids"], [999999])
+        self.assertEqual(Subscription.objects.count(), 0)
+
     def test_subscription_delete(self):
         """
         Тест отмены подписки
@@ -147,3 +644,883 @@ class SubscriptionTest(TestCase):
         response = self.client.delete(url, data={"user_id": self.user.pk, "course_id": self.course.pk})
         self.assertEqual(response.status_code, 204)
         self.assertEqual(Subscription.objects.count(), 0)
+
+
+class FakeStripe:
+    """
+    Локальная подмена модуля stripe: запоминает вызовы и возвращает предсказуемые id.
+    """
+
+    def __init__(self, fail_times=0):
+        self.calls = []
+        self.fail_times = fail_times
+        self.Product = SimpleNamespace(create=self._create("product"))
+        self.Price = SimpleNamespace(create=self._create("price"))
+        self.checkout = SimpleNamespace(Session=SimpleNamespace(create=self._create("session")))
+
+    def _create(self, kind):
+        def create(**params):
+            if self.fail_times:
+                self.fail_times -= 1
+                raise RuntimeError("Stripe is unavailable")
+            self.calls.append((kind, params))
+            object_id = f"{kind}_{len(self.calls)}"
+            return {"id": object_id, "url": f"https://checkout.stripe.test/{object_id}"}
+        return create
+
+
+class PaymentCheckoutTestCase(TestCase):
+    """
+    Тесты для синхронного и асинхронного создания оплаты
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.stripe = FakeStripe()
+        patcher = mock.patch("lms.services.stripe", self.stripe)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        stripe_catalog_cache.clear()
+        self.addCleanup(stripe_catalog_cache.clear)
+
+    def test_sync_checkout(self):
+        response = self.client.post(reverse("payment-create"), {"product_name": "Course", "product_price": 10})
+        self.assertEqual(response.status_code, 201)
+        payment = Payment.objects.get()
+        self.assertEqual(payment.status, Payment.STATUS_COMPLETED)
+        self.assertEqual(response.json()["payment_url"], payment.stripe_session_url)
+
+    def test_async_checkout(self):
+        response = self.client.post(
+            reverse("payment-create"), {"product_name": "Course", "product_price": 10}, HTTP_PREFER="respond-async"
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.stripe.calls, [])
+        status_url = response.json()["status_url"]
+        with self.settings(CHECKOUT_STATUS_MAX_WAIT=0):
+            pending = self.client.get(status_url, {"wait": 30})
+        self.assertEqual(pending.json()["status"], Payment.STATUS_PENDING)
+        self.assertEqual(pending["Retry-After"], "1")
+
+        call_command("run_checkout_worker", once=True, stdout=mock.MagicMock())
+
+        completed = self.client.get(status_url, {"wait": 1})
+        self.assertNotIn("Retry-After", completed)
+        data = completed.json()
+        self.assertEqual(data["status"], Payment.STATUS_COMPLETED)
+        self.assertTrue(data["payment_url"].startswith("https://checkout.stripe.test/"))
+        self.assertEqual(len(self.stripe.calls), 3)
+        self.assertIsNotNone(PaymentOutbox.objects.get().processed_at)
+
+    def test_async_checkout_retries_failures(self):
+        self.stripe.fail_times = 1
+        self.client.post(reverse("payment-create") + "?async=1", {"product_name": "Course", "product_price": 10})
+        call_command("run_checkout_worker", once=True, stdout=mock.MagicMock())
+
+        entry = PaymentOutbox.objects.get()
+        self.assertEqual(entry.attempts, 1)
+        self.assertIsNone(entry.processed_at)
+        self.assertEqual(entry.payment.status, Payment.STATUS_PENDING)
+
+    def test_outbox_entry_is_claimed_once(self):
+        for _ in range(2):
+            self.client.post(reverse("payment-create") + "?async=1", {"product_name": "Course", "product_price": 10})
+        first, second = PaymentOutbox.objects.order_by("id")
+
+        def select_then_race(rows):
+            rows = list(rows)
+            # Другой воркер забрал первую задачу между выборкой и UPDATE
+            PaymentOutbox.objects.filter(pk=first.pk).update(locked_at=timezone.now())
+            return rows
+
+        # Гонка возможна только без SKIP LOCKED: проверяем этот путь и на PostgreSQL
+        with mock.patch("lms.checkout.list", select_then_race, create=True), \
+                mock.patch.object(connection.features, "has_select_for_update_skip_locked", False):
+            entries = claim_outbox_batch(10)
+        self.assertEqual([entry.pk for entry in entries], [second.pk])
+
+    def test_products_and_prices_are_reused(self):
+        url = reverse("payment-create")
+        self.client.post(url, {"product_name": "Course", "product_price": 10})
+        self.client.post(url, {"product_name": "Course", "product_price": 10})
+        stripe_catalog_cache.clear()  # Из таблицы каталога, без LRU
+        self.client.post(url, {"product_name": "Course", "product_price": 10})
+        self.client.post(url, {"product_name": "Course", "product_price": 20})
+
+        kinds = [kind for kind, params in self.stripe.calls]
+        self.assertEqual(kinds.count("product"), 2)
+        self.assertEqual(kinds.count("price"), 2)
+        self.assertEqual(kinds.count("session"), 4)
+        self.assertEqual(StripePrice.objects.count(), 2)
+
+    def test_concurrent_misses_are_deduplicated(self):
+        started = threading.Barrier(4)
+
+        def checkout():
+            started.wait()
+            return get_or_create_stripe_price("Course", 1000)
+
+        with mock.patch("lms.services.load_catalog_entry", return_value=None), \
+                mock.patch("lms.services.save_catalog_entry", side_effect=lambda *args: args[3:]):
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                results = list(executor.map(lambda _: checkout(), range(4)))
+
+        self.assertEqual(len(set(results)), 1)
+        self.assertEqual([kind for kind, params in self.stripe.calls], ["product", "price"])
+
+    def test_idempotent_payment_create(self):
+        url = reverse("payment-create")
+        data = {"product_name": "Course", "product_price": 10}
+        first = self.client.post(url, data, HTTP_IDEMPOTENCY_KEY="checkout-1")
+        second = self.client.post(url, data, HTTP_IDEMPOTENCY_KEY="checkout-1")
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertEqual(Payment.objects.count(), 1)
+
+        other = self.client.post(url, {"product_name": "Other", "product_price": 10}, HTTP_IDEMPOTENCY_KEY="checkout-1")
+        self.assertEqual(other.status_code, 422)
+
+    def test_in_progress_duplicate_conflicts(self):
+        request_hash = "unused"
+        IdempotencyKey.objects.create(
+            user=self.user, scope="PaymentCreateView.post", key="busy", request_hash=request_hash,
+            expires_at=timezone.now() + timedelta(hours=1),
+        )
+        with mock.patch("lms.idempotency.get_request_hash", return_value=request_hash), \
+                self.settings(IDEMPOTENCY_WAIT_TIMEOUT=0):
+            response = self.client.post(
+                reverse("payment-create"), {"product_name": "Course", "product_price": 10},
+                HTTP_IDEMPOTENCY_KEY="busy",
+            )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Payment.objects.count(), 0)
+
+    def test_stale_in_progress_key_is_taken_over(self):
+        # Процесс, выполнявший первый запрос, упал и не освободил ключ
+        request_hash = "unused"
+        IdempotencyKey.objects.create(
+            user=self.user, scope="PaymentCreateView.post", key="crashed", request_hash=request_hash,
+            expires_at=timezone.now() + timedelta(hours=1), locked_at=timezone.now() - timedelta(minutes=10),
+        )
+        with mock.patch("lms.idempotency.get_request_hash", return_value=request_hash), \
+                self.settings(IDEMPOTENCY_WAIT_TIMEOUT=0, IDEMPOTENCY_LOCK_TIMEOUT=60):
+            response = self.client.post(
+                reverse("payment-create"), {"product_name": "Course", "product_price": 10},
+                HTTP_IDEMPOTENCY_KEY="crashed",
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Payment.objects.count(), 1)
+        self.assertEqual(IdempotencyKey.objects.get(key="crashed").state, IdempotencyKey.STATE_COMPLETED)
+
+    def test_purge_expired_keys(self):
+        for key, delta in (("old", -1), ("fresh", 1)):
+            IdempotencyKey.objects.create(
+                user=self.user, scope="SubscriptionView.post", key=key, request_hash="hash",
+                expires_at=timezone.now() + timedelta(hours=delta),
+            )
+        call_command("purge_idempotency_keys", stdout=mock.MagicMock())
+        self.assertEqual(list(IdempotencyKey.objects.values_list("key", flat=True)), ["fresh"])
+
+    def test_status_is_private(self):
+        response = self.client.post(reverse("payment-create") + "?async=1", {"product_name": "Course", "product_price": 10})
+        other = CustomUser.objects.create_user(email="other@test.ru", password="password")
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get(response.json()["status_url"]).status_code, 404)
+
+
+class FakeStripeServer:
+    """
+    Локальный HTTP-сервер, отвечающий как Stripe API. В failures можно задать сбои
+    для очередных запросов: код ответа или задержку в секундах (float).
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.failures = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                server.requests.append((self.path, self.headers.get("Idempotency-Key")))
+                failure = server.failures.pop(0) if server.failures else None
+                if isinstance(failure, float):
+                    time.sleep(failure)
+                if isinstance(failure, int):
+                    self.respond(failure, b'{"error": {"message": "Stripe failure", "type": "api_error"}}')
+                    return
+                object_id = f"obj_{len(server.requests)}"
+                body = f'{{"id": "{object_id}", "url": "https://checkout.stripe.test/{object_id}"}}'
+                self.respond(200, body.encode())
+
+            def respond(self, code, body):
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class StripeClientTestCase(TestCase):
+    """
+    Тесты для обертки над Stripe: таймауты, повторы и размыкатель цепи
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.server = FakeStripeServer()
+        self.addCleanup(self.server.stop)
+        self.client_wrapper = StripeClient(
+            timeout=0.5, max_retries=2, backoff_base=0.001, backoff_max=0.01,
+            breaker=CircuitBreaker(threshold=2, reset_timeout=60), api_base=self.server.url,
+        )
+        for patcher in (
+            mock.patch.multiple(stripe, api_key="sk_test_fake", api_base=stripe.api_base,
+                                default_http_client=None, max_network_retries=stripe.max_network_retries),
+            mock.patch("lms.services.stripe_client", self.client_wrapper),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        stripe_catalog_cache.clear()
+        self.addCleanup(stripe_catalog_cache.clear)
+
+    def test_retries_use_the_same_idempotency_key(self):
+        self.server.failures = [500, 0.8]  # Ошибка сервера, затем таймаут
+        response = self.client.post(reverse("payment-create"), {"product_name": "Course", "product_price": 10})
+        self.assertEqual(response.status_code, 201)
+
+        product_requests = [key for path, key in self.server.requests if path == "/v1/products"]
+        self.assertEqual(len(product_requests), 3)
+        self.assertEqual(len(set(product_requests)), 1)
+        stats = self.client_wrapper.get_stats()
+        self.assertEqual(stats["breaker"]["state"], CircuitBreaker.CLOSED)
+        self.assertEqual(stats["operations"]["product.create"]["errors"], 2)
+
+    def test_breaker_opens_and_fails_fast(self):
+        self.server.failures = [500] * 6
+        url = reverse("payment-create")
+        data = {"product_name": "Course", "product_price": 10}
+        self.assertEqual(self.client.post(url, data).status_code, 500)
+        self.assertEqual(self.client.post(url, data).status_code, 500)
+        self.assertEqual(self.client_wrapper.get_stats()["breaker"]["state"], CircuitBreaker.OPEN)
+
+        requests_before = len(self.server.requests)
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("Retry-After", response)
+        self.assertEqual(len(self.server.requests), requests_before)
+
+
+class PaymentPartitioningTestCase(TestCase):
+    """
+    Тесты для помесячного секционирования платежей (на SQLite таблицы остаются обычными)
+    """
+
+    def test_month_helpers(self):
+        self.assertEqual(add_months(date(2024, 11, 1), 3), date(2025, 2, 1))
+        self.assertEqual(add_months(date(2024, 1, 1), -1), date(2023, 12, 1))
+        self.assertEqual(list(month_range(date(2024, 11, 20), date(2025, 1, 5))),
+                         [date(2024, 11, 1), date(2024, 12, 1), date(2025, 1, 1)])
+        self.assertEqual(partition_name("users_payment", date(2025, 1, 1)), "users_payment_p202501")
+        self.assertEqual(bound(date(2025, 1, 1)), "2025-01-01 00:00:00+00")
+
+    @skipIf(connection.vendor == "postgresql", "проверяется на других СУБД")
+    def test_command_is_noop_without_postgresql(self):
+        output = StringIO()
+        call_command("partition_payments", "--retention", "12", stdout=output)
+        self.assertIn("PostgreSQL", output.getvalue())
+
+    @skipUnless(connection.vendor == "postgresql", "секционирование есть только на PostgreSQL")
+    def test_convert_command(self):
+        """
+        Тест: миграции оставляют таблицы обычными, перестраивает их только команда
+        """
+        with connection.cursor() as cursor:
+            self.assertFalse(is_partitioned(cursor, "lms_payment"))
+            self.assertFalse(is_partitioned(cursor, "users_payment"))
+        payment = Payment.objects.create(product_name="Course", product_price=100, user=self.user)
+        output = StringIO()
+        call_command("partition_payments", "--convert", stdout=output)
+        self.assertIn("перестроена в секционированную", output.getvalue())
+        with connection.cursor() as cursor:
+            self.assertTrue(is_partitioned(cursor, "lms_payment"))
+            self.assertTrue(is_partitioned(cursor, "users_payment"))
+
+        self.assertTrue(Payment.objects.filter(pk=payment.pk).exists())
+        created = Payment.objects.create(product_name="Course", product_price=100, user=self.user)
+        self.assertGreater(created.pk, payment.pk)
+
+    def test_outbox_is_deleted_with_payment(self):
+        """
+        Тест: внешний ключ очереди без ограничения в БД, каскадное удаление выполняет Django
+        """
+        payment = Payment.objects.create(product_name="Course", product_price=100, user=self.user)
+        PaymentOutbox.objects.create(payment=payment)
+        payment.delete()
+        self.assertFalse(PaymentOutbox.objects.exists())
+
+
+class QueryBudgetTestCase(QueryBudgetMixin, APITestCase):
+    """
+    Бюджет SQL-запросов эндпоинтов lms/urls.py
+    """
+
+    def test_courses(self):
+        course_url = reverse("course-detail", args=[self.course.pk])
+        self.assertQueryBudget(5, "get", reverse("course-list"))
+        self.assertQueryBudget(5, "get", reverse("course-lessons", args=[self.course.pk]))
+        self.assertQueryBudget(5, "post", reverse("course-list"), {"title": "New", "description": "Description"})
+        self.assertQueryBudget(5, "get", course_url)
+        self.assertQueryBudget(5, "patch", course_url, {"title": "Renamed"})
+        self.assertQueryBudget(11, "delete", course_url)
+
+    def test_lessons(self):
+        lesson_url = reverse("lesson-detail", args=[self.lesson.pk])
+        self.assertQueryBudget(4, "get", reverse("lesson-list"))
+        self.assertQueryBudget(5, "post", reverse("lesson-list"), {
+            "title": "New", "description": "Description", "video_url": "https://www.youtube.com/watch?v=1",
+            "course": self.course.pk,
+        })
+        self.assertQueryBudget(3, "get", lesson_url)
+        self.assertQueryBudget(5, "patch", lesson_url, {"title": "Renamed"})
+        self.assertQueryBudget(6, "delete", lesson_url)
+
+    def test_subscriptions(self):
+        self.assertQueryBudget(5, "post", reverse("subscription"), {"course_id": self.course.pk})
+        self.assertQueryBudget(7, "post", reverse("subscribe-course"), {"course_id": self.course.pk},
+                               HTTP_IDEMPOTENCY_KEY="budget-key")
+        self.assertQueryBudget(4, "delete", reverse("subscription"), {"course_id": self.course.pk})
+        course_ids = list(Course.objects.values_list("id", flat=True))
+        self.assertQueryBudget(5, "post", reverse("subscription-bulk"), {"course_ids": course_ids, "subscribed": True})
+        self.assertQueryBudget(5, "post", reverse("subscription-bulk"), {"course_ids": course_ids, "subscribed": False})
+
+    def test_payments(self):
+        self.assertQueryBudget(3, "post", reverse("payment-create") + "?async=1",
+                               {"product_name": "Course", "product_price": 100})
+        payment = Payment.objects.create(product_name="Course", product_price=100, user=self.users["owner"])
+        self.assertQueryBudget(2, "get", reverse("payment-status", args=[payment.pk]))
+
+    def test_service_endpoints(self):
+        self.assertQueryBudget(1, "get", reverse("cache-stats"))
+        self.assertQueryBudget(1, "get", reverse("stripe-status"))
+
+
+class BenchmarkTestCase(TestCase):
+    """
+    Тесты для нагрузочного прогона: сценарии через WSGI-приложение и сравнение результатов
+    """
+
+    def drive(self, workload_name, steps):
+        from config.wsgi import application
+
+        driver = WSGIDriver(application, host="testserver")
+        workload = WORKLOADS[workload_name]([self.course.pk], random.Random(1))
+        state = workload.new_state()
+        headers = {"Authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+        results = []
+        # Как и тестовый клиент Django, не закрываем соединение между запросами: иначе на PostgreSQL
+        # обрывается транзакция теста
+        request_started.disconnect(close_old_connections)
+        request_finished.disconnect(close_old_connections)
+        try:
+            for _ in range(steps):
+                operation, method, path, data = workload.next_request(state)
+                status, content = driver.request(method, path, json.dumps(data).encode() if data else b"", headers)
+                workload.handle_response(state, operation, status, content)
+                results.append((operation, status))
+        finally:
+            request_started.connect(close_old_connections)
+            request_finished.connect(close_old_connections)
+        return results
+
+    def test_workloads_through_wsgi(self):
+        self.assertEqual(self.drive("lessons", 4), [
+            ("lesson.create", 201), ("lesson.retrieve", 200), ("lesson.update", 200), ("lesson.delete", 204),
+        ])
+        self.assertEqual(self.drive("courses", 1), [("course.list", 200)])
+        self.assertEqual(self.drive("subscriptions", 2), [("subscription.toggle", 200)] * 2)
+        with stub_stripe() as stub:
+            self.assertEqual(self.drive("payments", 1), [("payment.create", 201)])
+        self.assertEqual(stub.calls, 3)
+        self.assertEqual(Payment.objects.get().stripe_session_url, "https://checkout.stripe.test/cs_bench_3")
+
+    def test_compare_results(self):
+        def result(p95, rps):
+            stats = {"p50_ms": 10, "p95_ms": p95, "p99_ms": 30, "rps": rps}
+            return {"scenarios": {"courses": dict(stats, operations={"course.list": stats})}}
+
+        rows = compare_results(result(20, 100), result(25, 95), threshold=10)
+        regressed = {(operation, metric) for scenario, operation, metric, *_, flag in rows if flag}
+        self.assertEqual(regressed, {("*", "p95_ms"), ("course.list", "p95_ms")})
+
+
+class MetricsTestCase(TestCase):
+    """
+    Тесты для замеров запросов: заголовок Server-Timing и эндпоинт /metrics
+    """
+
+    def setUp(self):
+        super().setUp()
+        registry.clear()
+        self.addCleanup(registry.clear)
+
+    def test_server_timing_header(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse("course-list"))
+        self.assertEqual(response.status_code, 200)
+        timing = dict(part.split(";", 1) for part in response["Server-Timing"].split(", "))
+        self.assertEqual(set(timing), {"total", "db", "ser"})
+        self.assertIn(f'desc="{len(data_queries(context.captured_queries))} queries"', timing["db"])
+
+    def test_stripe_time(self):
+        with stub_stripe():
+            response = self.client.post(reverse("payment-create"), {"product_name": "Course", "product_price": 10})
+        self.assertEqual(response.status_code, 201)
+        self.assertIn("stripe;dur=", response["Server-Timing"])
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse("course-list"))
+        self.client.get(reverse("course-list"))
+        CustomUser.objects.filter(pk=self.user.pk).update(is_staff=True)
+        response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        body = response.content.decode()
+        self.assertIn("# TYPE lms_http_request_duration_seconds histogram", body)
+        self.assertIn('lms_http_request_duration_seconds_count{view="course-list",method="GET",status="200"} 2', body)
+        self.assertIn('lms_http_request_db_queries_bucket{view="course-list",method="GET",le="+Inf"} 2', body)
+
+    def test_serialization_time(self):
+        registry.clear()
+        self.client.get(reverse("course-detail", args=[self.course.pk]))
+        series = registry.serialization_time.series[("course-detail", "GET")]
+        self.assertGreater(series[1], 0)
+
+    def test_metrics_require_staff_without_token(self):
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        token = AccessToken.for_user(self.user)
+        self.assertEqual(self.client.get(reverse("metrics"), HTTP_AUTHORIZATION=f"Bearer {token}").status_code, 200)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+        response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, 200)
+
+
+class ProfilingTestCase(TempDirectoryMixin, TestCase):
+    """
+    Тесты для профилирования запросов по требованию
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.use_temp_directory("PROFILING_DIR", PROFILING_ENABLED=True, PROFILING_MAX_PROFILES=2)
+        self.staff = CustomUser.objects.create_user(email="staff@test.ru", password="password", is_staff=True)
+        self.client.force_authenticate(user=None)
+
+    def get_as(self, user, url, **extra):
+        return self.client.get(url, HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}", **extra)
+
+    def test_staff_request_is_profiled(self):
+        response = self.get_as(self.staff, reverse("course-list"), HTTP_X_PROFILE="1")
+        self.assertEqual(response.status_code, 200)
+        profile_id = response["X-Profile-Id"]
+
+        profiles = self.get_as(self.staff, reverse("profile-list")).json()
+        self.assertEqual([profile["id"] for profile in profiles], [profile_id])
+        self.assertEqual(profiles[0]["view"], "course-list")
+        self.assertEqual(set(profiles[0]["phases_ms"]),
+                         {"authentication", "permissions", "throttling", "serialization", "rendering", "dispatch"})
+        self.assertGreater(profiles[0]["phases_ms"]["dispatch"], 0)
+
+        response = self.get_as(self.staff, reverse("profile-file", args=[profile_id, "prof"]))
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(len(b"".join(response.streaming_content)), 0)
+        response = self.get_as(self.staff, reverse("profile-file", args=["missing", "prof"]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_only_staff_and_flagged_requests(self):
+        self.assertNotIn("X-Profile-Id", self.get_as(self.user, reverse("course-list") + "?_profile=1"))
+        self.assertNotIn("X-Profile-Id", self.get_as(self.staff, reverse("course-list")))
+        self.assertEqual(self.get_as(self.user, reverse("profile-list")).status_code, 403)
+        with override_settings(PROFILING_SAMPLE_RATE=0):
+            self.assertNotIn("X-Profile-Id", self.get_as(self.staff, reverse("course-list") + "?_profile=1"))
+
+    def test_ring_keeps_latest_profiles(self):
+        ids = [self.get_as(self.staff, reverse("course-list") + "?_profile=1")["X-Profile-Id"] for _ in range(3)]
+        profiles = self.get_as(self.staff, reverse("profile-list")).json()
+        self.assertEqual({profile["id"] for profile in profiles}, set(ids[1:]))
+
+
+class SparseFieldsetTestCase(TestCase):
+    """
+    Тесты для выборочных полей (?fields=) и раскрытия связей (?expand=)
+    """
+
+    def get(self, url, **params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json(), [query["sql"] for query in data_queries(context.captured_queries)]
+
+    def test_default_payload_unchanged(self):
+        data, _ = self.get(reverse("course-list"))
+        self.assertIn("is_subscribed", data["results"][0])
+        data, _ = self.get(reverse("course-detail", args=[self.course.pk]))
+        self.assertIn("lessons", data)
+
+    def test_fields_skip_unused_relations_and_columns(self):
+        data, queries = self.get(reverse("course-list"), fields="id,title")
+        self.assertEqual(data["results"], [{"id": self.course.pk, "title": "Test Course"}])
+        self.assertFalse(any('"lms_lesson"' in sql for sql in queries))
+        course_query = next(sql for sql in queries if sql.startswith('SELECT "lms_course"."id"'))
+        self.assertNotIn('"lms_course"."description"', course_query)
+
+    def test_nested_fields(self):
+        data, queries = self.get(reverse("course-detail", args=[self.course.pk]), fields="title,lessons.title")
+        self.assertEqual(data, {"title": "Test Course", "lessons": [{"title": "Test Lesson"}]})
+        lesson_query = next(sql for sql in queries if sql.startswith('SELECT "lms_lesson"'))
+        self.assertNotIn('"lms_lesson"."description"', lesson_query)
+
+    def test_expand_uses_join(self):
+        data, queries = self.get(reverse("lesson-list"), fields="id,title", expand="course")
+        self.assertEqual(data["results"][0]["course"], {
+            "id": self.course.pk, "title": "Test Course", "description": "Test Description", "preview": None,
+            "lessons_count": 1, "subscribers_count": 0,
+        })
+        self.assertEqual(len([sql for sql in queries if '"lms_course"' in sql]), 1)
+
+        data, _ = self.get(reverse("lesson-detail", args=[self.lesson.pk]), expand="course", fields="course.title")
+        self.assertEqual(data, {"course": {"title": "Test Course"}})
+
+    def test_fields_ignored_on_write(self):
+        response = self.client.patch(reverse("lesson-detail", args=[self.lesson.pk]) + "?fields=id",
+                                     {"title": "Renamed"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["title"], "Renamed")
+
+
+class FastJSONTestCase(TestCase):
+    """
+    Тесты для рендерера и парсера JSON на orjson
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.lesson.preview.name = "lesson_previews/preview.png"
+        self.data = {
+            "amount": Decimal("1234.50"),
+            "aware": datetime(2026, 1, 2, 3, 4, 5, 123456, tzinfo=dt_timezone.utc),
+            "naive": datetime(2026, 1, 2, 3, 4, 5),
+            "day": date(2026, 1, 2),
+            "time": dt_time(3, 4, 5),
+            "lazy": gettext_lazy("Курс"),
+            "preview": self.lesson.preview,
+            "empty": Course().preview,
+            "separators": "a\u2028b\u2029c",
+            "nested": [{"id": 1, "title": "Урок"}, None, True, 1.5],
+        }
+
+    def test_output_matches_drf_renderer(self):
+        self.assertEqual(FastJSONRenderer().render(self.data), JSONRenderer().render(
+            dict(self.data, preview=self.lesson.preview.url, empty=None),
+        ))
+
+    def test_float_formatting(self):
+        # orjson записывает экспоненту иначе (1e16 вместо 1e+16), значения те же
+        data = {"big": 1e16, "small": 1e-7}
+        self.assertEqual(json.loads(FastJSONRenderer().render(data)), json.loads(JSONRenderer().render(data)))
+
+    def test_fallback_to_stdlib(self):
+        big = {"id": 2 ** 70}
+        self.assertEqual(FastJSONRenderer().render(big), JSONRenderer().render(big))
+        data = {"title": "Курс"}
+        self.assertEqual(FastJSONRenderer().render(data, "application/json; indent=2"),
+                         JSONRenderer().render(data, "application/json; indent=2"))
+        with override_settings(FAST_JSON_ENABLED=False), mock.patch("config.fastjson.orjson.dumps") as dumps:
+            self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        dumps.assert_not_called()
+
+    def test_parser(self):
+        content = JSONRenderer().render({"title": "Курс", "ids": [1, 2]})
+        self.assertEqual(FastJSONParser().parse(BytesIO(content)), JSONParser().parse(BytesIO(content)))
+        for invalid in (b"{", b'{"value": NaN}'):
+            with self.assertRaises(ParseError):
+                FastJSONParser().parse(BytesIO(invalid))
+        latin = "{\"title\": \"caf\u00e9\"}".encode("latin-1")
+        self.assertEqual(FastJSONParser().parse(BytesIO(latin), parser_context={"encoding": "latin-1"}),
+                         {"title": "caf\u00e9"})
+
+    def test_api_uses_fast_renderer(self):
+        with mock.patch("config.fastjson.orjson.dumps", wraps=orjson.dumps) as dumps:
+            response = self.client.post(reverse("course-list"), {"title": "Новый", "description": "Описание"},
+                                        format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["title"], "Новый")
+        dumps.assert_called()
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command("benchmark_json", size=5, rounds=1, stdout=out)
+        self.assertIn("payments", out.getvalue())
+
+
+class FastPathTestCase(QueryBudgetMixin, APITestCase):
+    """
+    Тесты для вывода списков через .values() без моделей и полей DRF
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Course.objects.filter(pk=cls.course.pk).update(preview="course_previews/course.png")
+        Lesson.objects.filter(pk=cls.lesson.pk).update(preview="lesson_previews/lesson.png")
+        Subscription.objects.get_or_create(user=cls.users["owner"], course=cls.course)
+
+    def test_lists_identical_to_serializers(self):
+        self.assertFastPathIdentical(reverse("course-list"))
+        self.assertFastPathIdentical(reverse("course-list") + "?pagination=cursor")
+        self.assertFastPathIdentical(reverse("lesson-list") + "?page_size=3&page=2", roles=("owner", "moderator"))
+        self.assertFastPathIdentical(reverse("lesson-list") + "?pagination=cursor&page_size=3")
+
+    def test_rows_are_not_instantiated(self):
+        self.request_as("owner", "get", reverse("course-list"))
+        get_cache().clear()
+        with mock.patch.object(Lesson, "from_db") as lesson_from_db, \
+                mock.patch.object(Course, "from_db") as course_from_db:
+            response = self.request_as("moderator", "get", reverse("lesson-list"))
+            self.request_as("moderator", "get", reverse("course-list"))
+        self.assertEqual(response.status_code, 200)
+        lesson_from_db.assert_not_called()
+        course_from_db.assert_not_called()
+
+    def test_sparse_selection_uses_serializers(self):
+        get_cache().clear()
+        with mock.patch.object(Course, "from_db", wraps=Course.from_db) as from_db:
+            response = self.request_as("owner", "get", reverse("course-list") + "?fields=id,title")
+        self.assertEqual(response.status_code, 200)
+        from_db.assert_called()
+
+    def test_not_compilable_serializer(self):
+        self.assertIsNone(compile_serializer(SubscriptionSerializer))
+        self.assertIsNotNone(compile_serializer(CourseListSerializer))
+        self.assertEqual(len(compile_serializer(CourseSerializer).nested), 1)  # Уроки — одним запросом на страницу
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command("benchmark_serialization", size=5, rounds=1, stdout=out)
+        self.assertIn("lessons", out.getvalue())
+
+
+def image_upload(name="preview.png", size=(1200, 800), image_format="PNG", mode="RGBA"):
+    buffer = BytesIO()
+    Image.new(mode, size, (200, 100, 50, 128)[:len(mode)]).save(buffer, image_format)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type=f"image/{image_format.lower()}")
+
+
+class ImageVariantTestCase(TempDirectoryMixin, TestCase):
+    """
+    Тесты для очереди уменьшенных копий превью и аватаров
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.use_temp_directory("MEDIA_ROOT", IMAGE_VARIANT_WIDTHS=[160, 320, 640])
+
+    def upload_preview(self, **kwargs):
+        url = reverse("course-detail", args=[self.course.pk])
+        with mock.patch("lms.images.generate_variants") as generate:
+            response = self.client.patch(url, {"preview": image_upload(**kwargs)}, format="multipart")
+        self.assertEqual(response.status_code, 200)
+        generate.assert_not_called()  # Загрузка не ждет обработки
+        self.course.refresh_from_db()
+        return response
+
+    def test_upload_enqueues_and_worker_records_variants(self):
+        self.upload_preview()
+        self.assertIsNone(self.course.preview_variants)
+        job = ImageVariantJob.objects.get()
+        self.assertEqual((job.model_label, job.object_id, job.source), ("lms.course", self.course.pk,
+                                                                       self.course.preview.name))
+
+        call_command("run_image_worker", once=True, stdout=StringIO())
+        self.course.refresh_from_db()
+        variants = self.course.preview_variants
+        self.assertEqual(variants["source"], self.course.preview.name)
+        self.assertEqual([(image["width"], image["height"]) for image in variants["images"]],
+                         [(160, 107), (320, 213), (640, 427)])
+        storage = self.course.preview.storage
+        with storage.open(variants["images"][0]["webp"]) as file, Image.open(file) as image:
+            self.assertEqual((image.format, image.size, image.mode), ("WEBP", (160, 107), "RGBA"))
+        with storage.open(variants["images"][0]["jpeg"]) as file, Image.open(file) as image:
+            self.assertEqual((image.format, image.mode), ("JPEG", "RGB"))
+        self.assertIsNotNone(ImageVariantJob.objects.get().processed_at)
+
+    def test_size_hint_selects_variant(self):
+        self.upload_preview()
+        call_command("run_image_worker", once=True, stdout=StringIO())
+        self.course.refresh_from_db()
+        images = self.course.preview_variants["images"]
+        url = reverse("course-detail", args=[self.course.pk])
+        self.assertTrue(self.client.get(url).json()["preview"].endswith(self.course.preview.url))
+        self.assertTrue(self.client.get(url, {"image_width": 200}).json()["preview"].endswith(images[1]["webp"]))
+        self.assertTrue(self.client.get(url, {"image_width": 2000, "image_format": "jpeg"}).json()["preview"]
+                        .endswith(images[2]["jpeg"]))
+        # Список через .values() и ?fields= выбирают ту же копию
+        listed = self.client.get(reverse("course-list"), {"image_width": 100}).json()["results"][0]["preview"]
+        self.assertTrue(listed.endswith(images[0]["webp"]))
+        sparse = self.client.get(reverse("course-list"), {"image_width": 100, "fields": "id,preview"}).json()
+        self.assertEqual(sparse["results"][0]["preview"], listed)
+
+    def test_small_and_jpeg_sources(self):
+        self.upload_preview(name="small.png", size=(100, 50))
+        call_command("run_image_worker", once=True, stdout=StringIO())
+        self.course.refresh_from_db()
+        self.assertEqual([image["width"] for image in self.course.preview_variants["images"]], [100])
+
+        self.upload_preview(name="photo.jpg", size=(3000, 2000), image_format="JPEG", mode="RGB")
+        call_command("run_image_worker", once=True, stdout=StringIO())
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.preview_variants["source"], self.course.preview.name)
+        self.assertEqual(self.course.preview_variants["images"][-1]["width"], 640)
+
+    def test_replaced_source_is_skipped(self):
+        self.upload_preview(name="first.png")
+        first = self.course.preview.name
+        self.upload_preview(name="second.png")
+        call_command("run_image_worker", once=True, stdout=StringIO())
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.preview_variants["source"], self.course.preview.name)
+        self.assertNotEqual(first, self.course.preview.name)
+        self.assertFalse(ImageVariantJob.objects.filter(processed_at__isnull=True).exists())
+
+        self.client.patch(reverse("course-detail", args=[self.course.pk]), {"preview": ""}, format="multipart")
+        self.course.refresh_from_db()
+        self.assertIsNone(self.course.preview_variants)
+
+    def test_failed_job_is_retried(self):
+        self.upload_preview()
+        self.course.preview.storage.delete(self.course.preview.name)
+        call_command("run_image_worker", once=True, stdout=StringIO())
+        job = ImageVariantJob.objects.get()
+        self.assertEqual(job.attempts, 1)
+        self.assertIsNone(job.processed_at)
+        self.assertGreater(job.available_at, timezone.now())
+
+
+class MediaServeTestCase(TempDirectoryMixin, TestCase):
+    """
+    Тесты для отдачи загруженных файлов: Range, ETag, кэширование и отдача через прокси
+    """
+
+    def setUp(self):
+        super().setUp()
+        media = self.use_temp_directory("MEDIA_ROOT", MEDIA_CHUNK_SIZE=7)
+        self.content = bytes(range(100))
+        os.makedirs(os.path.join(media, "course_previews", "variants"))
+        os.makedirs(os.path.join(media, "avatars"))
+        for name in ("course_previews/file.png", "course_previews/variants/file-160w-0123456789ab.webp", ".secret",
+                     "avatars/own.png", "avatars/other.png"):
+            with open(os.path.join(media, name), "wb") as file:
+                file.write(self.content)
+        CustomUser.objects.filter(pk=self.user.pk).update(avatar="avatars/own.png")
+        self.url = reverse("media", args=["course_previews/file.png"])
+        # Отдача файлов — не представление DRF: пользователь определяется по JWT
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+
+    def get(self, url=None, **headers):
+        response = self.client.get(url or self.url, headers=headers)
+        body = b"".join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_full_file_and_conditional_requests(self):
+        response, body = self.get()
+        self.assertEqual((response.status_code, body), (200, self.content))
+        self.assertEqual(response["Content-Type"], "image/png")
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(response["Cache-Control"], "private, max-age=3600")
+
+        response, body = self.get(**{"If-None-Match": response["ETag"]})
+        self.assertEqual((response.status_code, body), (304, b""))
+        self.assertIn("ETag", response)
+        response, _ = self.get(**{"If-Modified-Since": response["Last-Modified"]})
+        self.assertEqual(response.status_code, 304)
+
+    def test_ranges(self):
+        response, body = self.get(Range="bytes=10-19")
+        self.assertEqual((response.status_code, body), (206, self.content[10:20]))
+        self.assertEqual(response["Content-Range"], "bytes 10-19/100")
+        self.assertEqual(response["Content-Length"], "10")
+        self.assertEqual(self.get(Range="bytes=-5")[1], self.content[-5:])
+        self.assertEqual(self.get(Range="bytes=90-")[1], self.content[90:])
+        response, _ = self.get(Range="bytes=200-")
+        self.assertEqual((response.status_code, response["Content-Range"]), (416, "bytes */100"))
+        # Файл изменился с версии клиента — целиком
+        response, body = self.get(Range="bytes=0-9", **{"If-Range": '"stale"'})
+        self.assertEqual((response.status_code, body), (200, self.content))
+
+    def test_hashed_variants_are_immutable(self):
+        response, _ = self.get(reverse("media", args=["course_previews/variants/file-160w-0123456789ab.webp"]))
+        self.assertEqual(response["Cache-Control"], "private, max-age=31536000, immutable")
+
+    def test_access(self):
+        for path in ("../settings.py", ".secret", "course_previews/missing.png"):
+            self.assertEqual(self.client.get(reverse("media", args=[path])).status_code, 404)
+        self.client.credentials()
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        with override_settings(MEDIA_REQUIRE_AUTH=False):
+            response, body = self.get()
+            self.assertEqual((response.status_code, body), (200, self.content))
+            self.assertTrue(response["Cache-Control"].startswith("public"))
+            # Правило каталога действует и без MEDIA_REQUIRE_AUTH
+            self.assertEqual(self.client.get(reverse("media", args=["avatars/own.png"])).status_code, 403)
+
+    def test_avatar_access(self):
+        own, other = (reverse("media", args=[f"avatars/{name}.png"]) for name in ("own", "other"))
+        self.assertEqual(self.client.get(own).status_code, 200)
+        self.assertEqual(self.client.get(other).status_code, 403)
+        # Уменьшенные копии своего аватара
+        variant = "avatars/variants/own-64w-0123456789ab.webp"
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, "avatars", "variants"))
+        with open(os.path.join(settings.MEDIA_ROOT, variant), "wb") as file:
+            file.write(self.content)
+        CustomUser.objects.filter(pk=self.user.pk).update(
+            avatar_variants={"source": "avatars/own.png", "images": [{"width": 64, "height": 64, "webp": variant}]},
+        )
+        self.assertEqual(self.client.get(reverse("media", args=[variant])).status_code, 200)
+        moderator = CustomUser.objects.create_user(email="moderator@test.ru", password="password")
+        moderator.groups.add(Group.objects.get_or_create(name="Модераторы")[0])
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(moderator)}")
+        response = self.client.get(other)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Cache-Control"].startswith("private"))
+
+    def test_offloaded_sending(self):
+        with override_settings(MEDIA_ACCEL="nginx"):
+            response, body = self.get()
+            self.assertEqual(response["X-Accel-Redirect"], "/protected-media/course_previews/file.png")
+            self.assertEqual(body, b"")
+            self.assertIn("ETag", response)
+        with override_settings(MEDIA_ACCEL="sendfile"):
+            response, _ = self.get()
+            self.assertTrue(response["X-Sendfile"].endswith(os.path.join("course_previews", "file.png")))
+
+    def test_head(self):
+        response = self.client.head(self.url)
+        self.assertEqual((response.status_code, response["Content-Length"], response.content), (200, "100", b""))
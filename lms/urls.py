@@ -1,8 +1,7 @@
 from django.urls import path, include
-from django.conf import settings
-from django.conf.urls.static import static
 from rest_framework.routers import DefaultRouter
-from .views import CourseViewSet, LessonListCreateView, LessonDetailView, SubscriptionView, PaymentCreateView
+from .views import (CourseViewSet, LessonListCreateView, LessonDetailView, SubscriptionView, PaymentCreateView,
+                    CacheStatsView, PaymentStatusView, StripeStatusView, BulkSubscriptionView)
 
 router = DefaultRouter()
 router.register(r'courses', CourseViewSet, basename='course')
@@ -13,8 +12,10 @@ urlpatterns = [
     path('lessons/<int:pk>/', LessonDetailView.as_view(), name='lesson-detail'),
     path('subscription/', SubscriptionView.as_view(), name='subscription'),
     path('subscribe/', SubscriptionView.as_view(), name='subscribe-course'),
+    path('subscriptions/bulk/', BulkSubscriptionView.as_view(), name='subscription-bulk'),
     path('payments/create/', PaymentCreateView.as_view(), name='payment-create'),
+    path('payments/<int:pk>/status/', PaymentStatusView.as_view(), name='payment-status'),
+    path('cache/stats/', CacheStatsView.as_view(), name='cache-stats'),
+    path('stripe/status/', StripeStatusView.as_view(), name='stripe-status'),
 
 ]
-
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -1,22 +1,46 @@
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef
 from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import generics, viewsets, status
-from rest_framework.exceptions import PermissionDenied
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, PermissionDenied
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from config.fastpath import FastPathListMixin
+from config.fieldsets import SparseFieldsetViewMixin
 from users.permissions import IsModerator, IsOwner
+from .cache import COURSES, LESSONS, CachedListMixin, bump_generations, get_cache_stats
+from .checkout import enqueue_checkout, run_checkout
+from .conditional import ConditionalDetailMixin
+from .counters import adjust_course_counters, lock_courses
+from .idempotency import idempotent
 from .models import Lesson, Course, Subscription, Payment
-from .paginators import LessonPagination, CoursePagination
-from .serializers import LessonSerializer, CourseSerializer, SubscriptionSerializer
-from .services import create_stripe_product, create_stripe_price, create_stripe_session
+from .paginators import CourseLessonPagination, LessonPagination, CoursePagination
+from .serializers import (LessonSerializer, CourseSerializer, CourseListSerializer, SubscriptionSerializer,
+                          BulkSubscriptionSerializer)
+from .stripe_client import StripeUnavailable, stripe_client
 
 
-class LessonListCreateView(generics.ListCreateAPIView):
+class LessonListCreateView(SparseFieldsetViewMixin, CachedListMixin, FastPathListMixin, generics.ListCreateAPIView):
     queryset = Lesson.objects.all()
     serializer_class = LessonSerializer
     pagination_class = LessonPagination
+    cache_resources = (LESSONS,)
+    sparse_required_fields = ('owner',)  # Ключ keyset-пагинации
+
+    def get_list_cache_scope(self):
+        # Модераторы видят одинаковый список, остальные — только свои уроки
+        if self.request.user.is_moderator:
+            return 'role:moderator'
+        return f'user:{self.request.user.pk}'
 
     @swagger_auto_schema(
         operation_description="Получить список уроков или создать новый урок.",
@@ -29,9 +53,10 @@ class LessonListCreateView(generics.ListCreateAPIView):
         Модераторы видят все уроки.
         """
         user = self.request.user
-        if user.groups.filter(name='Модераторы').exists():
-            return Lesson.objects.all()
-        return Lesson.objects.filter(owner=user)
+        queryset = Lesson.objects.all() if user.is_moderator else Lesson.objects.filter(owner=user)
+        if self.has_sparse_selection():
+            queryset = self.optimize_queryset(queryset)
+        return queryset
 
     @swagger_auto_schema(
         operation_description="Создать новый урок.",
@@ -47,10 +72,16 @@ class LessonListCreateView(generics.ListCreateAPIView):
         return super().get_permissions()
 
 
-class LessonDetailView(generics.RetrieveUpdateDestroyAPIView):
+class LessonDetailView(SparseFieldsetViewMixin, ConditionalDetailMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Lesson.objects.all()
     serializer_class = LessonSerializer
     permission_classes = [IsAuthenticated]
+    sparse_required_fields = ('owner', 'updated_at')  # Проверка владельца и ETag
+
+    def get_queryset(self):
+        if self.has_sparse_selection():
+            return self.optimize_queryset(Lesson.objects.all())
+        return Lesson.objects.all()
 
     @swagger_auto_schema(
         operation_description="Получить данные урока, обновить или удалить.",
@@ -74,10 +105,14 @@ class LessonDetailView(generics.RetrieveUpdateDestroyAPIView):
         serializer.save(owner=self.request.user)
 
 
-class CourseViewSet(viewsets.ModelViewSet):
+class CourseViewSet(SparseFieldsetViewMixin, CachedListMixin, FastPathListMixin, ConditionalDetailMixin,
+                   viewsets.ModelViewSet):
     queryset = Course.objects.all()
     serializer_class = CourseSerializer
     pagination_class = CoursePagination
+    cache_resources = (COURSES,)  # Ответ зависит от подписок пользователя, поэтому ключ — по пользователю
+    etag_fields = ('updated_at', 'user_subscribed')
+    sparse_required_fields = ('owner', 'updated_at')  # Ключ пагинации, проверка владельца и ETag
 
     @swagger_auto_schema(
         operation_description="Получить список курсов или создать новый курс.",
@@ -94,7 +129,7 @@ class CourseViewSet(viewsets.ModelViewSet):
     )
     def create(self, request, *args, **kwargs):
         # Проверка: запрещаем модераторам создание курсов
-        if request.user.groups.filter(name='Модераторы').exists():
+        if request.user.is_moderator:
             raise PermissionDenied("Модераторам запрещено создавать курсы.")
         return super().create(request, *args, **kwargs)
 
@@ -103,10 +138,53 @@ class CourseViewSet(viewsets.ModelViewSet):
         responses={200: CourseSerializer(many=True)}
     )
     def get_queryset(self):
+        # Всё, что нужно сериализатору, загружаем заранее: без запросов на каждый курс
+        queryset = self.get_etag_queryset().order_by('id')
+        if self.has_sparse_selection():
+            # Только выбранные поля; уроки загружаются, только если остались в ответе
+            return self.optimize_queryset(queryset)
+        if self.action == 'retrieve':
+            # В списке уроков нет, после изменения DRF все равно перечитывает связи, при удалении они не нужны
+            queryset = queryset.prefetch_related('lessons')
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return CourseListSerializer
+        if self.action == 'lessons':
+            return LessonSerializer
+        return CourseSerializer
+
+    @swagger_auto_schema(
+        method='get',
+        operation_description="Уроки курса постранично (?page=N или ?pagination=cursor).",
+        responses={200: LessonSerializer(many=True)},
+    )
+    @action(detail=True, methods=['get'], pagination_class=CourseLessonPagination)
+    def lessons(self, request, pk=None):
+        # Курс должен быть доступен пользователю так же, как в retrieve; сам курс не загружаем
+        if not self.get_etag_queryset().filter(pk=pk).exists():
+            raise NotFound()
+        # Один запрос по индексу (course_id, id): стоимость страницы не зависит от числа уроков
+        queryset = Lesson.objects.filter(course_id=pk).order_by('course_id', 'id')
+        if self.has_sparse_selection():
+            queryset = self.optimize_queryset(queryset)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    def get_etag_queryset(self):
+        """
+        Курсы, доступные пользователю, с признаком его подписки (без уроков и подсчётов).
+        """
         user = self.request.user
         if user.is_moderator:
-            return Course.objects.all()
-        return Course.objects.filter(owner=user)
+            queryset = Course.objects.all()
+        else:
+            queryset = Course.objects.filter(owner=user)
+        return queryset.annotate(
+            user_subscribed=Exists(Subscription.objects.filter(user=user, course=OuterRef('pk'))),
+        )
 
     def get_permissions(self):
         if self.action == 'create':
@@ -132,37 +210,119 @@ class SubscriptionView(APIView):
         responses={200: "Subscription added.", 400: 'Bad Request', 404: 'Course not found'},
         request_body=SubscriptionSerializer
     )
+    @idempotent
     def post(self, request, *args, **kwargs):
         user = request.user
         course_id = request.data.get('course_id')  # Получаем ID курса
         if not course_id:
             return Response({"message": "Course ID is required."}, status=status.HTTP_400_BAD_REQUEST)
 
-        course = Course.objects.filter(id=course_id).first()
-        if not course:
-            return Response({"message": "Course not found."}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            course_id = int(course_id)
+        except (TypeError, ValueError):
+            return Response({"message": "Course ID must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Проверка, есть ли уже подписка
-        subscription, created = Subscription.objects.get_or_create(user=user, course=course)
-        if created:
+        # Не больше четырех запросов: блокировка курса (она же проверка существования), удаление,
+        # счетчик курса, вставка. Курс блокируется первым, как и в массовой подписке, — иначе взаимоблокировка
+        try:
+            with transaction.atomic():
+                if not lock_courses([course_id]):
+                    return Response({"message": "Course not found."}, status=status.HTTP_404_NOT_FOUND)
+                deleted, _ = Subscription.objects.filter(user=user, course_id=course_id).delete()
+                if deleted:
+                    adjust_course_counters([course_id], subscribers_count=-deleted)
+                    message = 'Subscription removed.'
+                else:
+                    adjust_course_counters([course_id], subscribers_count=1)
+                    Subscription.objects.bulk_create([Subscription(user=user, course_id=course_id)])
+                    message = 'Subscription added.'
+        except IntegrityError:
+            # Параллельный запрос уже подписал пользователя: транзакция со счетчиком откатилась
             message = 'Subscription added.'
-        else:
-            # Если подписка существует, удаляем ее
-            subscription.delete()
-            message = 'Subscription removed.'
+        bump_generations(COURSES)
 
         return Response({"message": message}, status=status.HTTP_200_OK)
 
     def delete(self, request, *args, **kwargs):
         course_id = request.data.get("course_id")
-        subscription = Subscription.objects.filter(user=request.user, course_id=course_id).first()
-        if subscription:
-            subscription.delete()
+        with transaction.atomic():
+            lock_courses([course_id])
+            deleted, _ = Subscription.objects.filter(user=request.user, course_id=course_id).delete()
+            adjust_course_counters([course_id], subscribers_count=-deleted)
+        if deleted:
+            bump_generations(COURSES)
             return Response({"message": "Subscription removed."}, status=204)
         return Response({"error": "Subscription not found."}, status=404)
 
 
+class BulkSubscriptionView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Подписка или отписка от нескольких курсов одним запросом.",
+        responses={200: "Subscriptions updated.", 400: 'Bad Request'},
+        request_body=BulkSubscriptionSerializer
+    )
+    def post(self, request, *args, **kwargs):
+        serializer = BulkSubscriptionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        course_ids = list(dict.fromkeys(serializer.validated_data['course_ids']))
+        subscribed = serializer.validated_data['subscribed']
+
+        with transaction.atomic():
+            # Параллельные подписки на те же курсы ждут друг друга, поэтому подписки, прочитанные
+            # под блокировкой, точно показывают, какие строки изменятся
+            locked = lock_courses(course_ids)
+            missing = [course_id for course_id in course_ids if course_id not in locked]
+            if missing:
+                return Response({"message": "Courses not found.", "course_ids": missing},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+            existing = set(Subscription.objects.filter(user=request.user, course_id__in=course_ids)
+                           .values_list('course_id', flat=True))
+            changed = [course_id for course_id in course_ids if (course_id in existing) != subscribed]
+            if subscribed:
+                Subscription.objects.bulk_create(
+                    [Subscription(user=request.user, course_id=course_id) for course_id in changed]
+                )
+                adjust_course_counters(changed, subscribers_count=1)
+            else:
+                Subscription.objects.filter(user=request.user, course_id__in=changed).delete()
+                adjust_course_counters(changed, subscribers_count=-1)
+        bump_generations(COURSES)
+
+        return Response({"message": "Subscriptions updated.", "course_ids": course_ids, "subscribed": subscribed},
+                        status=status.HTTP_200_OK)
+
+
+class CacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    @swagger_auto_schema(operation_description="Статистика попаданий в кэш ответов списков.")
+    def get(self, request):
+        return Response(get_cache_stats())
+
+
+class StripeStatusView(APIView):
+    permission_classes = [IsAdminUser]
+
+    @swagger_auto_schema(operation_description="Состояние размыкателя цепи и задержки вызовов Stripe.")
+    def get(self, request):
+        return Response(stripe_client.get_stats())
+
+
 class PaymentCreateView(APIView):
+    def is_async(self, request):
+        """
+        Асинхронный режим: заголовок "Prefer: respond-async", параметр ?async=1 или настройка CHECKOUT_ASYNC.
+        """
+        if 'respond-async' in request.headers.get('Prefer', ''):
+            return True
+        if request.query_params.get('async') in ('1', 'true'):
+            return True
+        return settings.CHECKOUT_ASYNC
+
+    @idempotent
     def post(self, request):
         product_name = request.data.get("product_name")
         product_price = request.data.get("product_price")
@@ -170,26 +330,69 @@ class PaymentCreateView(APIView):
         if not product_name or not product_price:
             return Response({"error": "Product name and price are required."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Создаем продукт и цену в Stripe
-        try:
-            stripe_product_id = create_stripe_product(product_name)
-            stripe_price_id = create_stripe_price(stripe_product_id, int(product_price) * 100)
-            stripe_session_url = create_stripe_session(stripe_price_id)
-
-            # Сохраняем данные в БД
-            payment = Payment.objects.create(
-                product_name=product_name,
-                product_price=int(product_price) * 100,
-                stripe_product_id=stripe_product_id,
-                stripe_price_id=stripe_price_id,
-                stripe_session_url=stripe_session_url,
+        if self.is_async(request):
+            try:
+                price = int(product_price) * 100
+            except (TypeError, ValueError):
+                return Response({"error": "Product price must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+            # Сохраняем платеж и задачу для воркера в одной транзакции, Stripe вызывается вне запроса
+            with transaction.atomic():
+                payment = Payment.objects.create(product_name=product_name, product_price=price, user=request.user)
+                enqueue_checkout(payment)
+
+            status_url = request.build_absolute_uri(reverse('payment-status', args=[payment.pk]))
+            return Response(
+                {"payment_id": payment.pk, "status": payment.status, "status_url": status_url},
+                status=status.HTTP_202_ACCEPTED,
+                headers={"Location": status_url},
             )
 
-            return Response({"payment_url": stripe_session_url}, status=status.HTTP_201_CREATED)
+        # Создаем продукт, цену и сессию в Stripe
+        try:
+            payment = Payment(product_name=product_name, product_price=int(product_price) * 100, user=request.user)
+            run_checkout(payment)
+
+            return Response({"payment_url": payment.stripe_session_url}, status=status.HTTP_201_CREATED)
 
+        except StripeUnavailable:
+            raise  # 503 с заголовком Retry-After
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+
+class PaymentStatusView(APIView):
+    poll_interval = 0.5
+    retry_after = 1  # Пока платеж ожидает, клиент повторяет запрос через столько секунд
+
+    @swagger_auto_schema(
+        operation_description="Статус асинхронного создания оплаты. ?wait=N — ждать завершения "
+                              "до N секунд (не больше CHECKOUT_STATUS_MAX_WAIT); пока платеж ожидает, "
+                              "ответ содержит заголовок Retry-After.",
+    )
+    def get(self, request, pk):
+        queryset = Payment.objects.all()
+        if not request.user.is_staff:
+            queryset = queryset.filter(user=request.user)
+        payment = get_object_or_404(queryset, pk=pk)
+
+        try:
+            wait = min(float(request.query_params.get('wait', 0)), settings.CHECKOUT_STATUS_MAX_WAIT)
+        except ValueError:
+            wait = 0
+        deadline = time.monotonic() + wait
+        while payment.status == Payment.STATUS_PENDING and time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            payment.refresh_from_db(fields=['status', 'stripe_session_url', 'error'])
+
+        headers = {"Retry-After": str(self.retry_after)} if payment.status == Payment.STATUS_PENDING else None
+        return Response({
+            "payment_id": payment.pk,
+            "status": payment.status,
+            "payment_url": payment.stripe_session_url,
+            "error": payment.error or None,
+        }, headers=headers)
+
     # Представление для успешной оплаты
 
 
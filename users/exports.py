@@ -0,0 +1,58 @@
+import csv
+import io
+import json
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+EXPORT_FIELDS = ('id', 'date', 'user_id', 'course_id', 'lesson_id', 'amount', 'payment_method')
+
+
+def iter_payment_rows(queryset, chunk_size=2000):
+    """
+    Строки платежей кортежами, без создания моделей. На PostgreSQL iterator() читает
+    серверным курсором по chunk_size строк, поэтому память не зависит от объема выгрузки.
+    """
+    return queryset.order_by('id').values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+
+
+def _format_value(value):
+    if value is None or isinstance(value, (int, str)):
+        return value
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)  # Decimal — строкой, без потери точности
+
+
+def _iter_csv(rows, buffer, writer, flush_every):
+    writer.writerow(EXPORT_FIELDS)
+    for index, row in enumerate(rows, 1):
+        writer.writerow(['' if value is None else _format_value(value) for value in row])
+        if index % flush_every == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _iter_ndjson(rows, buffer, flush_every):
+    for index, row in enumerate(rows, 1):
+        buffer.write(json.dumps(dict(zip(EXPORT_FIELDS, map(_format_value, row))), ensure_ascii=False))
+        buffer.write('\n')
+        if index % flush_every == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_payments(queryset, export_format, chunk_size=2000):
+    """
+    Генератор текстовых фрагментов выгрузки (по chunk_size строк) в формате csv или ndjson.
+    """
+    rows = iter_payment_rows(queryset, chunk_size)
+    buffer = io.StringIO()
+    if export_format == 'csv':
+        return _iter_csv(rows, buffer, csv.writer(buffer), chunk_size)
+    return _iter_ndjson(rows, buffer, chunk_size)
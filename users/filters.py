@@ -0,0 +1,26 @@
+from django_filters import rest_framework as filters
+
+from .models import Payment, PaymentRollup
+
+
+class PaymentFilter(filters.FilterSet):
+    """
+    Фильтры платежей: курс, урок, способ оплаты и диапазон дат (?date_after=...&date_before=...).
+    Диапазон сравнивается с самим столбцом date, поэтому использует индекс.
+    """
+    date = filters.IsoDateTimeFromToRangeFilter()
+
+    class Meta:
+        model = Payment
+        fields = ['course', 'lesson', 'payment_method', 'date']
+
+
+class PaymentRollupFilter(filters.FilterSet):
+    """
+    Те же фильтры для сводки выручки; диапазон дат задается днями (?date_after=2024-01-01).
+    """
+    date = filters.DateFromToRangeFilter(field_name='day')
+
+    class Meta:
+        model = PaymentRollup
+        fields = ['course', 'lesson', 'payment_method', 'date']
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from users.exports import EXPORT_FORMATS, stream_payments
+from users.filters import PaymentFilter
+from users.models import Payment
+
+
+class Command(BaseCommand):
+    help = "Выгружает платежи в CSV или NDJSON потоково (память не зависит от объема)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='csv', dest='export_format')
+        parser.add_argument('--output', help="Файл для записи (по умолчанию stdout)")
+        parser.add_argument('--course', type=int)
+        parser.add_argument('--lesson', type=int)
+        parser.add_argument('--payment-method', choices=[key for key, _ in Payment.PAYMENT_METHODS])
+        parser.add_argument('--date-after', help="Начало диапазона дат (ISO 8601)")
+        parser.add_argument('--date-before', help="Конец диапазона дат (ISO 8601)")
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        params = {
+            key: options[option] for key, option in (
+                ('course', 'course'), ('lesson', 'lesson'), ('payment_method', 'payment_method'),
+                ('date_after', 'date_after'), ('date_before', 'date_before'),
+            ) if options[option] is not None
+        }
+        filterset = PaymentFilter(params, queryset=Payment.objects.all())
+        if not filterset.is_valid():
+            raise CommandError(filterset.errors.as_text())
+
+        chunks = stream_payments(filterset.qs, options['export_format'], options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from users.rollups import refresh_rollups
+
+
+class Command(BaseCommand):
+    help = "Обновляет сводку выручки по дням, затронутым с прошлого запуска"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Перестроить сводку целиком")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        days = refresh_rollups(full=options['full'], batch_size=options['batch_size'])
+        if days is None:
+            self.stdout.write(self.style.SUCCESS("Сводка выручки перестроена целиком"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Пересчитано дней: {days}"))
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.models import CustomUser
+from users.seeding import seed_scale
+
+
+class Command(BaseCommand):
+    help = "Генерирует детерминированный набор данных заданного объема (пользователи, курсы, уроки, подписки, платежи)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--courses', type=int, default=200)
+        parser.add_argument('--lessons-per-course', type=int, default=8, help="Среднее число уроков в курсе")
+        parser.add_argument('--subscriptions', type=int, default=5000)
+        parser.add_argument('--payments', type=int, default=20000)
+        parser.add_argument('--seed', type=int, default=42, help="Зерно генератора случайных чисел")
+        parser.add_argument('--skew', type=float, default=1.1, help="Показатель распределения Ципфа")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--prefix', default='seed', help="Префикс email сгенерированных пользователей")
+        parser.add_argument('--password', default='password', help="Пароль сгенерированных пользователей")
+        parser.add_argument('--no-copy', action='store_true', help="Не использовать COPY на PostgreSQL")
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError("Нужен хотя бы один пользователь.")
+        if CustomUser.objects.filter(email__startswith=f"{options['prefix']}-").exists():
+            raise CommandError(f"Пользователи с префиксом {options['prefix']!r} уже есть, укажите другой --prefix.")
+
+        # Учетные записи для ручной проверки (раньше их создавала команда seed_users)
+        if not CustomUser.objects.filter(email='testuser@example.com').exists():
+            CustomUser.objects.create_user(email='testuser@example.com', password='testpassword',
+                                           phone='+1234567890', city='New York')
+        if not CustomUser.objects.filter(email='admin@example.com').exists():
+            CustomUser.objects.create_superuser(email='admin@example.com', password='admin')
+
+        started = time.monotonic()
+        counts = seed_scale(
+            users=options['users'], courses=options['courses'], lessons_per_course=options['lessons_per_course'],
+            subscriptions=options['subscriptions'], payments=options['payments'], seed=options['seed'],
+            batch_size=options['batch_size'], use_copy=not options['no_copy'], prefix=options['prefix'],
+            password=options['password'], skew=options['skew'],
+        )
+        for label, count in counts.items():
+            self.stdout.write(f"{label}: {count}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Создано строк: {sum(counts.values())} за {time.monotonic() - started:.1f} с. "
+            f"Сводку выручки обновит refresh_payment_rollups."
+        ))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lms', '0008_course_lms_course_owner_id_idx_and_more'),
+        ('users', '0002_payment'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['user', 'id'], name='users_payment_user_id_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lms', '0013_course_lessons_count_course_subscribers_count'),
+        ('users', '0003_payment_users_payment_user_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['date'], name='users_payment_date_idx'),
+        ),
+    ]
@@ -0,0 +1,14 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:52
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Схему не меняет: таблица перестраивается только командой partition_payments --convert,
+    # миграция оставлена, чтобы нумерация и уже примененные истории не изменились
+
+    dependencies = [
+        ('users', '0005_payment_rollups'),
+    ]
+
+    operations = []
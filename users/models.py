@@ -3,6 +3,7 @@ from django.db import models
 from django.conf import settings
 
 from lms.models import Course, Lesson
+from .roles import is_moderator
 
 
 class CustomUserManager(BaseUserManager):
@@ -26,6 +27,7 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     phone = models.CharField(max_length=15, blank=True)
     city = models.CharField(max_length=100, blank=True)
     avatar = models.ImageField(upload_to='avatars/', blank=True)
+    avatar_variants = models.JSONField(blank=True, null=True, editable=False)  # Уменьшенные копии (lms/images.py)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
 
@@ -39,7 +41,7 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
 
     @property
     def is_moderator(self) -> bool:
-        return self.groups.filter(name='Модераторы').exists()  # Проверяет, в группе ли "Модераторы"
+        return is_moderator(self)  # Проверяет, в группе ли "Модераторы" (группы запоминаются на объекте)
 
 
 class Payment(models.Model):
@@ -55,5 +57,51 @@ class Payment(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     payment_method = models.CharField(max_length=10, choices=PAYMENT_METHODS)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id'], name='users_payment_user_id_idx'),  # Ключ keyset-пагинации
+            models.Index(fields=['date'], name='users_payment_date_idx'),  # Фильтр по диапазону дат
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем дату на момент загрузки, чтобы при ее изменении пересчитать и старый день в сводке
+        instance._loaded_date = instance.__dict__.get('date')
+        return instance
+
     def __str__(self):
         return f"{self.user.email} - {self.amount} ({self.get_payment_method_display()})"
+
+
+class PaymentRollup(models.Model):
+    """
+    Сводка выручки по дням, курсам, урокам и способам оплаты. Поддерживается в users/rollups.py.
+    """
+    day = models.DateField()
+    # SET_NULL, как у самого платежа: при удалении курса или урока сводка остается согласованной
+    course = models.ForeignKey(Course, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    lesson = models.ForeignKey(Lesson, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    payment_method = models.CharField(max_length=10, choices=Payment.PAYMENT_METHODS)
+    amount = models.DecimalField(max_digits=14, decimal_places=2)
+    payments_count = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['day'], name='users_rollup_day_idx'),
+        ]
+
+
+class PaymentRollupState(models.Model):
+    """
+    Водяной знак сводки: id последнего учтенного платежа (одна строка).
+    """
+    last_payment_id = models.BigIntegerField(default=0)
+    refreshed_at = models.DateTimeField(null=True, blank=True)
+
+
+class PaymentRollupDirtyDay(models.Model):
+    """
+    Дни, в которых платежи изменились или удалены после попадания в сводку.
+    """
+    day = models.DateField(unique=True)
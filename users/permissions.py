@@ -1,6 +1,7 @@
 from rest_framework.permissions import BasePermission
 
 from users.models import CustomUser
+from users.roles import is_moderator
 
 
 class IsOwner(BasePermission):
@@ -11,9 +12,9 @@ class IsOwner(BasePermission):
     def has_object_permission(self, request, view, obj):
         # Проверяем, если объект — пользователь
         if isinstance(obj, CustomUser):
-            return obj == request.user  # Сравнение объекта пользователя напрямую
-        # Проверяем, есть ли у объекта атрибут owner и сравниваем с текущим пользователем
-        return hasattr(obj, 'owner') and obj.owner == request.user
+            return obj.pk == request.user.pk  # Сравнение объекта пользователя напрямую
+        # Сравниваем id владельца: без загрузки самого владельца из БД
+        return hasattr(obj, 'owner_id') and obj.owner_id == request.user.pk
 
 
 class IsModerator(BasePermission):
@@ -22,6 +23,18 @@ class IsModerator(BasePermission):
     """
 
     def has_permission(self, request, view):
-        return request.user.groups.filter(name='Модераторы').exists()
+        return is_moderator(request.user)
 
 
+def can_view_avatar(user, path):
+    """
+    Аватар (и его уменьшенные копии) видят владелец, модераторы и сотрудники (MEDIA_ACCESS_CHECKS).
+    """
+    if user.is_staff or is_moderator(user):
+        return True
+    variants = user.avatar_variants or {}
+    own = {user.avatar.name} if user.avatar else set()
+    if variants.get('source') == user.avatar.name:
+        own.update(image[format_name] for image in variants.get('images', []) for format_name in image
+                   if format_name not in ('width', 'height'))
+    return path in own
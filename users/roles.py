@@ -0,0 +1,51 @@
+from django.contrib.auth.models import Group
+
+MODERATORS_GROUP = 'Модераторы'
+
+# Кэш на уровне процесса: id группы модераторов меняется крайне редко
+_moderator_group_id_cache = {}
+
+
+def get_moderator_group_id():
+    """
+    Возвращает id группы "Модераторы" (или None, если группы нет).
+    Значение кэшируется на уровне процесса и сбрасывается сигналами при изменении групп.
+    """
+    if MODERATORS_GROUP not in _moderator_group_id_cache:
+        _moderator_group_id_cache[MODERATORS_GROUP] = (
+            Group.objects.filter(name=MODERATORS_GROUP).values_list('id', flat=True).first()
+        )
+    return _moderator_group_id_cache[MODERATORS_GROUP]
+
+
+def reset_moderator_group_cache():
+    _moderator_group_id_cache.clear()
+
+
+def get_user_group_ids(user) -> frozenset:
+    """
+    Загружает id групп пользователя одним запросом и запоминает результат на объекте пользователя.
+    Объект request.user живёт один запрос, поэтому группы читаются не чаще раза за запрос.
+    """
+    if not user or not user.is_authenticated:
+        return frozenset()
+    group_ids = getattr(user, '_group_ids_cache', None)
+    if group_ids is None:
+        group_ids = frozenset(user.groups.values_list('id', flat=True))
+        user._group_ids_cache = group_ids
+    return group_ids
+
+
+def reset_user_groups_cache(user):
+    user.__dict__.pop('_group_ids_cache', None)
+
+
+def is_moderator(user) -> bool:
+    """
+    Проверяет, состоит ли пользователь в группе "Модераторы".
+    """
+    group_ids = get_user_group_ids(user)
+    if not group_ids:
+        return False
+    moderator_group_id = get_moderator_group_id()
+    return moderator_group_id is not None and moderator_group_id in group_ids
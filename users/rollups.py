@@ -0,0 +1,92 @@
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Payment, PaymentRollup, PaymentRollupDirtyDay, PaymentRollupState
+
+ROLLUP_DIMENSIONS = ('day', 'course_id', 'lesson_id', 'payment_method')
+
+
+def payment_day(value):
+    """
+    День платежа в текущем часовом поясе — так же, как его считает TruncDate в БД.
+    """
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    return value.date()
+
+
+def mark_days_dirty(days):
+    days = {day for day in days if day is not None}
+    if days:
+        PaymentRollupDirtyDay.objects.bulk_create(
+            [PaymentRollupDirtyDay(day=day) for day in days], ignore_conflicts=True
+        )
+
+
+def days_filter(days):
+    """
+    Условие по столбцу date для набора дней: соседние дни склеиваются в диапазоны,
+    чтобы запрос шел по индексу users_payment_date_idx.
+    """
+    condition = Q()
+    ranges = []
+    for day in sorted(days):
+        if ranges and ranges[-1][1] + timedelta(days=1) == day:
+            ranges[-1][1] = day
+        else:
+            ranges.append([day, day])
+    tz = timezone.get_current_timezone()
+    for first, last in ranges:
+        start = timezone.make_aware(datetime.combine(first, time.min), tz)
+        end = timezone.make_aware(datetime.combine(last + timedelta(days=1), time.min), tz)
+        condition |= Q(date__gte=start, date__lt=end)
+    return condition
+
+
+def aggregate_payments(queryset):
+    rows = queryset.annotate(day=TruncDate('date')).values(*ROLLUP_DIMENSIONS).annotate(
+        total=Sum('amount'), total_count=Count('id'),
+    ).order_by()
+    for row in rows:
+        yield PaymentRollup(
+            day=row['day'], course_id=row['course_id'], lesson_id=row['lesson_id'],
+            payment_method=row['payment_method'], amount=row['total'], payments_count=row['total_count'],
+        )
+
+
+def refresh_rollups(full=False, batch_size=1000):
+    """
+    Обновляет сводку выручки. Пересчитываются только дни с новыми платежами (id выше водяного
+    знака) и дни, помеченные сигналами (users/signals.py); full=True перестраивает сводку целиком.
+    Возвращает количество пересчитанных дней (None при полной перестройке).
+    """
+    with transaction.atomic():
+        state, _ = PaymentRollupState.objects.select_for_update().get_or_create(pk=1)
+        max_id = Payment.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+        dirty = list(PaymentRollupDirtyDay.objects.values_list('day', flat=True))
+
+        if full:
+            days = None
+            PaymentRollup.objects.all().delete()
+            payments = Payment.objects.filter(id__lte=max_id)
+        else:
+            new_days = Payment.objects.filter(id__gt=state.last_payment_id, id__lte=max_id).annotate(
+                day=TruncDate('date')
+            ).values_list('day', flat=True).distinct().order_by()
+            days = set(new_days) | set(dirty)
+            if days:
+                PaymentRollup.objects.filter(day__in=days).delete()
+                payments = Payment.objects.filter(days_filter(days))
+            else:
+                payments = Payment.objects.none()
+
+        PaymentRollup.objects.bulk_create(aggregate_payments(payments), batch_size=batch_size)
+        PaymentRollupDirtyDay.objects.filter(day__in=dirty).delete()
+        state.last_payment_id = max_id
+        state.refreshed_at = timezone.now()
+        state.save()
+    return None if days is None else len(days)
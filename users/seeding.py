@@ -0,0 +1,197 @@
+"""
+Генератор детерминированных данных большого объема (команда seed_scale).
+
+Все значения выводятся из random.Random(seed), поэтому одинаковые параметры дают одинаковые данные.
+Популярность курсов и активность владельцев распределены по Ципфу: несколько "горячих" курсов
+собирают большую часть подписок и платежей, у большинства владельцев по одному курсу.
+Строки пишутся пачками через executemany, на PostgreSQL — через COPY. Идентификаторы назначаются
+заранее, поэтому связи строятся без чтения вставленных строк, а счетчики курсов считаются на лету.
+"""
+import io
+import random
+from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate, islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, models, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from lms.cache import COURSES, LESSONS, bump_generations
+from lms.models import Course, Lesson, Subscription
+from .models import CustomUser, Payment
+
+CITIES = ['Москва', 'Санкт-Петербург', 'Казань', 'Новосибирск', 'Екатеринбург', 'Самара', 'Омск', 'Пермь']
+PRICES = [Decimal(price) for price in ('490.00', '990.00', '1490.00', '2990.00', '4990.00', '9990.00')]
+
+
+def zipf_cum_weights(size, exponent):
+    return list(accumulate(1 / (rank + 1) ** exponent for rank in range(size)))
+
+
+def batched(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+
+
+class RowWriter:
+    """
+    Пишет кортежи значений в таблицу модели пачками: COPY на PostgreSQL, иначе executemany.
+    Экземпляры моделей не создаются: на миллионе строк bulk_create тратит большую часть времени
+    на их создание и подготовку значений полей.
+    """
+
+    def __init__(self, batch_size=5000, use_copy=True):
+        self.batch_size = batch_size
+        self.use_copy = use_copy and connection.vendor == 'postgresql'
+        self.counts = {}
+
+    def write(self, model, columns, rows):
+        written = 0
+        for batch in batched(rows, self.batch_size):
+            if self.use_copy:
+                self.copy(model, columns, batch)
+            else:
+                self.insert(model, columns, batch)
+            written += len(batch)
+        self.counts[model._meta.label] = self.counts.get(model._meta.label, 0) + written
+        return written
+
+    def insert(self, model, columns, batch):
+        fields = [model._meta.get_field(name) for name in columns]
+        # Значения простых типов передаются драйверу как есть, остальные готовит само поле
+        prepare = [
+            None if isinstance(field, (models.IntegerField, models.ForeignKey, models.CharField, models.BooleanField))
+            else field for field in fields
+        ]
+        if any(prepare):
+            batch = [
+                tuple(value if field is None else field.get_db_prep_save(value, connection)
+                      for field, value in zip(prepare, row))
+                for row in batch
+            ]
+        table = connection.ops.quote_name(model._meta.db_table)
+        column_list = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+        placeholders = ', '.join(['%s'] * len(fields))
+        with connection.cursor() as cursor:
+            cursor.executemany(f'INSERT INTO {table} ({column_list}) VALUES ({placeholders})', batch)
+
+    def copy(self, model, columns, batch):
+        buffer = io.StringIO()
+        for row in batch:
+            buffer.write('\t'.join(map(copy_value, row)))
+            buffer.write('\n')
+        buffer.seek(0)
+        table = connection.ops.quote_name(model._meta.db_table)
+        column_list = ', '.join(connection.ops.quote_name(model._meta.get_field(name).column) for name in columns)
+        sql = f'COPY {table} ({column_list}) FROM STDIN'
+        with connection.cursor() as cursor:
+            if hasattr(cursor.cursor, 'copy_expert'):  # psycopg2
+                cursor.cursor.copy_expert(sql, buffer)
+            else:  # psycopg 3
+                with cursor.cursor.copy(sql) as copy:
+                    copy.write(buffer.getvalue())
+
+
+def next_id(model):
+    return (model.objects.aggregate(max_id=Max('pk'))['max_id'] or 0) + 1
+
+
+def seed_scale(users=1000, courses=200, lessons_per_course=8, subscriptions=5000, payments=20000,
+               seed=42, batch_size=5000, use_copy=True, prefix='seed', password='password', skew=1.1):
+    """
+    Генерирует пользователей, курсы, уроки, подписки и платежи. Возвращает {модель: количество строк}.
+    """
+    rng = random.Random(seed)
+    now = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    writer = RowWriter(batch_size, use_copy)
+    password_hash = make_password(password)  # Один хэш на всех: хэширование — самая дорогая часть создания пользователя
+
+    with transaction.atomic():
+        user_base, course_base, lesson_base = next_id(CustomUser), next_id(Course), next_id(Lesson)
+        subscription_base, payment_base = next_id(Subscription), next_id(Payment)
+        user_ids = range(user_base, user_base + users)
+
+        writer.write(CustomUser, ['id', 'email', 'password', 'phone', 'city', 'avatar', 'is_active', 'is_staff',
+                                  'is_superuser'], (
+            (user_id, f'{prefix}-{user_id}@example.com', password_hash, f'+7{user_id:010d}',
+             rng.choice(CITIES), '', True, False, False)
+            for user_id in user_ids
+        ))
+
+        # Владельцы курсов: длинный хвост по Ципфу среди пользователей
+        owner_weights = zipf_cum_weights(users, skew)
+        owners = rng.choices(user_ids, cum_weights=owner_weights, k=courses)
+        course_ids = range(course_base, course_base + courses)
+        lesson_counts = [rng.randint(1, max(1, 2 * lessons_per_course - 1)) for _ in course_ids]
+
+        # Подписки: популярность курсов по Ципфу, пары (пользователь, курс) уникальны
+        course_weights = zipf_cum_weights(courses, skew)
+        pairs = set()
+        attempts = 0
+        while course_ids and len(pairs) < subscriptions and attempts < subscriptions * 3:
+            pairs.add((rng.choice(user_ids), rng.choices(course_ids, cum_weights=course_weights)[0]))
+            attempts += 1
+        subscriber_counts = dict.fromkeys(course_ids, 0)
+        for _, course_id in pairs:
+            subscriber_counts[course_id] += 1
+
+        writer.write(Course, ['id', 'title', 'description', 'owner_id', 'updated_at', 'lessons_count',
+                              'subscribers_count'], (
+            (course_id, f'Курс {course_id}', f'Описание курса {course_id}', owner, now,
+             lesson_count, subscriber_counts[course_id])
+            for course_id, owner, lesson_count in zip(course_ids, owners, lesson_counts)
+        ))
+
+        lesson_courses = [
+            (course_id, owner) for course_id, owner, lesson_count in zip(course_ids, owners, lesson_counts)
+            for _ in range(lesson_count)
+        ]
+        lesson_ids = range(lesson_base, lesson_base + len(lesson_courses))
+        writer.write(Lesson, ['id', 'course_id', 'title', 'description', 'video_url', 'owner_id', 'updated_at'], (
+            (lesson_id, course_id, f'Урок {lesson_id}', f'Описание урока {lesson_id}',
+             f'https://www.youtube.com/watch?v={lesson_id}', owner, now)
+            for lesson_id, (course_id, owner) in zip(lesson_ids, lesson_courses)
+        ))
+
+        writer.write(Subscription, ['id', 'user_id', 'course_id'], (
+            (subscription_base + index, user_id, course_id) for index, (user_id, course_id) in enumerate(sorted(pairs))
+        ))
+
+        # Платежи за год: за курс (горячие курсы чаще) или за случайный урок
+        def payment_rows():
+            for payment_id in range(payment_base, payment_base + payments):
+                course_id = lesson_id = None
+                if lesson_ids and rng.random() < 0.3:
+                    lesson_id = rng.choice(lesson_ids)
+                else:
+                    course_id = rng.choices(course_ids, cum_weights=course_weights)[0]
+                date = now - timedelta(days=rng.randrange(365), seconds=rng.randrange(86400))
+                yield (payment_id, rng.choice(user_ids), date, course_id, lesson_id, rng.choice(PRICES),
+                       rng.choice(('cash', 'transfer')))
+
+        if course_ids:
+            writer.write(Payment, ['id', 'user_id', 'date', 'course_id', 'lesson_id', 'amount', 'payment_method'],
+                         payment_rows())
+
+        # Идентификаторы вставлены явно — сдвигаем последовательности (на SQLite не требуется)
+        sequence_sql = connection.ops.sequence_reset_sql(no_style(), [CustomUser, Course, Lesson, Subscription,
+                                                                      Payment])
+        with connection.cursor() as cursor:
+            for sql in sequence_sql:
+                cursor.execute(sql)
+        bump_generations(COURSES, LESSONS)
+    return writer.counts
@@ -1,15 +1,26 @@
 from rest_framework import serializers
+
+from config.fieldsets import SparseFieldsetMixin
+from config.metrics import TimedSerializerMixin
+from lms.images import VariantImageField
+from lms.serializers import COURSE_SUMMARY
 from .models import CustomUser, Payment
 
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(TimedSerializerMixin, SparseFieldsetMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        'course': COURSE_SUMMARY,
+        'lesson': ('lms.serializers.LessonSerializer', {'fields': ['id', 'title', 'course', 'video_url']}),
+    }
+
     class Meta:
         model = Payment
         fields = '__all__'
 
 
-class CustomUserSerializer(serializers.ModelSerializer):
+class CustomUserSerializer(TimedSerializerMixin, SparseFieldsetMixin, serializers.ModelSerializer):
     payments = PaymentSerializer(many=True, read_only=True, source='payment_set')
+    avatar = VariantImageField('avatar_variants', required=False)
 
     class Meta:
         model = CustomUser
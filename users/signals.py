@@ -0,0 +1,53 @@
+from django.contrib.auth.models import Group
+from django.db.models import QuerySet
+from django.db.models.functions import TruncDate
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import CustomUser, Payment
+from .roles import reset_moderator_group_cache, reset_user_groups_cache
+from .rollups import mark_days_dirty, payment_day
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, **kwargs):
+    """
+    Сбрасывает кэш id группы модераторов при создании, переименовании или удалении групп.
+    """
+    reset_moderator_group_cache()
+
+
+@receiver(m2m_changed, sender=CustomUser.groups.through)
+def user_groups_changed(sender, instance, **kwargs):
+    """
+    Сбрасывает запомненные группы пользователя при изменении его членства.
+    """
+    if isinstance(instance, CustomUser):
+        reset_user_groups_cache(instance)
+
+
+@receiver(post_save, sender=Payment)
+def payment_saved(sender, instance, created, raw=False, **kwargs):
+    """
+    Помечает для сводки выручки дни платежа: новый день, а для измененного и старый. Новые платежи тоже
+    помечаются: id выдается до коммита, и платеж с id ниже водяного знака прошлого обновления иначе
+    потерялся бы. bulk_create подхватывается по водяному знаку id, массовые update() — командой с --full.
+    """
+    if not raw:
+        loaded_date = None if created else getattr(instance, '_loaded_date', None)
+        mark_days_dirty([payment_day(instance.date), loaded_date and payment_day(loaded_date)])
+    instance._loaded_date = instance.date
+
+
+@receiver(post_delete, sender=Payment)
+def payment_deleted(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, CustomUser) or (isinstance(origin, QuerySet) and issubclass(origin.model, CustomUser)):
+        return  # Дни платежей удаляемого пользователя помечает user_payments_deleted одним запросом
+    mark_days_dirty([payment_day(instance.date)])
+
+
+@receiver(pre_delete, sender=CustomUser)
+def user_payments_deleted(sender, instance, **kwargs):
+    days = Payment.objects.filter(user=instance).annotate(day=TruncDate('date')).values_list('day', flat=True)
+    mark_days_dirty(days.distinct().order_by())
@@ -1,3 +1,375 @@
+import io
+import json
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import Group
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from lms.counters import recount_courses
+from lms.models import Course, Lesson, Subscription
+from lms.tests import QueryBudgetMixin, TempDirectoryMixin, image_upload
+from .models import CustomUser, Payment, PaymentRollup, PaymentRollupState
+from .roles import get_moderator_group_id, is_moderator
+from .rollups import refresh_rollups
+
+
+class RolesTestCase(TestCase):
+    """
+    Тесты для определения ролей пользователя
+    """
+
+    def setUp(self):
+        self.group = Group.objects.create(name="Модераторы")
+        self.moderator = CustomUser.objects.create_user(email="moderator@test.ru", password="password")
+        self.moderator.groups.add(self.group)
+        self.user = CustomUser.objects.create_user(email="user@test.ru", password="password")
+
+    def test_is_moderator(self):
+        self.assertTrue(is_moderator(self.moderator))
+        self.assertFalse(is_moderator(self.user))
+
+    def test_role_checks_are_memoized(self):
+        """
+        Тест: группы пользователя загружаются одним запросом, повторные проверки бесплатны
+        """
+        get_moderator_group_id()
+        moderator = CustomUser.objects.get(pk=self.moderator.pk)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(moderator.is_moderator)
+            self.assertTrue(is_moderator(moderator))
+        self.assertEqual(len(queries), 1)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(moderator.is_moderator)
+        self.assertEqual(len(queries), 0)
+
+    def test_group_membership_change_resets_cache(self):
+        self.assertFalse(self.user.is_moderator)
+        self.user.groups.add(self.group)
+        self.assertTrue(self.user.is_moderator)
+        self.moderator.groups.remove(self.group)
+        self.assertFalse(self.moderator.is_moderator)
+
+    def test_group_rename_resets_cache(self):
+        self.assertTrue(is_moderator(self.moderator))
+        self.group.name = "Редакторы"
+        self.group.save()
+        moderator = CustomUser.objects.get(pk=self.moderator.pk)
+        self.assertFalse(is_moderator(moderator))
+
+
+class PaymentExportTestCase(APITestCase):
+    """
+    Тесты для списка и потоковой выгрузки платежей
+    """
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="finance@test.ru", password="password", is_staff=True)
+        self.course = Course.objects.create(title="Course", owner=self.user, description="Description")
+        for i in range(5):
+            Payment.objects.create(
+                user=self.user, course=self.course if i % 2 else None, amount=Decimal("10.50") * (i + 1),
+                payment_method="cash" if i % 2 else "transfer",
+            )
+        # Два старых платежа для проверки диапазона дат
+        Payment.objects.filter(pk__in=Payment.objects.order_by("id").values("id")[:2]).update(
+            date=timezone.now() - timedelta(days=30)
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_list_is_paginated(self):
+        response = self.client.get(reverse("payment-list"), {"page_size": 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["count"], 5)
+        self.assertEqual(len(response.json()["results"]), 2)
+
+    def test_csv_export(self):
+        response = self.client.get(reverse("payment-export"), {"payment_method": "cash"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "id,date,user_id,course_id,lesson_id,amount,payment_method")
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[1].endswith(",21.00,cash"))
+
+    def test_ndjson_export_with_date_range(self):
+        response = self.client.get(reverse("payment-export"), {
+            "export_format": "ndjson",
+            "date_after": (timezone.now() - timedelta(days=1)).isoformat(),
+        })
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]["amount"], "31.50")
+
+    def test_export_requires_staff_or_moderator(self):
+        user = CustomUser.objects.create_user(email="student@test.ru", password="password")
+        self.client.force_authenticate(user=user)
+        self.assertEqual(self.client.get(reverse("payment-export")).status_code, 403)
+        user.groups.add(Group.objects.create(name="Модераторы"))
+        self.assertEqual(self.client.get(reverse("payment-export")).status_code, 200)
+
+    def test_invalid_export_format(self):
+        self.assertEqual(self.client.get(reverse("payment-export"), {"export_format": "xml"}).status_code, 400)
+
+    def test_export_command(self):
+        output = io.StringIO()
+        call_command("export_payments", format="ndjson", course=self.course.pk, chunk_size=1, stdout=output)
+        self.assertEqual(len(output.getvalue().splitlines()), 2)
+
+
+class PaymentRollupTestCase(APITestCase):
+    """
+    Тесты для сводки выручки: инкрементальное обновление дает те же итоги, что и полный пересчет
+    """
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="finance@test.ru", password="password", is_staff=True)
+        self.courses = [
+            Course.objects.create(title=f"Course {i}", owner=self.user, description="Description") for i in range(3)
+        ]
+        self.now = timezone.now()
+        for i in range(30):
+            self.create_payment(i, days_ago=i % 6)
+        self.client.force_authenticate(user=self.user)
+
+    def create_payment(self, i, days_ago=0):
+        payment = Payment.objects.create(
+            user=self.user, course=self.courses[i % 3], amount=Decimal("7.25") * (i % 5 + 1),
+            payment_method="cash" if i % 2 else "transfer",
+        )
+        Payment.objects.filter(pk=payment.pk).update(date=self.now - timedelta(days=days_ago))
+        return payment
+
+    def recompute(self):
+        """
+        Итоги полным GROUP BY по таблице платежей
+        """
+        rows = Payment.objects.annotate(day=TruncDate("date")).values("day", "course", "payment_method").annotate(
+            total=Sum("amount"), total_count=Count("id"),
+        )
+        return {(str(row["day"]), row["course"], row["payment_method"]): (str(row["total"]), row["total_count"])
+                for row in rows}
+
+    def revenue(self, **params):
+        response = self.client.get(reverse("payment-revenue"), {"group_by": "day,course,payment_method", **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def from_api(self):
+        return {(row["day"], row["course"], row["payment_method"]): (row["amount"], row["count"])
+                for row in self.revenue()["results"]}
+
+    def test_incremental_refresh_matches_full_recompute(self):
+        refresh_rollups()
+        self.assertEqual(self.from_api(), self.recompute())
+
+        # Новый платеж, изменение старого (с переносом на другой день), удаление и удаление курса
+        self.create_payment(100)
+        moved = Payment.objects.order_by("date").first()
+        moved.amount = Decimal("999.99")
+        moved.date = self.now - timedelta(days=1)
+        moved.save()
+        Payment.objects.order_by("id").last().delete()
+        Payment.objects.filter(pk=self.create_payment(101, days_ago=2).pk).first().delete()
+        self.courses[2].delete()
+
+        self.assertEqual(refresh_rollups(), 4)  # Старый и новый день переноса, сегодня и день удаления
+        self.assertEqual(self.from_api(), self.recompute())
+        self.assertEqual(refresh_rollups(), 0)
+
+        incremental = list(PaymentRollup.objects.values_list("day", "course", "lesson", "payment_method", "amount",
+                                                             "payments_count").order_by("day", "course", "amount"))
+        refresh_rollups(full=True)
+        full = list(PaymentRollup.objects.values_list("day", "course", "lesson", "payment_method", "amount",
+                                                      "payments_count").order_by("day", "course", "amount"))
+        self.assertEqual(incremental, full)
+
+    def test_payment_committed_below_watermark(self):
+        refresh_rollups()
+        # id выдан до обновления сводки, а транзакция платежа закоммичена после него
+        payment = self.create_payment(200, days_ago=0)
+        PaymentRollupState.objects.filter(pk=1).update(last_payment_id=payment.pk)
+        refresh_rollups()
+        self.assertEqual(self.from_api(), self.recompute())
+
+    def test_range_query_is_answered_from_rollups(self):
+        refresh_rollups()
+        after = (self.now - timedelta(days=2)).date()
+        data = self.revenue(date_after=after.isoformat(), payment_method="cash")
+        expected = Payment.objects.filter(date__date__gte=after, payment_method="cash").aggregate(
+            total=Sum("amount"), total_count=Count("id"),
+        )
+        self.assertEqual(data["amount"], str(expected["total"]))
+        self.assertEqual(data["count"], expected["total_count"])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.revenue(group_by="course", date_after=after.isoformat())
+        self.assertFalse(any("users_payment\"" in query["sql"] for query in queries.captured_queries))
+
+    def test_invalid_group_by(self):
+        self.assertEqual(self.client.get(reverse("payment-revenue"), {"group_by": "user"}).status_code, 400)
+
+    def test_revenue_requires_staff_or_moderator(self):
+        self.client.force_authenticate(user=CustomUser.objects.create_user(email="student@test.ru", password="password"))
+        self.assertEqual(self.client.get(reverse("payment-revenue")).status_code, 403)
+
+
+class SeedScaleTestCase(TestCase):
+    """
+    Тесты для генератора данных seed_scale
+    """
+    options = {"users": 60, "courses": 12, "lessons_per_course": 3, "subscriptions": 150, "payments": 400,
+               "batch_size": 50}
+
+    def seed(self):
+        call_command("seed_scale", **self.options, stdout=io.StringIO())
+        users = CustomUser.objects.filter(email__startswith="seed-")
+        return {
+            "cities": list(users.order_by("id").values_list("city", flat=True)),
+            "subscribers": list(Course.objects.order_by("id").values_list("subscribers_count", flat=True)),
+            "payments": list(Payment.objects.order_by("id").values_list("amount", "payment_method", "course_id")),
+        }
+
+    def test_generates_requested_volume(self):
+        self.seed()
+        self.assertEqual(CustomUser.objects.filter(email__startswith="seed-").count(), 60)
+        self.assertTrue(CustomUser.objects.filter(email="admin@example.com", is_superuser=True).exists())
+        self.assertEqual(Course.objects.count(), 12)
+        self.assertEqual(Payment.objects.count(), 400)
+        self.assertEqual(Subscription.objects.count(), 150)
+        self.assertEqual(Lesson.objects.count(), sum(Course.objects.values_list("lessons_count", flat=True)))
+        self.assertEqual(recount_courses(Course.objects.values("id")), 0)  # Счетчики записаны согласованными
+
+        user = CustomUser.objects.filter(email__startswith="seed-").first()
+        self.assertTrue(user.check_password("password"))
+        # Перекос: первый курс популярнее медианного
+        subscribers = list(Course.objects.order_by("id").values_list("subscribers_count", flat=True))
+        self.assertGreater(subscribers[0], sorted(subscribers)[len(subscribers) // 2])
+
+        # Новые записи после генерации получают свободные id
+        self.assertEqual(Payment.objects.create(user=user, amount=1, payment_method="cash").pk,
+                         Payment.objects.order_by("-id").values_list("id", flat=True)[1] + 1)
+
+    def test_is_deterministic(self):
+        first = self.seed()
+        CustomUser.objects.filter(email__startswith="seed-").delete()
+        self.assertEqual(self.seed(), first)
+
+
+class SparseFieldsetTestCase(APITestCase):
+    """
+    Тесты для выборочных полей и раскрытия связей у пользователей и платежей
+    """
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="user@test.ru", password="password")
+        self.course = Course.objects.create(title="Course", description="Description", owner=self.user)
+        Payment.objects.create(user=self.user, course=self.course, amount=Decimal("100.00"), payment_method="cash")
+        self.client.force_authenticate(user=self.user)
+
+    def test_user_fields_skip_payments(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse("user-detail", args=[self.user.pk]), {"fields": "id,email"})
+        self.assertEqual(response.json(), {"id": self.user.pk, "email": "user@test.ru"})
+        self.assertFalse(any('"users_payment"' in query["sql"] for query in context.captured_queries))
+
+    def test_nested_expand(self):
+        response = self.client.get(reverse("user-detail", args=[self.user.pk]),
+                                   {"fields": "id,payments.amount", "expand": "payments.course"})
+        payment = response.json()["payments"][0]
+        self.assertEqual(payment["amount"], "100.00")
+        self.assertEqual(payment["course"]["title"], "Course")
+
+    def test_payment_list_expand(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse("payment-list"), {"fields": "id,amount", "expand": "course"})
+        self.assertEqual(response.json()["results"][0]["course"]["id"], self.course.pk)
+        self.assertEqual(set(response.json()["results"][0]), {"id", "amount", "course"})
+        self.assertFalse(any(query["sql"].startswith('SELECT "lms_course"') for query in context.captured_queries))
+
+
+class UserQueryBudgetTestCase(QueryBudgetMixin, APITestCase):
+    """
+    Бюджет SQL-запросов эндпоинтов users/urls.py
+    """
+
+    def test_users(self):
+        owner = self.users["owner"]
+        user_url = reverse("user-detail", args=[owner.pk])
+        self.assertQueryBudget(3, "get", reverse("user-list"))
+        self.assertQueryBudget(4, "post", reverse("user-list"), {"email": "new@test.ru", "password": "password"})
+        # Пользователь из токена и объект из get_object — один и тот же запрос по id
+        self.assertQueryBudget(5, "get", user_url, allow_repeats=1)
+        self.assertQueryBudget(5, "patch", user_url, {"city": "Тверь"}, allow_repeats=1)
+        # Каскад удаляет и обнуляет связи пачками: число запросов не зависит от числа строк
+        self.assertQueryBudget(27, "delete", user_url, allow_repeats=1)
+
+    def test_payments(self):
+        self.assertQueryBudget(3, "get", reverse("payment-list"))
+        self.assertQueryBudget(2, "get", reverse("payment-list"), {"pagination": "cursor", "payment_method": "cash"})
+        self.assertQueryBudget(4, "get", reverse("payment-export"))
+        self.assertQueryBudget(6, "get", reverse("payment-revenue"), {"group_by": "day,course"})
+
+    def test_tokens(self):
+        response = self.client.post(reverse("token_obtain_pair"), {"email": self.users["owner"].email,
+                                                                   "password": "password"})
+        self.assertQueryBudget(1, "post", reverse("token_obtain_pair"),
+                               {"email": self.users["owner"].email, "password": "password"}, roles=["owner"])
+        self.assertQueryBudget(1, "post", reverse("token_refresh"), {"refresh": response.json()["refresh"]},
+                               roles=["owner"])
+
+
+class UserFastPathTestCase(QueryBudgetMixin, APITestCase):
+    """
+    Тесты для вывода списков пользователей и платежей через .values()
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        CustomUser.objects.filter(pk=cls.users["owner"].pk).update(avatar="avatars/owner.png")
+
+    def test_lists_identical_to_serializers(self):
+        self.assertFastPathIdentical(reverse("payment-list"))
+        self.assertFastPathIdentical(reverse("payment-list") + "?ordering=-date&payment_method=cash&page=2")
+        self.assertFastPathIdentical(reverse("payment-list") + f"?pagination=cursor&course={self.course.pk}")
+        self.assertFastPathIdentical(reverse("user-list"), roles=["admin"])
+
+    def test_user_list_payments_in_one_query(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.request_as("admin", "get", reverse("user-list"))
+        self.assertEqual(response.status_code, 200)
+        payment_queries = [query for query in context.captured_queries if 'FROM "users_payment"' in query["sql"]]
+        self.assertEqual(len(payment_queries), 1)
+        owner = next(user for user in response.json() if user["id"] == self.users["owner"].pk)
+        self.assertEqual(len(owner["payments"]), Payment.objects.filter(user=self.users["owner"]).count())
+
+
+class AvatarVariantTestCase(TempDirectoryMixin, APITestCase):
+    """
+    Тесты для уменьшенных копий аватара
+    """
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="avatar@test.ru", password="password")
+        self.client.force_authenticate(user=self.user)
+        self.use_temp_directory("MEDIA_ROOT", IMAGE_VARIANT_WIDTHS=[64, 128])
 
-# Create your tests here.
+    def test_avatar_variants(self):
+        url = reverse("user-detail", args=[self.user.pk])
+        response = self.client.patch(url, {"avatar": image_upload("avatar.png", size=(512, 512))}, format="multipart")
+        self.assertEqual(response.status_code, 200)
+        call_command("run_image_worker", once=True, stdout=io.StringIO())
+        self.user.refresh_from_db()
+        images = self.user.avatar_variants["images"]
+        self.assertEqual([image["width"] for image in images], [64, 128])
+        self.assertTrue(self.client.get(url, {"image_width": 64}).json()["avatar"].endswith(images[0]["webp"]))
@@ -1,14 +1,25 @@
+from django.db.models import Sum
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import generics, filters, viewsets
-from rest_framework.exceptions import PermissionDenied
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import generics, filters, status, viewsets
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from .models import CustomUser, Payment
-from .permissions import IsOwner
+from config.fastpath import FastPathListMixin
+from config.fieldsets import SparseFieldsetViewMixin
+from lms.paginators import PaymentPagination
+from .exports import EXPORT_FORMATS, stream_payments
+from .filters import PaymentFilter, PaymentRollupFilter
+from .models import CustomUser, Payment, PaymentRollup, PaymentRollupState
+from .permissions import IsModerator, IsOwner
 from .serializers import CustomUserSerializer, PaymentSerializer
 
 
-class CustomUserViewSet(viewsets.ModelViewSet):
+class CustomUserViewSet(SparseFieldsetViewMixin, FastPathListMixin, viewsets.ModelViewSet):
     queryset = CustomUser.objects.all()
     serializer_class = CustomUserSerializer
 
@@ -21,25 +32,106 @@ class CustomUserViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         user = self.request.user
-        if user.is_superuser or user.groups.filter(name='Модераторы').exists():
-            return CustomUser.objects.all()
-        # Если пользователь пытается получить доступ к чужому профилю
-        if self.action in ['retrieve', 'update', 'partial_update', 'destroy']:
-            if not CustomUser.objects.filter(id=user.id).exists():
-                raise PermissionDenied("You do not have permission to access this resource.")
-        return CustomUser.objects.filter(id=user.id)
+        # Платежи входят в ответ сериализатора: загружаем их одним запросом на страницу
+        queryset = CustomUser.objects.all()
+        if self.has_sparse_selection():
+            # Только выбранные поля; платежи загружаются, только если остались в ответе
+            queryset = self.optimize_queryset(queryset)
+        elif self.action in ('list', 'retrieve'):  # После изменения DRF все равно перечитывает связи
+            queryset = queryset.prefetch_related('payment_set')
+        if user.is_superuser or user.is_moderator:
+            return queryset
+        # Чужой профиль не найдется: обычный пользователь видит только себя
+        return queryset.filter(id=user.id)
 
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
         # Проверка: пользователь может удалить только свой профиль
         if instance != request.user:
             raise PermissionDenied("You do not have permission to delete this profile.")
-        return super().destroy(request, *args, **kwargs)
+        self.perform_destroy(instance)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class PaymentListView(generics.ListAPIView):
+class PaymentListView(SparseFieldsetViewMixin, FastPathListMixin, generics.ListAPIView):
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
+    pagination_class = PaymentPagination
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
-    filterset_fields = ['course', 'lesson', 'payment_method']
+    filterset_class = PaymentFilter
     ordering_fields = ['date']
+    ordering = ['-date', '-id']  # Стабильный порядок страниц: id различает платежи с одинаковой датой
+    sparse_required_fields = ('user', 'date')  # Ключ keyset-пагинации и сортировка
+
+    def get_queryset(self):
+        if self.has_sparse_selection():
+            return self.optimize_queryset(Payment.objects.all())
+        return Payment.objects.all()
+
+
+class PaymentExportView(APIView):
+    """
+    Потоковая выгрузка платежей в CSV или NDJSON (?export_format=csv|ndjson)
+    с теми же фильтрами, что и у списка платежей. Выгрузка по всем пользователям — только для
+    администраторов и модераторов.
+    """
+    permission_classes = [IsAdminUser | IsModerator]
+    chunk_size = 2000
+
+    @swagger_auto_schema(operation_description="Потоковая выгрузка платежей (CSV / NDJSON).")
+    def get(self, request):
+        export_format = request.query_params.get('export_format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            raise ValidationError({'export_format': f"Допустимые значения: {', '.join(EXPORT_FORMATS)}."})
+        filterset = PaymentFilter(request.query_params, queryset=Payment.objects.all(), request=request)
+        if not filterset.is_valid():
+            raise ValidationError(filterset.errors)
+
+        response = StreamingHttpResponse(
+            stream_payments(filterset.qs, export_format, self.chunk_size),
+            content_type=EXPORT_FORMATS[export_format],
+        )
+        filename = f"payments-{timezone.now():%Y%m%d-%H%M%S}.{export_format}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class PaymentRevenueView(APIView):
+    """
+    Выручка из сводки users.PaymentRollup (обновляется командой refresh_payment_rollups)
+    с группировкой ?group_by=day,course,lesson,payment_method и фильтрами списка платежей.
+    Выручка всей платформы — только для администраторов и модераторов.
+    """
+    permission_classes = [IsAdminUser | IsModerator]
+    group_by_fields = {'day': 'day', 'course': 'course_id', 'lesson': 'lesson_id', 'payment_method': 'payment_method'}
+
+    @swagger_auto_schema(operation_description="Выручка по дням, курсам, урокам и способам оплаты.")
+    def get(self, request):
+        group_by = [name for name in request.query_params.get('group_by', 'day').split(',') if name]
+        unknown = set(group_by) - set(self.group_by_fields)
+        if unknown:
+            raise ValidationError({'group_by': f"Допустимые значения: {', '.join(self.group_by_fields)}."})
+        filterset = PaymentRollupFilter(request.query_params, queryset=PaymentRollup.objects.all(), request=request)
+        if not filterset.is_valid():
+            raise ValidationError(filterset.errors)
+
+        columns = [self.group_by_fields[name] for name in group_by]
+        rows = filterset.qs.values(*columns).annotate(
+            total=Sum('amount'), total_count=Sum('payments_count'),
+        ).order_by(*columns)
+        totals = filterset.qs.aggregate(total=Sum('amount'), total_count=Sum('payments_count'))
+        state = PaymentRollupState.objects.filter(pk=1).values('refreshed_at').first()
+
+        return Response({
+            'refreshed_at': state and state['refreshed_at'],
+            'amount': str(totals['total'] or 0),
+            'count': totals['total_count'] or 0,
+            'results': [
+                {
+                    **{name: row[column] for name, column in zip(group_by, columns)},
+                    'amount': str(row['total']),
+                    'count': row['total_count'],
+                }
+                for row in rows
+            ],
+        })